@@ -0,0 +1,213 @@
+"""
+alert_engine.py
+
+Vectorized cross-sectional version of check_alert_enriched.
+Evaluates the static and rolling-window dynamic checks for every ticker and
+every bar of a wide panel (dates x tickers) in one pass with NumPy.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.telemetry import get_logger
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+logger = get_logger(__name__)
+
+FIELDS = ["Open", "High", "Low", "Close"]
+
+# Reason codes, in the order check_alert_enriched evaluates them
+REASON_STATIC_OC = "static_oc"
+REASON_STATIC_HL = "static_hl"
+REASON_DYNAMIC_OC = "dynamic_oc"
+REASON_DYNAMIC_HL = "dynamic_hl"
+REASON_NONE = ""
+
+
+def _datetime_index(ticker: str, frame: pd.DataFrame):
+    """
+    frame's OHLC columns on a tz-naive (UTC) DatetimeIndex, or None when the index is not dates.
+    A single row without a date (the Finnhub quote) is the current bar.
+    """
+    index = frame.index
+    if not isinstance(index, pd.DatetimeIndex):
+        if pd.api.types.is_object_dtype(index) or pd.api.types.is_string_dtype(index):
+            index = pd.DatetimeIndex(pd.to_datetime(index, errors="coerce", utc=True))
+        elif len(frame) == 1:
+            index = pd.DatetimeIndex([pd.Timestamp.now(tz="UTC").tz_localize(None)])
+        else:
+            logger.warning("Skipping %s: index is not made of dates", ticker)
+            return None
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    if index.hasnans:
+        logger.warning("Skipping %s: index is not made of dates", ticker)
+        return None
+    return frame[FIELDS].set_axis(index)
+
+
+def build_panel(frames: dict) -> pd.DataFrame:
+    """
+    Align per-ticker OHLC frames into one panel with (field, ticker) columns.
+    Frames from different sources are put on the same tz-naive DatetimeIndex first.
+    """
+    frames = {t: _datetime_index(t, f) for t, f in frames.items() if f is not None and not f.empty}
+    frames = {t: f for t, f in frames.items() if f is not None}
+    if not frames:
+        return pd.DataFrame(columns=pd.MultiIndex.from_product([FIELDS, []]))
+    panel = pd.concat(frames, axis=1).sort_index()
+    return panel.swaplevel(axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+
+
+def window_stats(values: np.ndarray, window: int):
+    """
+    Mean and sample std (NaN-skipping, like Series.mean/std) of each
+    trailing window, using the same arithmetic as pandas nanops.
+    """
+    windows = sliding_window_view(values, window, axis=0)  # (T - window + 1, N, window)
+    mask = np.isnan(windows)
+    count = window - mask.sum(axis=-1)
+    filled = np.where(mask, 0.0, windows)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = filled.sum(axis=-1) / count
+        sqr = np.where(mask, 0.0, (mean[..., None] - filled) ** 2)
+        var = sqr.sum(axis=-1) / (count - 1)
+    mean = np.where(count > 0, mean, np.nan)
+    std = np.sqrt(np.where(count > 1, var, np.nan))
+    return mean, std
+
+
+def compact_panel(panel: pd.DataFrame):
+    """
+    Per-ticker compacted OHLC arrays of a panel.
+
+    A ticker's own history only contains the bars it actually has, so absent
+    rows are pushed to the top of each column (stable) and every window only
+    spans real bars. Returns (order, present, ohlc, position): the row order
+    used to compact, the presence mask in panel order, the compacted field
+    arrays and each row's position within its ticker's own frame (negative
+    for absent rows).
+    """
+    tickers = panel["Close"].columns
+    ohlc = {field: panel[field].reindex(columns=tickers).to_numpy(dtype=np.float64) for field in FIELDS}
+    n_rows = ohlc["Close"].shape[0]
+
+    present = ~np.all([np.isnan(v) for v in ohlc.values()], axis=0)
+    order = np.argsort(present, axis=0, kind="stable")
+    compact = {field: np.take_along_axis(v, order, axis=0) for field, v in ohlc.items()}
+    position = np.arange(n_rows)[:, None] - (n_rows - present.sum(axis=0))[None, :]
+    return order, present, compact, position
+
+
+def compact_deltas(compact: dict):
+    """
+    Delta_OC and Delta_HL (%) of compacted OHLC arrays, as compute_deltas defines them.
+    """
+    delta_oc = ((compact["Close"] - compact["Open"]) / compact["Open"]) * 100
+    delta_hl = ((compact["High"] - compact["Low"]) / compact["Open"]) * 100
+    return delta_oc, delta_hl
+
+
+def dynamic_baseline(delta_oc: np.ndarray, delta_hl: np.ndarray, dynamic_window: int):
+    """
+    Trailing (mean, std) of the dynamic_window bars before each row, for both deltas.
+    Returns None when the window is disabled or longer than the data.
+    """
+    if not 0 < dynamic_window < len(delta_oc):
+        return None
+    return window_stats(delta_oc[:-1], dynamic_window), window_stats(delta_hl[:-1], dynamic_window)
+
+
+def reason_index(delta_oc, delta_hl, position, static_oc, static_hl, dynamic_window, std_multiplier,
+                 baseline=None) -> np.ndarray:
+    """
+    Reason index per compacted row: 0 for no alert, 1..4 for the first check that triggers.
+    baseline is dynamic_baseline(delta_oc, delta_hl, dynamic_window), computed when omitted;
+    parameter sweeps pass it in to share it across thresholds and multipliers.
+    """
+    if baseline is None:
+        baseline = dynamic_baseline(delta_oc, delta_hl, dynamic_window)
+
+    with np.errstate(invalid="ignore"):
+        hits = [np.abs(delta_oc) >= static_oc, np.abs(delta_hl) >= static_hl]
+
+        dyn_oc = np.zeros(delta_oc.shape, dtype=bool)
+        dyn_hl = np.zeros(delta_oc.shape, dtype=bool)
+        if baseline is not None:
+            # Baseline for row r is the window of rows r - dynamic_window .. r - 1
+            eligible = position[dynamic_window:] >= dynamic_window
+            for latest, (mean, std), out in ((delta_oc, baseline[0], dyn_oc), (delta_hl, baseline[1], dyn_hl)):
+                out[dynamic_window:] = eligible & ((latest[dynamic_window:] - mean) > std_multiplier * std)
+        hits += [dyn_oc, dyn_hl]
+
+    reasons = np.select(hits, [1, 2, 3, 4], default=0)
+    reasons[position < 0] = 0
+    return reasons
+
+
+def _alert_arrays(panel: pd.DataFrame, static_oc, static_hl, dynamic_window, std_multiplier):
+    """
+    Core computation on the raw arrays. Returns (present, delta_oc, delta_hl, reason_idx),
+    where reason_idx is 0 for no alert and 1..4 for the triggering check.
+    """
+    order, present, compact, position = compact_panel(panel)
+    delta_oc, delta_hl = compact_deltas(compact)
+    reasons = reason_index(delta_oc, delta_hl, position, static_oc, static_hl, dynamic_window, std_multiplier)
+
+    # Scatter back to the panel's row order
+    out = []
+    for compacted in (delta_oc, delta_hl, reasons):
+        restored = np.empty_like(compacted)
+        np.put_along_axis(restored, order, compacted, axis=0)
+        out.append(restored)
+    return present, out[0], out[1], out[2]
+
+
+_REASON_CODES = np.array([REASON_NONE, REASON_STATIC_OC, REASON_STATIC_HL, REASON_DYNAMIC_OC, REASON_DYNAMIC_HL],
+                         dtype=object)
+
+
+def evaluate_alert_panel(panel: pd.DataFrame, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0):
+    """
+    Evaluate check_alert_enriched semantics on every bar of every ticker.
+
+    panel has (field, ticker) columns with Open/High/Low/Close fields, as built by
+    build_panel or returned by a multi-ticker yf.download. Rows where a ticker has
+    no OHLC values are treated as absent from that ticker's history.
+
+    Returns (alerts, reasons): a boolean DataFrame (dates x tickers) and a DataFrame
+    of reason codes ("" when no alert) naming the check that triggered first.
+    """
+    tickers = panel["Close"].columns
+    _, _, _, reason_idx = _alert_arrays(panel, static_oc, static_hl, dynamic_window, std_multiplier)
+    alerts = pd.DataFrame(reason_idx > 0, index=panel.index, columns=tickers)
+    reasons = pd.DataFrame(_REASON_CODES[reason_idx], index=panel.index, columns=tickers)
+    return alerts, reasons
+
+
+def latest_alerts(panel: pd.DataFrame, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0) -> pd.DataFrame:
+    """
+    Alert status on each ticker's most recent bar.
+    Returns a DataFrame indexed by ticker with alert, reason, delta_oc and delta_hl.
+    """
+    if panel.empty:
+        return pd.DataFrame(columns=["alert", "reason", "delta_oc", "delta_hl"])
+    tickers = panel["Close"].columns
+
+    present, delta_oc, delta_hl, reason_idx = _alert_arrays(panel, static_oc, static_hl, dynamic_window, std_multiplier)
+    last = len(present) - 1 - np.argmax(present[::-1], axis=0)
+    columns = np.arange(len(tickers))
+    has_data = present.any(axis=0)
+
+    latest = pd.DataFrame({
+        "alert": reason_idx[last, columns] > 0,
+        "reason": _REASON_CODES[reason_idx[last, columns]],
+        "delta_oc": delta_oc[last, columns],
+        "delta_hl": delta_hl[last, columns],
+    }, index=tickers)
+    return latest[has_data]
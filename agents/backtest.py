@@ -0,0 +1,203 @@
+"""
+backtest.py
+
+Vectorized backtester for the enriched alert rule.
+Replays stored bar history for many tickers, evaluates check_alert_enriched
+semantics on every historical bar and sweeps parameter grids across cores,
+reporting alert counts, hit rates and forward-return statistics.
+"""
+
+import argparse
+import itertools
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.alert_engine import (build_panel, compact_panel, compact_deltas, dynamic_baseline, reason_index,
+                                 REASON_STATIC_OC, REASON_STATIC_HL, REASON_DYNAMIC_OC, REASON_DYNAMIC_HL)
+from utils.bar_store import bar_store
+from utils.config import getenv
+from utils.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+PARAMS = ["static_oc", "static_hl", "dynamic_window", "std_multiplier"]
+HORIZONS = (1, 5, 20)  # forward return horizons, in bars
+HIT_MOVE = 2.0  # an alert is a hit when the close moves at least this much (%) over the horizon
+BACKTEST_WORKERS = int(getenv("BACKTEST_WORKERS", os.cpu_count() or 1))
+
+_REASONS = [REASON_STATIC_OC, REASON_STATIC_HL, REASON_DYNAMIC_OC, REASON_DYNAMIC_HL]
+
+# Arrays shared by every evaluation of a sweep; set once per worker process
+_data = None
+
+
+def parameter_grid(static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0) -> list:
+    """
+    Every combination of the given values (scalars or lists) as parameter dicts.
+    """
+    values = [v if isinstance(v, (list, tuple, np.ndarray)) else [v]
+              for v in (static_oc, static_hl, dynamic_window, std_multiplier)]
+    return [
+        {"static_oc": float(oc), "static_hl": float(hl), "dynamic_window": int(w), "std_multiplier": float(m)}
+        for oc, hl, w, m in itertools.product(*values)
+    ]
+
+
+def load_history(tickers: list, interval: str = "1d", start=None, end=None, store=None) -> pd.DataFrame:
+    """
+    Panel of stored bars for tickers, as build_panel lays it out. Nothing is downloaded.
+    """
+    store = store or bar_store
+    frames = {t.upper(): store.read(t, interval, start=start, end=end) for t in tickers}
+    return build_panel(frames)
+
+
+def prepare(panel: pd.DataFrame, horizons=HORIZONS, hit_move: float = HIT_MOVE) -> dict:
+    """
+    Parameter-independent arrays of a sweep: compacted deltas, positions and
+    forward returns (%) per horizon, plus the unconditional hit rate per horizon.
+    """
+    _, _, compact, position = compact_panel(panel)
+    delta_oc, delta_hl = compact_deltas(compact)
+    close = compact["Close"]
+
+    forward = {}
+    base_hit_rate = {}
+    for h in horizons:
+        fwd = np.full(close.shape, np.nan)
+        if h < len(close):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                fwd[:-h] = (close[h:] / close[:-h] - 1) * 100
+        forward[h] = fwd
+        valid = np.isfinite(fwd) & (position >= 0)
+        base_hit_rate[h] = float((np.abs(fwd[valid]) >= hit_move).mean()) if valid.any() else math.nan
+
+    return {
+        "delta_oc": delta_oc,
+        "delta_hl": delta_hl,
+        "position": position,
+        "forward": forward,
+        "base_hit_rate": base_hit_rate,
+        "n_bars": int((position >= 0).sum()),
+        "hit_move": hit_move,
+    }
+
+
+def evaluate(params: dict, data: dict, baseline=None) -> dict:
+    """
+    Alert statistics of one parameter set over every bar of the prepared data.
+    """
+    reasons = reason_index(data["delta_oc"], data["delta_hl"], data["position"],
+                           params["static_oc"], params["static_hl"], params["dynamic_window"],
+                           params["std_multiplier"], baseline=baseline)
+    alerts = reasons > 0
+    n_alerts = int(alerts.sum())
+    row = {**params, "n_alerts": n_alerts,
+           "alert_rate": n_alerts / data["n_bars"] if data["n_bars"] else math.nan}
+    for reason, count in zip(_REASONS, np.bincount(reasons[alerts], minlength=5)[1:]):
+        row[f"n_{reason}"] = int(count)
+
+    direction = np.sign(data["delta_oc"][alerts])
+    for h, fwd in data["forward"].items():
+        values = fwd[alerts]
+        finite = np.isfinite(values)
+        values, same_direction = values[finite], np.sign(values[finite]) == direction[finite]
+        hit_rate = float((np.abs(values) >= data["hit_move"]).mean()) if len(values) else math.nan
+        base = data["base_hit_rate"][h]
+        row[f"mean_return_{h}"] = float(values.mean()) if len(values) else math.nan
+        row[f"mean_abs_return_{h}"] = float(np.abs(values).mean()) if len(values) else math.nan
+        row[f"hit_rate_{h}"] = hit_rate
+        row[f"lift_{h}"] = hit_rate / base if base else math.nan
+        row[f"continuation_{h}"] = float(same_direction.mean()) if len(values) else math.nan
+    return row
+
+
+def _init_worker(data: dict):
+    global _data
+    _data = data
+
+
+def _evaluate_chunk(chunk: list) -> list:
+    # Every chunk shares one dynamic window, so its baseline is computed once
+    baseline = dynamic_baseline(_data["delta_oc"], _data["delta_hl"], chunk[0]["dynamic_window"])
+    return [evaluate(params, _data, baseline=baseline) for params in chunk]
+
+
+def _chunks(grid: list, workers: int) -> list:
+    by_window = {}
+    for params in grid:
+        by_window.setdefault(params["dynamic_window"], []).append(params)
+    size = max(1, math.ceil(len(grid) / (workers * 4)))
+    return [group[i:i + size] for group in by_window.values() for i in range(0, len(group), size)]
+
+
+def run_backtest(panel: pd.DataFrame, grid: list, horizons=HORIZONS, hit_move: float = HIT_MOVE,
+                 workers: int = None) -> pd.DataFrame:
+    """
+    Evaluate every parameter set of grid on panel. Parameter sets are grouped by
+    dynamic window (the rolling baseline is shared inside a group) and spread
+    over a process pool; workers=1 runs in-process.
+    Returns one row per parameter set, in grid order.
+    """
+    if not grid:
+        return pd.DataFrame(columns=PARAMS)
+    workers = max(1, min(workers or BACKTEST_WORKERS, len(grid)))
+    data = prepare(panel, horizons, hit_move)
+    chunks = _chunks(grid, workers)
+
+    if workers == 1:
+        _init_worker(data)
+        rows = [row for chunk in chunks for row in _evaluate_chunk(chunk)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as executor:
+            rows = [row for chunk_rows in executor.map(_evaluate_chunk, chunks) for row in chunk_rows]
+
+    results = pd.DataFrame(rows)
+    position = {tuple(p[k] for k in PARAMS): i for i, p in enumerate(grid)}
+    results.index = [position[tuple(r[k] for k in PARAMS)] for r in rows]
+    return results.sort_index().reset_index(drop=True)
+
+
+def _floats(value: str) -> list:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep alert parameters over stored history.")
+    parser.add_argument("--tickers", required=True, help="Comma-separated ticker symbols (read from the bar store)")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--start", default=None, help="First date to replay (default: everything stored)")
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--static-oc", default="5", help="Comma-separated values")
+    parser.add_argument("--static-hl", default="7", help="Comma-separated values")
+    parser.add_argument("--dynamic-window", default="3", help="Comma-separated values")
+    parser.add_argument("--std-multiplier", default="2", help="Comma-separated values")
+    parser.add_argument("--horizons", default=",".join(map(str, HORIZONS)))
+    parser.add_argument("--hit-move", type=float, default=HIT_MOVE)
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS)
+    parser.add_argument("--sort", default=None, help="Metric to rank by (default: lift at the longest horizon)")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", default=None, help="Write every result to this CSV file")
+    args = parser.parse_args()
+
+    horizons = [int(h) for h in _floats(args.horizons)]
+    panel = load_history(args.tickers.split(","), args.interval, args.start, args.end)
+    if panel.empty:
+        sys.exit("[ERROR] No stored bars for these tickers. Fetch them once to fill the bar store.")
+    grid = parameter_grid(_floats(args.static_oc), _floats(args.static_hl),
+                          [int(w) for w in _floats(args.dynamic_window)], _floats(args.std_multiplier))
+
+    logger.info("Backtesting %d parameter sets on %d tickers, %d bars",
+                len(grid), panel["Close"].shape[1], len(panel))
+    results = run_backtest(panel, grid, horizons=horizons, hit_move=args.hit_move, workers=args.workers)
+    if args.output:
+        results.to_csv(args.output, index=False)
+    sort = args.sort or f"lift_{max(horizons)}"
+    print(results.sort_values(sort, ascending=False).head(args.top).to_string(index=False))
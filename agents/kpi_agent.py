@@ -0,0 +1,392 @@
+"""
+kpi_agent.py
+
+Extracts key KPIs (revenue, net income, EPS, margins, cash flow) from
+quarterly report PDFs.
+
+Reports are split into page ranges parsed on a process pool, so a whole
+earnings season is extracted in parallel. Files are read as streams (hashing
+in chunks, PyPDF2 seeking to the objects it needs) rather than loaded whole,
+and the KPIs and the (zlib-compressed) page text of each report are cached by
+the SHA-256 of its content, so re-runs skip unchanged reports and a change of
+KPI_PATTERNS only re-runs the patterns on the cached text. Lookups for the
+decision prompt read the small KPI entry only. The hash itself is remembered
+per (path, mtime, size): a file that was not touched is not read again.
+
+Reports for the orchestrator live under KPI_REPORTS_DIR/<TICKER>/*.pdf. The
+price request only reads the cache; a report that is not in it yet is
+extracted by a single background task (or ahead of time with this module's CLI).
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import get_context
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.cache import TTLCache
+from utils.config import getenv
+from utils.telemetry import get_logger, count, stage
+
+logger = get_logger(__name__)
+
+KPI_REPORTS_DIR = getenv("KPI_REPORTS_DIR", os.path.join("data", "reports"))
+KPI_CACHE_PATH = getenv("KPI_CACHE_PATH", os.path.join("db", "kpi_cache.db"))
+KPI_CACHE_TTL = float(getenv("KPI_CACHE_TTL", 365 * 86400))  # keyed by content, so only bounds disk use
+KPI_WORKERS = int(getenv("KPI_WORKERS", os.cpu_count() or 1))
+KPI_PAGES_PER_TASK = int(getenv("KPI_PAGES_PER_TASK", 8))
+HASH_CHUNK_SIZE = 1 << 20
+EXTRACTOR_VERSION = "2"  # bump when the patterns or the entry layout change so KPIs are recomputed from the cached text
+
+# name -> (label pattern, kind). Kinds: money (needs $ or a scale), ratio (%), per_share ($ without scale)
+KPI_PATTERNS = {
+    "revenue": (r"(?:total\s+)?(?:net\s+)?(?:revenues?|sales)", "money"),
+    "net_income": (r"net\s+(?:income|earnings)", "money"),
+    "operating_income": (r"operating\s+income", "money"),
+    "free_cash_flow": (r"free\s+cash\s+flow", "money"),
+    "eps": (r"(?:diluted\s+)?(?:eps|earnings\s+per\s+(?:diluted\s+)?share)", "per_share"),
+    "gross_margin": (r"gross\s+margin", "ratio"),
+    "operating_margin": (r"operating\s+margin", "ratio"),
+}
+SCALES = {"thousand": 1e3, "million": 1e6, "mn": 1e6, "m": 1e6, "billion": 1e9, "bn": 1e9, "b": 1e9}
+
+_VALUE = (r"(?P<text>(?P<minus>-)?\s*(?P<dollar>\$)?\s*(?P<open>\()?\s*(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+          r"\)?\s*(?P<unit>%|(?:thousand|million|billion|mn|bn|m|b)\b)?)")
+_KPI_RES = {
+    name: (re.compile(rf"\b{label}\b[^\d$(\n-]{{0,60}}?{_VALUE}", re.IGNORECASE), kind)
+    for name, (label, kind) in KPI_PATTERNS.items()
+}
+
+kpi_cache = TTLCache(
+    ttl=KPI_CACHE_TTL,
+    max_entries=256,
+    path=KPI_CACHE_PATH or None,
+    table="kpi_reports",
+)
+
+
+def file_sha256(path: str) -> str:
+    """
+    SHA-256 of a file's content, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _kpi_value(match, kind: str):
+    unit = (match.group("unit") or "").lower()
+    number = float(match.group("number").replace(",", ""))
+    if match.group("minus") or match.group("open"):
+        number = -number
+    if kind == "ratio":
+        return {"value": number, "unit": "%"} if unit == "%" else None
+    if unit == "%":
+        return None
+    if kind == "per_share":
+        return {"value": number, "unit": "USD/share"} if match.group("dollar") and not unit else None
+    if unit not in SCALES and not match.group("dollar"):
+        return None  # a bare number next to "revenue" is usually a year or a footnote
+    return {"value": number * SCALES.get(unit, 1.0), "unit": "USD"}
+
+
+def extract_kpis(text: str) -> dict:
+    """
+    First mention of each KPI in text: {name: {"value", "unit", "text"}}.
+    Money values are in dollars, ratios in percent.
+    """
+    kpis = {}
+    for name, (pattern, kind) in _KPI_RES.items():
+        for match in pattern.finditer(text):
+            value = _kpi_value(match, kind)
+            if value is not None:
+                kpis[name] = {**value, "text": match.group("text").strip()}
+                break
+    return kpis
+
+
+def _extract_pages(path: str, start: int, stop: int) -> list:
+    """
+    [(page_index, text, kpis)] for pages start..stop-1 of one report. Runs in a worker process.
+    """
+    from PyPDF2 import PdfReader
+    pages = []
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        for index in range(start, min(stop, len(reader.pages))):
+            text = reader.pages[index].extract_text() or ""
+            pages.append((index, text, extract_kpis(text)))
+    return pages
+
+
+def _page_count(path: str) -> int:
+    from PyPDF2 import PdfReader
+    with open(path, "rb") as f:
+        return len(PdfReader(f).pages)
+
+
+def _merge_pages(pages: list) -> dict:
+    """
+    Report KPIs from per-page candidates: the earliest page mentioning a KPI wins
+    (headline figures come before the detailed tables).
+    """
+    kpis = {}
+    for index, _, page_kpis in sorted(pages, key=lambda p: p[0]):
+        for name, value in page_kpis.items():
+            kpis.setdefault(name, {**value, "page": index + 1})
+    return kpis
+
+
+def _cache_key(sha256: str) -> str:
+    return f"v{EXTRACTOR_VERSION}|{sha256}"
+
+
+def _text_key(sha256: str) -> str:
+    return f"text|{sha256}"  # page text does not depend on the patterns
+
+
+def cached_pages(sha256: str, cache: TTLCache = None) -> list:
+    """
+    Cached text of each page of the report with this content hash, or None.
+    """
+    cache = cache if cache is not None else kpi_cache
+    packed = cache.get(_text_key(sha256))
+    return None if packed is None else json.loads(zlib.decompress(packed))
+
+
+def _cache_report(cache: TTLCache, sha256: str, ordered: list) -> dict:
+    """
+    Cache the KPI entry and the compressed text of a report's [(page_index, text, kpis)]; returns the entry.
+    """
+    entry = {"n_pages": len(ordered), "kpis": _merge_pages(ordered)}
+    cache.set(_cache_key(sha256), entry)
+    cache.set(_text_key(sha256), zlib.compress(json.dumps([text for _, text, _ in ordered]).encode()))
+    return entry
+
+
+def _stat_key(path: str, st: os.stat_result) -> str:
+    return f"stat|{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+
+
+def report_sha256(path: str, cache: TTLCache) -> str:
+    """
+    SHA-256 of a report, hashed only when its (path, mtime, size) is not cached yet.
+    """
+    key = _stat_key(path, os.stat(path))
+    sha = cache.get(key)
+    if sha is None:
+        sha = file_sha256(path)
+        cache.set(key, sha)
+    return sha
+
+
+def cached_report(path: str, cache: TTLCache = None) -> dict:
+    """
+    Cached {"n_pages", "kpis"} of a report, or None when it has not been extracted
+    since its last change. Only stats the file.
+    """
+    cache = cache if cache is not None else kpi_cache
+    sha = cache.get(_stat_key(path, os.stat(path)))
+    return None if sha is None else cache.get(_cache_key(sha))
+
+
+def extract_reports(paths: list, workers: int = KPI_WORKERS, pages_per_task: int = KPI_PAGES_PER_TASK,
+                    cache: TTLCache = None) -> list:
+    """
+    KPIs of every report in paths, in order.
+
+    Each result is {"file", "sha256", "n_pages", "kpis", "cached"}, plus the
+    text of each page ("pages") when the KPIs were computed by this call, or
+    {"file", "sha256", "error", "kpis": {}} when a report cannot be parsed.
+    Reports whose KPIs are cached (same content and EXTRACTOR_VERSION) are not
+    touched; reports whose text is cached only get the patterns re-run; the
+    others are split into page ranges extracted on a process pool of workers
+    processes (0 = in this process, also used when there is a single range).
+    """
+    cache = cache if cache is not None else kpi_cache
+    results = [None] * len(paths)
+    pending = {}  # sha256 -> positions in paths still to extract
+
+    for i, path in enumerate(paths):
+        try:
+            sha = report_sha256(path, cache)
+        except OSError as e:
+            logger.error("Cannot read report %s: %s", path, e)
+            results[i] = {"file": path, "sha256": None, "error": str(e), "kpis": {}}
+            continue
+        entry = cache.get(_cache_key(sha))
+        if entry is not None:
+            count("kpi_cache_hits_total")
+            results[i] = {"file": path, "sha256": sha, **entry, "cached": True}
+            continue
+        count("kpi_cache_misses_total")
+        texts = cached_pages(sha, cache)
+        if texts is None:
+            pending.setdefault(sha, []).append(i)
+            continue
+        count("kpi_text_cache_hits_total")
+        entry = _cache_report(cache, sha, [(index, text, extract_kpis(text)) for index, text in enumerate(texts)])
+        results[i] = {"file": path, "sha256": sha, **entry, "pages": texts, "cached": False}
+
+    tasks = []
+    for sha, positions in pending.items():
+        path = paths[positions[0]]
+        try:
+            n_pages = _page_count(path)
+        except Exception as e:
+            logger.error("Cannot parse report %s: %s", path, e)
+            for i in positions:
+                results[i] = {"file": paths[i], "sha256": sha, "error": str(e), "kpis": {}}
+            continue
+        tasks += [(sha, path, start, start + pages_per_task) for start in range(0, n_pages, pages_per_task)]
+        pending[sha] = (positions, n_pages)
+
+    pages = {sha: [] for sha in pending}
+    failed = {}
+    with stage("kpi_extract"):
+        if workers > 0 and len(tasks) > 1:
+            # spawn: this may run on a thread of the server, and forking a threaded process is unsafe
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=get_context("spawn")) as executor:
+                futures = {executor.submit(_extract_pages, path, start, stop): sha for sha, path, start, stop in tasks}
+                for future in as_completed(futures):
+                    try:
+                        pages[futures[future]] += future.result()
+                    except Exception as e:
+                        failed[futures[future]] = str(e)
+        else:
+            for sha, path, start, stop in tasks:
+                try:
+                    pages[sha] += _extract_pages(path, start, stop)
+                except Exception as e:
+                    failed[sha] = str(e)
+
+    for sha, value in pending.items():
+        if not isinstance(value, tuple):
+            continue  # page count failed, already reported
+        positions, _ = value
+        if sha in failed:
+            logger.error("Cannot extract report %s: %s", paths[positions[0]], failed[sha])
+            for i in positions:
+                results[i] = {"file": paths[i], "sha256": sha, "error": failed[sha], "kpis": {}}
+            continue
+        ordered = sorted(pages[sha], key=lambda p: p[0])
+        entry = _cache_report(cache, sha, ordered)
+        texts = [text for _, text, _ in ordered]
+        for i in positions:
+            results[i] = {"file": paths[i], "sha256": sha, **entry, "pages": texts, "cached": False}
+    return results
+
+
+def report_paths(ticker: str, root: str = None) -> list:
+    """
+    Reports of a ticker (root/<TICKER>/*.pdf), oldest first by modification time.
+    """
+    directory = os.path.join(root or KPI_REPORTS_DIR, ticker.upper())
+    return sorted(glob.glob(os.path.join(directory, "*.pdf")), key=lambda p: (os.path.getmtime(p), p))
+
+
+def latest_kpis(ticker: str, root: str = None, workers: int = KPI_WORKERS) -> dict:
+    """
+    KPIs of the ticker's most recent report: {"source", "kpis"}, or None when it has no usable report.
+    """
+    paths = report_paths(ticker, root)
+    if not paths:
+        return None
+    return _summary(paths[-1], extract_reports(paths[-1:], workers=workers)[0])
+
+
+def _summary(path: str, report: dict) -> dict:
+    if not report["kpis"]:
+        return None
+    return {"source": os.path.basename(path), "kpis": report["kpis"]}
+
+
+_extract_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kpi-extract")
+_extracting = set()
+_extracting_lock = threading.Lock()
+
+
+def schedule_extraction(ticker: str):
+    """
+    Extract the ticker's latest report in the background unless that is already queued or running.
+    Returns the future, or None when one is already pending.
+    """
+    ticker = ticker.upper()
+    with _extracting_lock:
+        if ticker in _extracting:
+            return None
+        _extracting.add(ticker)
+
+    def run():
+        try:
+            return latest_kpis(ticker)
+        except Exception as e:
+            logger.error("KPI extraction failed for %s: %s", ticker, e)
+            return None
+        finally:
+            with _extracting_lock:
+                _extracting.discard(ticker)
+
+    return _extract_executor.submit(run)
+
+
+def format_kpis(report: dict) -> str:
+    """
+    One-line KPI summary for the decision prompt.
+    """
+    if not report:
+        return None
+    values = ", ".join(f"{name}={kpi['text']}" for name, kpi in report["kpis"].items())
+    return f"{values} (from {report['source']})"
+
+
+def load_kpi_context(ticker: str) -> str:
+    """
+    KPI summary of the ticker's latest report for the decision prompt, or None.
+    Reads the cache only: a report not extracted yet is scheduled in the
+    background and left out of this answer. Never raises: a broken report must
+    not fail the price request.
+    """
+    try:
+        paths = report_paths(ticker)
+        if not paths:
+            return None
+        report = cached_report(paths[-1])
+        if report is None:
+            count("kpi_context_misses_total")
+            schedule_extraction(ticker)
+            return None
+        return format_kpis(_summary(paths[-1], report))
+    except Exception as e:
+        logger.error("KPI lookup failed for %s: %s", ticker, e)
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract KPIs from quarterly report PDFs.")
+    parser.add_argument("paths", nargs="*", help="Report PDFs (default: every report under --root)")
+    parser.add_argument("--root", default=KPI_REPORTS_DIR, help="Directory with one sub-directory per ticker")
+    parser.add_argument("--workers", type=int, default=KPI_WORKERS, help="Extraction processes (0 = in-process)")
+    parser.add_argument("--pages-per-task", type=int, default=KPI_PAGES_PER_TASK)
+    parser.add_argument("--text", action="store_true", help="Also print the extracted text")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(args.root, "*", "*.pdf")))
+    if not paths:
+        sys.exit("[ERROR] No report PDFs found.")
+    for report in extract_reports(paths, workers=args.workers, pages_per_task=args.pages_per_task):
+        pages = report.pop("pages", None)
+        print(json.dumps(report, indent=2))
+        if args.text:
+            if pages is None and report.get("sha256"):
+                pages = cached_pages(report["sha256"])
+            print("\n".join(pages or []))
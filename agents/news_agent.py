@@ -0,0 +1,469 @@
+"""
+news_agent.py
+
+Collects the latest financial news per ticker into a local SQLite full-text index.
+
+A refresh reads the ticker's news feed (conditional request, so an unchanged
+feed costs one 304), then fetches and parses only the articles not indexed
+yet, concurrently over a pooled HTTP session, with beautifulsoup4. Articles
+are deduplicated by URL and by a hash of their text (syndicated copies).
+
+The /price path only reads the index (news_context), which takes a few
+milliseconds; stale tickers are refreshed in the background.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from orchestrator.db_utils import get_connection
+from utils.config import getenv
+from utils.lazy import lazy_import
+from utils.memory import memory_store
+from utils.rate_limiter import get_limiter, parse_retry_after
+from utils.telemetry import get_logger, count, stage
+
+logger = get_logger(__name__)
+requests = lazy_import("requests")  # with bs4, only imported once news is actually fetched
+
+NEWS_DB_PATH = getenv("NEWS_DB_PATH", os.path.join("db", "news.db"))
+NEWS_FEED_URL = getenv("NEWS_FEED_URL", "https://feeds.finance.yahoo.com/rss/2.0/headline?s={ticker}&region=US&lang=en-US")
+NEWS_REFRESH_INTERVAL = float(getenv("NEWS_REFRESH_INTERVAL", 900))  # seconds before a ticker's feed is re-read
+NEWS_FETCH_WORKERS = int(getenv("NEWS_FETCH_WORKERS", 8))  # article downloads in flight (and pooled connections)
+NEWS_MAX_ARTICLES = int(getenv("NEWS_MAX_ARTICLES", 20))  # newest feed items considered per refresh
+NEWS_CONTEXT_ARTICLES = 3
+NEWS_CONTEXT_MAX_AGE = float(getenv("NEWS_CONTEXT_MAX_AGE", 7 * 86400))  # older articles are not "latest news"
+REQUEST_TIMEOUT = 10
+SUMMARY_CHARS = 300
+USER_AGENT = "Mozilla/5.0 (compatible; agentic-finance news agent)"
+NO_NEWS = "No major news affecting the stock reported today."
+
+_session = None
+_session_lock = threading.Lock()
+_initialized = set()
+
+
+def get_session() -> "requests.Session":
+    """
+    Shared HTTP session; keeps up to NEWS_FETCH_WORKERS connections per host alive.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=NEWS_FETCH_WORKERS, pool_maxsize=NEWS_FETCH_WORKERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+def init_news_db(path: str = None):
+    """
+    Articles table, its FTS5 index and the per-ticker feed state. Runs once per process and path.
+    """
+    path = path or NEWS_DB_PATH
+    if path in _initialized:
+        return
+    conn = get_connection(path)
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS news_articles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ticker TEXT NOT NULL,
+                url TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                title TEXT,
+                summary TEXT,
+                body TEXT,
+                published TEXT,
+                fetched_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_news_ticker_url ON news_articles (ticker, url)")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_news_ticker_hash ON news_articles (ticker, content_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_news_ticker_published ON news_articles (ticker, published)")
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+                title, body, content='news_articles', content_rowid='id'
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS news_duplicates (
+                ticker TEXT NOT NULL,
+                url TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (ticker, url)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS news_feeds (
+                ticker TEXT PRIMARY KEY,
+                refreshed_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            )
+        """)
+    _initialized.add(path)
+
+
+def _utc_iso(dt: datetime) -> str:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat(timespec="seconds") + "Z"
+
+
+def _parse_date(value: str) -> str:
+    """
+    RFC 822 (RSS) or ISO 8601 (Atom, HTML meta) date as a UTC ISO string, or None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return _utc_iso(parsedate_to_datetime(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return _utc_iso(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except ValueError:
+        return None
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_feed(text: str) -> list:
+    """
+    Items of an RSS 2.0 or Atom feed, newest first: [{"url", "title", "published", "summary"}].
+    """
+    from bs4 import BeautifulSoup
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError as e:
+        logger.warning("Unreadable news feed: %s", e)
+        return []
+
+    items = []
+    for node in root.iter():
+        if _local_name(node.tag) not in ("item", "entry"):
+            continue
+        fields = {}
+        for child in node:
+            name = _local_name(child.tag)
+            if name == "link":
+                fields.setdefault("url", (child.get("href") or child.text or "").strip())
+            elif name in ("title", "description", "summary", "pubDate", "published", "updated"):
+                fields.setdefault(name, (child.text or "").strip())
+        if not fields.get("url"):
+            continue
+        summary = fields.get("description") or fields.get("summary") or ""
+        items.append({
+            "url": fields["url"],
+            "title": fields.get("title", ""),
+            "published": _parse_date(fields.get("pubDate") or fields.get("published") or fields.get("updated")),
+            "summary": BeautifulSoup(summary, "html.parser").get_text(" ", strip=True),
+        })
+    items.sort(key=lambda item: item["published"] or "", reverse=True)
+    return items
+
+
+def parse_article(html: str) -> dict:
+    """
+    Title, publication date and paragraph text of an article page.
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+
+    def meta(*names):
+        for name in names:
+            tag = soup.find("meta", attrs={"property": name}) or soup.find("meta", attrs={"name": name})
+            if tag is not None and tag.get("content"):
+                return tag["content"].strip()
+        return None
+
+    title = meta("og:title") or (soup.title.get_text(strip=True) if soup.title else None)
+    time_tag = soup.find("time", attrs={"datetime": True})
+    published = _parse_date(meta("article:published_time", "date") or (time_tag["datetime"] if time_tag else None))
+
+    for tag in soup(["script", "style", "nav", "header", "footer", "aside", "form"]):
+        tag.decompose()
+    container = soup.find("article") or soup.body or soup
+    paragraphs = [p.get_text(" ", strip=True) for p in container.find_all("p")]
+    text = "\n".join(p for p in paragraphs if p)
+    return {"title": title, "published": published, "text": text}
+
+
+def content_hash(text: str) -> str:
+    """
+    Hash of an article's text, insensitive to case and whitespace (catches syndicated copies).
+    """
+    normalized = re.sub(r"\s+", " ", text).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _fetch_article(session: "requests.Session", item: dict) -> dict:
+    """
+    Download and parse one feed item's article. Falls back to the feed summary
+    when the page cannot be fetched or has no paragraph text.
+    """
+    article = {"title": None, "published": None, "text": ""}
+    try:
+        response = session.get(item["url"], timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            article = parse_article(response.text)
+        else:
+            logger.warning("News article %s: HTTP %s", item["url"], response.status_code)
+    except requests.RequestException as e:
+        logger.warning("News article %s failed: %s", item["url"], e)
+    body = article["text"] or item["summary"]
+    return {
+        "url": item["url"],
+        "title": item["title"] or article["title"] or "",
+        "published": item["published"] or article["published"],
+        "summary": (item["summary"] or body)[:SUMMARY_CHARS],
+        "body": body,
+    }
+
+
+def _read_feed(session: "requests.Session", ticker: str, state, feed_url: str):
+    """
+    Conditional GET of the ticker's feed. Returns (items, etag, last_modified);
+    items is None when the feed is unchanged or unavailable (the validators are then kept).
+    """
+    etag, last_modified = (state[1], state[2]) if state is not None else (None, None)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    limiter = get_limiter("news")
+    limiter.acquire()
+    try:
+        response = session.get(feed_url.format(ticker=ticker), headers=headers, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        logger.warning("News feed for %s failed: %s", ticker, e)
+        return None, etag, last_modified
+    if response.status_code == 429:
+        limiter.record_rate_limited(parse_retry_after(response.headers))
+        return None, etag, last_modified
+    if response.status_code not in (200, 304):
+        logger.warning("News feed for %s: HTTP %s", ticker, response.status_code)
+        count("news_feed_errors_total", status=response.status_code)
+        return None, etag, last_modified
+    limiter.record_success()
+    if response.status_code == 304:
+        return None, etag, last_modified
+    return parse_feed(response.text), response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+
+def refresh_news(ticker: str, feed_url: str = None, session: "requests.Session" = None,
+                 max_articles: int = NEWS_MAX_ARTICLES, path: str = None) -> int:
+    """
+    Pull what is new for ticker since the last refresh into the index.
+    Returns the number of articles added.
+    """
+    ticker = ticker.upper()
+    path = path or NEWS_DB_PATH
+    session = session or get_session()
+    init_news_db(path)
+    conn = get_connection(path)
+    state = conn.execute("SELECT refreshed_at, etag, last_modified FROM news_feeds WHERE ticker = ?",
+                         (ticker,)).fetchone()
+
+    with stage("news_fetch"):
+        items, etag, last_modified = _read_feed(session, ticker, state, feed_url or NEWS_FEED_URL)
+        new_items = []
+        if items:
+            items = list({item["url"]: item for item in reversed(items[:max_articles])}.values())[::-1]  # unique URLs, feed order
+            placeholders = ",".join("?" * len(items))
+            urls = [item["url"] for item in items]
+            known = {row[0] for row in conn.execute(
+                f"""
+                SELECT url FROM news_articles WHERE ticker = ? AND url IN ({placeholders})
+                UNION SELECT url FROM news_duplicates WHERE ticker = ? AND url IN ({placeholders})
+                """,
+                (ticker, *urls, ticker, *urls))}
+            new_items = [item for item in items if item["url"] not in known]
+        with ThreadPoolExecutor(max_workers=max(1, min(NEWS_FETCH_WORKERS, len(new_items)))) as executor:
+            articles = list(executor.map(lambda item: _fetch_article(session, item), new_items))
+
+    added = 0
+    memories = []
+    fetched_at = _utc_iso(datetime.now(timezone.utc))
+    with conn:
+        for article in articles:
+            if not article["body"] and not article["title"]:
+                continue
+            digest = content_hash(article["body"] or article["title"])
+            cursor = conn.execute(
+                """
+                INSERT OR IGNORE INTO news_articles
+                    (ticker, url, content_hash, title, summary, body, published, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (ticker, article["url"], digest, article["title"],
+                 article["summary"], article["body"], article["published"] or fetched_at, fetched_at)
+            )
+            if cursor.rowcount == 0:
+                # Same text under another URL: remember the URL so it is not downloaded again
+                conn.execute("INSERT OR IGNORE INTO news_duplicates (ticker, url, content_hash) VALUES (?, ?, ?)",
+                             (ticker, article["url"], digest))
+                count("news_duplicates_total")
+                continue
+            conn.execute("INSERT INTO news_fts (rowid, title, body) VALUES (?, ?, ?)",
+                         (cursor.lastrowid, article["title"], article["body"]))
+            added += 1
+            memories.append({"text": " ".join(filter(None, (article["title"], article["summary"]))) or article["body"],
+                             "ticker": ticker, "kind": "news", "date": article["published"] or fetched_at,
+                             "metadata": {"url": article["url"]}})
+        conn.execute(
+            "INSERT OR REPLACE INTO news_feeds (ticker, refreshed_at, etag, last_modified) VALUES (?, ?, ?, ?)",
+            (ticker, time.time(), etag, last_modified)
+        )
+    if memories:
+        try:
+            memory_store.add_many(memories)
+        except Exception as e:
+            logger.error("Memory update failed for %s: %s", ticker, e)
+    count("news_articles_indexed_total", added)
+    logger.info("Indexed %d new articles for %s (%d feed items)", added, ticker, len(items or []))
+    return added
+
+
+def refresh_many(tickers: list, workers: int = NEWS_FETCH_WORKERS, **kwargs) -> dict:
+    """
+    Refresh several tickers concurrently. Returns {ticker: articles added}.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tickers)))) as executor:
+        return dict(zip(tickers, executor.map(lambda t: refresh_news(t, **kwargs), tickers)))
+
+
+def recent_news(ticker: str, limit: int = NEWS_CONTEXT_ARTICLES, max_age: float = NEWS_CONTEXT_MAX_AGE,
+                path: str = None) -> list:
+    """
+    Latest indexed articles of a ticker, newest first (local read only).
+    """
+    path = path or NEWS_DB_PATH
+    init_news_db(path)
+    since = _utc_iso(datetime.fromtimestamp(time.time() - max_age, timezone.utc)) if max_age else ""
+    rows = get_connection(path).execute(
+        """
+        SELECT title, summary, published, url FROM news_articles
+        WHERE ticker = ? AND published >= ?
+        ORDER BY published DESC
+        LIMIT ?
+        """,
+        (ticker.upper(), since, limit)
+    ).fetchall()
+    return [{"title": r[0], "summary": r[1], "published": r[2], "url": r[3]} for r in rows]
+
+
+def search_news(query: str, ticker: str = None, limit: int = 10, path: str = None) -> list:
+    """
+    Full-text search of the index (FTS5 query syntax), best matches first.
+    """
+    path = path or NEWS_DB_PATH
+    init_news_db(path)
+    sql = """
+        SELECT a.ticker, a.title, a.summary, a.published, a.url
+        FROM news_fts JOIN news_articles a ON a.id = news_fts.rowid
+        WHERE news_fts MATCH ?
+    """
+    params = [query]
+    if ticker is not None:
+        sql += " AND a.ticker = ?"
+        params.append(ticker.upper())
+    sql += " ORDER BY bm25(news_fts) LIMIT ?"
+    params.append(limit)
+    rows = get_connection(path).execute(sql, params).fetchall()
+    return [{"ticker": r[0], "title": r[1], "summary": r[2], "published": r[3], "url": r[4]} for r in rows]
+
+
+def is_stale(ticker: str, max_age: float = NEWS_REFRESH_INTERVAL, path: str = None) -> bool:
+    path = path or NEWS_DB_PATH
+    init_news_db(path)
+    row = get_connection(path).execute("SELECT refreshed_at FROM news_feeds WHERE ticker = ?",
+                                       (ticker.upper(),)).fetchone()
+    return row is None or time.time() - row[0] >= max_age
+
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="news-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def schedule_refresh(ticker: str):
+    """
+    Refresh ticker in the background unless a refresh is already queued or running.
+    Returns the future, or None when one is already pending.
+    """
+    ticker = ticker.upper()
+    with _refreshing_lock:
+        if ticker in _refreshing:
+            return None
+        _refreshing.add(ticker)
+
+    def run():
+        try:
+            return refresh_news(ticker)
+        except Exception as e:
+            logger.error("News refresh failed for %s: %s", ticker, e)
+            return 0
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(ticker)
+
+    return _refresh_executor.submit(run)
+
+
+def news_context(ticker: str, limit: int = NEWS_CONTEXT_ARTICLES, refresh: bool = True) -> str:
+    """
+    News block for the decision prompt, read from the local index. When the
+    ticker's feed is stale a background refresh is scheduled; this call never
+    waits for the network. Never raises.
+    """
+    try:
+        if refresh and is_stale(ticker):
+            schedule_refresh(ticker)
+        articles = recent_news(ticker, limit=limit)
+    except Exception as e:
+        logger.error("News lookup failed for %s: %s", ticker, e)
+        return NO_NEWS
+    if not articles:
+        return NO_NEWS
+    return " | ".join(
+        f"{(a['published'] or '')[:10]} {a['title']}: {a['summary']}".strip() for a in articles
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh and query the local news index.")
+    parser.add_argument("--tickers", required=True, help="Comma-separated ticker symbols")
+    parser.add_argument("--search", default=None, help="Full-text query to run after refreshing")
+    parser.add_argument("--no-refresh", action="store_true", help="Only read the local index")
+    args = parser.parse_args()
+
+    tickers = [t for t in args.tickers.split(",") if t.strip()]
+    if not args.no_refresh:
+        for ticker, added in refresh_many(tickers).items():
+            print(f"{ticker}: {added} new articles")
+    for ticker in tickers:
+        if args.search:
+            for article in search_news(args.search, ticker=ticker):
+                print(f"[{ticker}] {article['published']} {article['title']} ({article['url']})")
+        else:
+            print(f"[{ticker}] {news_context(ticker, refresh=False)}")
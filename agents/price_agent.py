@@ -2,87 +2,356 @@
 price_agent.py
 
 Fetches stock price data using yfinance with a fallback to Finnhub.
+Daily and intraday intervals (1m, 5m, 15m, ...) are supported; intraday
+series are cached as compact float32 Bars and coarser timeframes are
+resampled on demand from the stored finer bars.
 Includes enriched alert logic: static thresholds + dynamic anomaly detection.
 """
 
-import yfinance as yf
-import pandas as pd
-import requests
-import time
-from dotenv import load_dotenv
+from __future__ import annotations
+
 import os
-from datetime import datetime
+import sys
+import threading
+from datetime import datetime, timedelta
 import json
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.cache import cached_market_data, market_cache, market_data_key
+from utils.config import getenv
+from utils.lazy import lazy_import
+from utils.rate_limiter import get_limiter, parse_retry_after
+from utils.bar_store import bar_store, period_start, INTRADAY_INTERVALS
+from utils.bars import Bars
+from utils.telemetry import get_logger, count
+from agents.alert_engine import build_panel, latest_alerts
+
+# pandas and the network clients are imported on first use; importing the agent stays cheap
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
+requests = lazy_import("requests")
+
+FINNHUB_API_KEY = getenv("FINNHUB_API_KEY")
+logger = get_logger(__name__)
 
+QUOTE_CACHE_TTL = float(getenv("MARKET_CACHE_QUOTE_TTL", 60))  # live quotes go stale fast
+BATCH_CHUNK_SIZE = 100  # tickers per yfinance bulk download
+STORE_COVERAGE_SLACK = timedelta(days=7)  # holidays / weekends at the start of a period
 
+# Furthest back yfinance serves each intraday interval
+INTRADAY_MAX_PERIOD = {"1m": "7d", "2m": "60d", "5m": "60d", "15m": "60d", "30m": "60d", "90m": "60d",
+                       "60m": "730d", "1h": "730d"}
+# Timeframes built from finer stored bars instead of being downloaded and stored on their own
+RESAMPLED_INTERVALS = {"2m": "1m", "15m": "5m", "30m": "5m", "90m": "5m", "4h": "1h", "1wk": "1d"}
+SUPPORTED_INTERVALS = ("1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "4h", "1d", "1wk")
+FINNHUB_RESOLUTIONS = {"1m": "1", "5m": "5", "15m": "15", "30m": "30", "60m": "60", "1h": "60", "1d": "D", "1wk": "W"}
+
+def clamp_period(period: str, interval: str) -> str:
+    """
+    period, shortened to what the provider serves for an intraday interval.
+    """
+    limit = INTRADAY_MAX_PERIOD.get(interval)
+    if limit is None:
+        return period
+    now = pd.Timestamp.now()
+    wanted = period_start(period, now)
+    return limit if wanted is None or wanted < period_start(limit, now) else period
 
-# Load API key
-load_dotenv()
-FINNHUB_API_KEY = os.getenv("FINNHUB_API_KEY")
+def _pack_bars(data: pd.DataFrame, interval: str):
+    # Intraday series stay in the market cache as float32 Bars; daily frames keep full precision
+    if interval in INTRADAY_INTERVALS and isinstance(data.index, pd.DatetimeIndex):
+        return Bars.from_frame(data, interval)
+    return data.copy()
 
-API_CALL_DELAY = 3  # seconds between API calls
+def _unpack_bars(value) -> pd.DataFrame:
+    return value.to_frame() if isinstance(value, Bars) else value.copy()
 
+@cached_market_data("yfinance", pack=_pack_bars, unpack=_unpack_bars)
 def fetch_price_yfinance(ticker: str, period="5d", interval="1d") -> pd.DataFrame:
     """
     Try to fetch price data using yfinance.
+    Prices are unadjusted with flat columns so the same frame can feed
+    both the alert logic and the 52-week history stats.
+    Bars are kept in the local bar store: only bars since the last stored one
+    are downloaded and the requested period is read back from the store.
+    Intraday periods are capped to what yfinance serves (see INTRADAY_MAX_PERIOD).
     """
+    limiter = get_limiter("yfinance")
+    ticker = ticker.upper()
     try:
-        print(f"[INFO] Attempting yfinance for {ticker}")
-        data = yf.download(ticker, period=period, interval=interval, progress=False)
-        time.sleep(API_CALL_DELAY)
-        if data.empty:
-            print("[WARN] yfinance returned no data.")
+        logger.info("Attempting yfinance for %s", ticker)
+        limiter.acquire()
+        backfill, download_args = _download_args(ticker, period, interval)
+        data, rate_limited = _yf_download(ticker, interval=interval, progress=False,
+                                          auto_adjust=False, multi_level_index=False, **download_args)
+        if rate_limited:
+            limiter.record_rate_limited()
+            return _stored_bars(ticker, period, interval)
+        limiter.record_success()
+        _store_bars(ticker, period, interval, data, backfill)
+        data = _stored_bars(ticker, period, interval)
+        if data is None:
+            logger.warning("yfinance returned no data for %s", ticker)
             return None
-        print("[INFO] yfinance data retrieved.")
+        logger.info("yfinance data retrieved for %s", ticker)
         return data
     except Exception as e:
-        print(f"[ERROR] yfinance exception: {e}")
-        time.sleep(API_CALL_DELAY)
+        logger.error("yfinance exception for %s: %s", ticker, e)
         return None
 
+def _download_args(ticker: str, period: str, interval: str):
+    """
+    (backfill, yf.download kwargs) to bring the stored bars up to date.
+    Only the bars from the last stored one on are requested, unless the store
+    does not reach back to the start of period yet (then the whole period, once:
+    a ticker listed later than that is marked as backfilled, see _store_bars).
+    """
+    period = clamp_period(period, interval)
+    first, last = bar_store.bounds(ticker, interval)
+    wanted = period_start(period, pd.Timestamp.now())
+    if last is None:
+        return True, {"period": period}
+    if wanted is not None and first > wanted + STORE_COVERAGE_SLACK:
+        backfilled = bar_store.backfilled_from(ticker, interval)
+        if backfilled is None or backfilled > wanted:
+            return True, {"period": period}
+    if interval in INTRADAY_INTERVALS:
+        if wanted is not None and last < wanted:
+            return True, {"period": period}  # gap older than yfinance's intraday limit
+        return False, {"start": last.tz_localize("UTC").to_pydatetime()}
+    return False, {"start": last.strftime("%Y-%m-%d")}
+
+def _store_bars(ticker: str, period: str, interval: str, data: pd.DataFrame, backfill: bool):
+    if data is None or data.empty:
+        return
+    if backfill:
+        bar_store.merge(ticker, interval, data)
+        start = period_start(clamp_period(period, interval), pd.Timestamp.now())
+        if start is not None:
+            bar_store.mark_backfilled(ticker, interval, start)
+    else:
+        bar_store.append(ticker, interval, data)
+
+def _stored_bars(ticker: str, period: str, interval: str) -> pd.DataFrame:
+    data = bar_store.read_period(ticker, interval, period)
+    return None if data.empty else data
+
+# yf.download collects its results and errors in module globals (yf.shared._DFS,
+# _ERRORS) that every call resets, so concurrent downloads swap each other's tickers
+_download_lock = threading.Lock()
+
+
+def _yf_download(tickers, **kwargs):
+    """
+    (yf.download result, rate limited) for one download, serialized with every other one.
+    """
+    with _download_lock:
+        data = yf.download(tickers, **kwargs)
+        return data, _yfinance_rate_limited()
+
+def _yfinance_rate_limited() -> bool:
+    """
+    yf.download swallows per-ticker errors; inspect them for a 429.
+    Only meaningful right after a download, under _download_lock.
+    """
+    errors = getattr(getattr(yf, "shared", None), "_ERRORS", None) or {}
+    return any("Rate limited" in str(err) for err in errors.values())
+
+@cached_market_data("finnhub", period="quote", interval="quote", ttl=QUOTE_CACHE_TTL)
 def fetch_price_finnhub(ticker: str) -> pd.DataFrame:
     """
     Fetch price data from Finnhub API (current quote only).
     """
     url = f"https://finnhub.io/api/v1/quote?symbol={ticker}&token={FINNHUB_API_KEY}"
+    limiter = get_limiter("finnhub")
     try:
-        print(f"[INFO] Attempting Finnhub for {ticker}")
+        logger.info("Attempting Finnhub for %s", ticker)
+        limiter.acquire()
         response = requests.get(url)
-        time.sleep(API_CALL_DELAY)
+        if response.status_code == 429:
+            logger.error("Finnhub API error: 429")
+            limiter.record_rate_limited(parse_retry_after(response.headers))
+            return None
         if response.status_code != 200:
-            print(f"[ERROR] Finnhub API error: {response.status_code}")
+            logger.error("Finnhub API error: %s", response.status_code)
             return None
+        limiter.record_success()
         json_data = response.json()
         if 'c' not in json_data or json_data['c'] == 0:
-            print("[WARN] Finnhub returned incomplete data.")
+            logger.warning("Finnhub returned incomplete data for %s", ticker)
             return None
+        # Indexed by the quote time (epoch seconds) so the row lines up with stored bars
+        quoted_at = pd.to_datetime(json_data.get('t') or pd.Timestamp.now(tz="UTC").timestamp(), unit='s')
         df = pd.DataFrame([{
             'Open': json_data['o'],
             'Close': json_data['c'],
             'High': json_data['h'],
             'Low': json_data['l']
-        }])
-        print("[INFO] Finnhub data retrieved.")
+        }], index=pd.DatetimeIndex([quoted_at], name="Datetime"))
+        logger.info("Finnhub data retrieved for %s", ticker)
         return df
     except Exception as e:
-        print(f"[ERROR] Finnhub exception: {e}")
-        time.sleep(API_CALL_DELAY)
+        logger.error("Finnhub exception for %s: %s", ticker, e)
         return None
 
-def fetch_price_with_fallback(ticker: str) -> pd.DataFrame:
+@cached_market_data("finnhub_candles", pack=_pack_bars, unpack=_unpack_bars)
+def fetch_candles_finnhub(ticker: str, period="1y", interval="1d") -> pd.DataFrame:
     """
-    Fetch price data using yfinance with Finnhub as fallback.
+    Fetch OHLCV candles from Finnhub (daily or intraday resolutions) into the bar store.
+    Returns the requested period read back from the store, or None.
+    """
+    resolution = FINNHUB_RESOLUTIONS.get(interval)
+    if resolution is None or not FINNHUB_API_KEY:
+        return None
+    ticker = ticker.upper()
+    now = pd.Timestamp.now(tz="UTC")
+    start = period_start(clamp_period(period, interval), now)
+    params = {
+        "symbol": ticker,
+        "resolution": resolution,
+        "from": int(start.timestamp()) if start is not None else 0,
+        "to": int(now.timestamp()),
+        "token": FINNHUB_API_KEY
+    }
+    limiter = get_limiter("finnhub")
+    try:
+        logger.info("Attempting Finnhub candles for %s (%s)", ticker, interval)
+        limiter.acquire()
+        response = requests.get("https://finnhub.io/api/v1/stock/candle", params=params)
+        if response.status_code == 429:
+            logger.error("Finnhub API error: 429")
+            limiter.record_rate_limited(parse_retry_after(response.headers))
+            return None
+        if response.status_code != 200:
+            logger.error("Finnhub API error: %s", response.status_code)
+            return None
+        limiter.record_success()
+        json_data = response.json()
+        if json_data.get("s") != "ok":
+            logger.warning("Finnhub returned no candles for %s: %s", ticker, json_data.get("s"))
+            return None
+        df = pd.DataFrame({
+            "Open": json_data["o"],
+            "High": json_data["h"],
+            "Low": json_data["l"],
+            "Close": json_data["c"],
+            "Volume": json_data.get("v", float("nan"))
+        }, index=pd.to_datetime(json_data["t"], unit="s"))
+        bar_store.merge(ticker, interval, df)
+        logger.info("Finnhub candles retrieved for %s", ticker)
+        return _stored_bars(ticker, period, interval)
+    except Exception as e:
+        logger.error("Finnhub candles exception for %s: %s", ticker, e)
+        return None
+
+def resample_frame(data: pd.DataFrame, source: str, interval: str) -> pd.DataFrame:
+    """
+    OHLC(V) frame of source bars resampled to the coarser interval.
+    """
+    if data is None or source == interval:
+        return data
+    return Bars.from_frame(data, source).resample(interval).to_frame()
+
+def _fetch_fallback(ticker: str, period: str, interval: str) -> pd.DataFrame:
+    """
+    Finnhub candles of interval, then the current Finnhub quote as the last resort.
     """
-    data = fetch_price_yfinance(ticker, period="1y", interval="1d")
+    logger.info("Falling back to Finnhub for %s", ticker)
+    count("fallbacks_total", source="finnhub")
+    data = fetch_candles_finnhub(ticker, period=period, interval=interval)
     if data is not None:
-        if len(data) == 1:
-            from datetime import datetime
-            data = data.copy()
-            data.index = [datetime.now()]  # or datetime.today(), or a timestamp from API
         return data
-    print("[INFO] Falling back to Finnhub...")
     return fetch_price_finnhub(ticker)
 
+def fetch_price_with_fallback(ticker: str, period: str = "1y", interval: str = "1d") -> pd.DataFrame:
+    """
+    Fetch price data using yfinance with Finnhub as fallback.
+    interval is a daily or intraday bar size; those in RESAMPLED_INTERVALS
+    are resampled from the finer bars in the store rather than downloaded.
+    """
+    source = RESAMPLED_INTERVALS.get(interval, interval)
+    data = fetch_price_yfinance(ticker, period=period, interval=source)
+    if data is None:
+        data = _fetch_fallback(ticker, period, source)
+        if data is None or len(data) == 1:
+            return data
+    data = resample_frame(data, source, interval)
+    if len(data) == 1:
+        data = data.copy()
+        data.index = [datetime.now()]  # or datetime.today(), or a timestamp from API
+    return data
+
+def fetch_prices_batch(tickers: list, period="1y", interval="1d", chunk_size=BATCH_CHUNK_SIZE, refresh=False) -> dict:
+    """
+    Fetch price data for many tickers with yfinance bulk downloads.
+    Cached tickers are served locally (unless refresh), the rest are pulled in chunks of
+    chunk_size symbols per download and split out of the MultiIndex frame.
+    Downloads go through the bar store, so known tickers only fetch their new bars.
+    Tickers yfinance could not return fall back to Finnhub one by one.
+    Intervals in RESAMPLED_INTERVALS are fetched as their finer source bars and resampled.
+    Returns a dict of ticker -> DataFrame (or None when every source failed).
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+    requested, interval = interval, RESAMPLED_INTERVALS.get(interval, interval)
+    results = {}
+    missing = []
+
+    for ticker in tickers:
+        cached = None if refresh else market_cache.get(market_data_key(ticker, period, interval, "yfinance"))
+        if cached is not None:
+            results[ticker] = _unpack_bars(cached)
+        else:
+            missing.append(ticker)
+
+    # Tickers without stored history download the whole period, the others only
+    # the bars since the oldest "last stored bar" of their chunk
+    groups = {}
+    for ticker in missing:
+        backfill, download_args = _download_args(ticker, period, interval)
+        groups.setdefault(backfill, []).append((ticker, download_args))
+
+    limiter = get_limiter("yfinance")
+    for backfill, entries in groups.items():
+        for start in range(0, len(entries), chunk_size):
+            chunk_entries = entries[start:start + chunk_size]
+            chunk = [ticker for ticker, _ in chunk_entries]
+            download_args = {"period": clamp_period(period, interval)} if backfill else {"start": min(a["start"] for _, a in chunk_entries)}
+            try:
+                logger.info("Attempting yfinance bulk download for %d tickers", len(chunk))
+                limiter.acquire()
+                data, rate_limited = _yf_download(chunk, interval=interval, progress=False, auto_adjust=False,
+                                                  group_by="ticker", threads=True, **download_args)
+                if rate_limited:
+                    limiter.record_rate_limited()
+                else:
+                    limiter.record_success()
+            except Exception as e:
+                logger.error("yfinance bulk exception: %s", e)
+                data = None
+
+            available = set(data.columns.get_level_values(0)) if data is not None and not data.empty else set()
+            for ticker in chunk:
+                if ticker in available:
+                    frame = data[ticker].dropna(how="all")
+                    frame.columns.name = None
+                    _store_bars(ticker, period, interval, frame, backfill)
+                frame = _stored_bars(ticker, period, interval)
+                if frame is None:
+                    continue
+                market_cache.set(market_data_key(ticker, period, interval, "yfinance"), _pack_bars(frame, interval))
+                results[ticker] = frame
+
+    for ticker in tickers:
+        if ticker not in results:
+            results[ticker] = _fetch_fallback(ticker, period, interval)
+            if results[ticker] is None or len(results[ticker]) == 1:
+                continue
+        results[ticker] = resample_frame(results[ticker], interval, requested)
+        if len(results[ticker]) == 1:
+            results[ticker] = results[ticker].copy()
+            results[ticker].index = [datetime.now()]
+
+    return results
+
 def compute_deltas(data: pd.DataFrame) -> pd.DataFrame:
     """
     Add delta columns to the data: Open-Close % and High-Low %.
@@ -97,7 +366,7 @@ def check_alert_enriched(data: pd.DataFrame, static_oc=5.0, static_hl=7.0, dynam
     Check for alert based on static thresholds and dynamic thresholds.
     """
     if data is None or data.empty:
-        print("[ERROR] No data to evaluate alert.")
+        logger.error("No data to evaluate alert.")
         return False
 
     data = compute_deltas(data)
@@ -105,15 +374,14 @@ def check_alert_enriched(data: pd.DataFrame, static_oc=5.0, static_hl=7.0, dynam
     latest_oc = data['Delta_OC'].iloc[-1]
     latest_hl = data['Delta_HL'].iloc[-1]
 
-    print(f"[INFO] Latest Delta_OC: {latest_oc:.2f}%")
-    print(f"[INFO] Latest Delta_HL: {latest_hl:.2f}%")
+    logger.debug("Latest Delta_OC: %.2f%%, Delta_HL: %.2f%%", latest_oc, latest_hl)
 
     # Static checks
     if abs(latest_oc) >= static_oc:
-        print(f"[ALERT] Static OC threshold exceeded ({static_oc}%)")
+        logger.info("Static OC threshold exceeded (%s%%)", static_oc)
         return True
     if abs(latest_hl) >= static_hl:
-        print(f"[ALERT] Static HL threshold exceeded ({static_hl}%)")
+        logger.info("Static HL threshold exceeded (%s%%)", static_hl)
         return True
 
     # Dynamic checks
@@ -126,43 +394,51 @@ def check_alert_enriched(data: pd.DataFrame, static_oc=5.0, static_hl=7.0, dynam
         hl_mean = hl_hist.mean()
         hl_std = hl_hist.std()
 
-        print(f"[INFO] OC dynamic baseline: mean={oc_mean:.2f}%, std={oc_std:.2f}%")
-        print(f"[INFO] HL dynamic baseline: mean={hl_mean:.2f}%, std={hl_std:.2f}%")
+        logger.debug("OC dynamic baseline: mean=%.2f%%, std=%.2f%%", oc_mean, oc_std)
+        logger.debug("HL dynamic baseline: mean=%.2f%%, std=%.2f%%", hl_mean, hl_std)
 
         if (latest_oc - oc_mean) > std_multiplier * oc_std:
-            print(f"[ALERT] Dynamic OC anomaly detected (> {std_multiplier} std devs above mean)")
+            logger.info("Dynamic OC anomaly detected (> %s std devs above mean)", std_multiplier)
             return True
         if (latest_hl - hl_mean) > std_multiplier * hl_std:
-            print(f"[ALERT] Dynamic HL anomaly detected (> {std_multiplier} std devs above mean)")
+            logger.info("Dynamic HL anomaly detected (> %s std devs above mean)", std_multiplier)
             return True
     else:
-        print("[INFO] Not enough data for dynamic threshold evaluation.")
+        logger.debug("Not enough data for dynamic threshold evaluation.")
 
-    print("[INFO] No alert triggered.")
+    logger.debug("No alert triggered.")
     return False
 
-
-
-if __name__ == "__main__":
-    TICKER = "AAPL"
-    data = fetch_price_with_fallback(TICKER)
-    output = {
-        "ticker": TICKER,
+def new_price_result(ticker: str, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0,
+                     interval="1d") -> dict:
+    """
+    Empty structured result (no alert, no metrics) for a ticker.
+    """
+    return {
+        "ticker": ticker,
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "alert": False,
         "metrics": {},
         "details": {
-            "static_oc_threshold": 5.0,
-            "static_hl_threshold": 7.0,
-            "dynamic_window": 3,
-            "std_multiplier": 2.0
+            "static_oc_threshold": static_oc,
+            "static_hl_threshold": static_hl,
+            "dynamic_window": dynamic_window,
+            "std_multiplier": std_multiplier,
+            "interval": interval
         }
     }
 
-    if data is not None:
+def build_price_result(ticker: str, data: pd.DataFrame, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0,
+                       interval="1d") -> dict:
+    """
+    Run the enriched alert logic on fetched data and build the structured result.
+    The deltas and the dynamic window are per bar of interval.
+    """
+    output = new_price_result(ticker, static_oc, static_hl, dynamic_window, std_multiplier, interval)
+
+    if data is not None and not data.empty:
         data = compute_deltas(data)
-        alert = check_alert_enriched(data)
-        output["alert"] = alert
+        output["alert"] = check_alert_enriched(data, static_oc, static_hl, dynamic_window, std_multiplier)
 
         latest_row = data.iloc[-1]
         output["metrics"] = {
@@ -170,8 +446,46 @@ if __name__ == "__main__":
             "delta_hl": float(latest_row.get("Delta_HL", float("nan")))
         }
 
-    else:
-        print("[ERROR] No data fetched from any source.")
+    return output
+
+def run_price_agent_batch(tickers: list, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0,
+                          period="1y", interval="1d") -> list:
+    """
+    Fetch a whole watchlist in bulk and run the alert logic for every ticker.
+    Alerts are evaluated for the whole watchlist at once by the vectorized engine.
+    """
+    prices = fetch_prices_batch(tickers, period=period, interval=interval)
+    return evaluate_prices_batch(prices, static_oc, static_hl, dynamic_window, std_multiplier, interval)
+
+def evaluate_prices_batch(prices: dict, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0,
+                          interval="1d") -> list:
+    """
+    Price agent results for already fetched frames (ticker -> DataFrame or None).
+    """
+    latest = latest_alerts(build_panel(prices), static_oc, static_hl, dynamic_window, std_multiplier)
+
+    results = []
+    for ticker in prices:
+        output = new_price_result(ticker, static_oc, static_hl, dynamic_window, std_multiplier, interval)
+        if ticker in latest.index:
+            row = latest.loc[ticker]
+            output["alert"] = bool(row["alert"])
+            output["metrics"] = {
+                "delta_oc": float(row["delta_oc"]),
+                "delta_hl": float(row["delta_hl"])
+            }
+        results.append(output)
+    return results
+
+
+
+if __name__ == "__main__":
+    TICKER = "AAPL"
+    data = fetch_price_with_fallback(TICKER)
+    output = build_price_result(TICKER, data)
+
+    if data is None:
+        logger.error("No data fetched from any source.")
 
     # Final structured output
     print(json.dumps(output, indent=2))
@@ -0,0 +1,286 @@
+"""
+price_monitor.py
+
+Long-running price monitor for a watchlist.
+Polls a quote source (live providers or a local replay), updates each ticker's
+deltas incrementally and evaluates check_alert_enriched semantics on every
+new bar. Alerts are pushed to subscribers (the API's SSE / WebSocket streams).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.config import getenv
+from agents.alert_engine import (window_stats, REASON_STATIC_OC, REASON_STATIC_HL,
+                                 REASON_DYNAMIC_OC, REASON_DYNAMIC_HL)
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+MONITOR_INTERVAL = float(getenv("MONITOR_INTERVAL", 60))  # seconds between polls
+
+
+class TickerState:
+    """
+    Incremental alert state for one ticker: the last dynamic_window + 1 deltas
+    and the number of bars seen, which is all check_alert_enriched looks at.
+    """
+
+    def __init__(self, dynamic_window: int):
+        self.deltas = deque(maxlen=dynamic_window + 1)  # (timestamp, delta_oc, delta_hl)
+        self.count = 0
+        self.notified = None  # (timestamp, reason) of the last evaluation passed on
+
+    def update(self, timestamp, open_, high, low, close) -> bool:
+        """
+        Add a bar; a bar with the latest timestamp replaces it. Returns False for stale bars.
+        """
+        delta_oc = ((close - open_) / open_) * 100
+        delta_hl = ((high - low) / open_) * 100
+        if self.deltas and timestamp < self.deltas[-1][0]:
+            return False
+        if self.deltas and timestamp == self.deltas[-1][0]:
+            self.deltas[-1] = (timestamp, delta_oc, delta_hl)
+        else:
+            self.deltas.append((timestamp, delta_oc, delta_hl))
+            self.count += 1
+        return True
+
+
+class PriceMonitor:
+    """
+    Evaluates the enriched alert rule bar by bar for every ticker of a watchlist.
+    """
+
+    def __init__(self, source, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0,
+                 broadcaster=None, on_result=None):
+        self.source = source
+        self.static_oc = static_oc
+        self.static_hl = static_hl
+        self.dynamic_window = dynamic_window
+        self.std_multiplier = std_multiplier
+        self.broadcaster = broadcaster
+        self.on_result = on_result
+        self.states = {}
+
+    def evaluate(self, state: TickerState):
+        """
+        Alert reason for the latest bar of a ticker ("" when no alert).
+        """
+        _, latest_oc, latest_hl = state.deltas[-1]
+        if abs(latest_oc) >= self.static_oc:
+            return REASON_STATIC_OC
+        if abs(latest_hl) >= self.static_hl:
+            return REASON_STATIC_HL
+
+        window = self.dynamic_window
+        if window > 0 and state.count > window:
+            hist = np.array([d[1:] for d in list(state.deltas)[:-1]])  # (window, 2)
+            mean, std = window_stats(hist, window)
+            with np.errstate(invalid="ignore"):
+                if (latest_oc - mean[0, 0]) > self.std_multiplier * std[0, 0]:
+                    return REASON_DYNAMIC_OC
+                if (latest_hl - mean[0, 1]) > self.std_multiplier * std[0, 1]:
+                    return REASON_DYNAMIC_HL
+        return ""
+
+    def process_bar(self, ticker: str, timestamp, open_, high, low, close, notify: bool = True) -> dict:
+        """
+        Update one ticker with a new bar and return its evaluation, or None for stale bars.
+        notify=False evaluates silently (used to prime state from history).
+        Subscribers are only notified when the (bar timestamp, reason) pair changes,
+        so polling the same bar again does not repeat its alert.
+        """
+        state = self.states.get(ticker)
+        if state is None:
+            state = self.states[ticker] = TickerState(self.dynamic_window)
+        if not state.update(pd.Timestamp(timestamp), open_, high, low, close):
+            return None
+
+        reason = self.evaluate(state)
+        _, delta_oc, delta_hl = state.deltas[-1]
+        result = {
+            "ticker": ticker,
+            "timestamp": pd.Timestamp(timestamp).isoformat(),
+            "alert": bool(reason),
+            "reason": reason,
+            "delta_oc": float(delta_oc),
+            "delta_hl": float(delta_hl),
+        }
+        if not notify:
+            return result
+        key = (state.deltas[-1][0], reason)
+        if key == state.notified:
+            return result
+        state.notified = key
+        if self.on_result is not None:
+            self.on_result(result)
+        if reason and self.broadcaster is not None:
+            self.broadcaster.publish(result)
+        return result
+
+    def warmup(self):
+        """
+        Prime every ticker's state from the source's history without notifying.
+        """
+        for ticker, timestamp, open_, high, low, close in getattr(self.source, "warmup", list)():
+            self.process_bar(ticker, timestamp, open_, high, low, close, notify=False)
+
+    def poll_once(self):
+        """
+        Pull one batch of bars from the source and evaluate them.
+        Returns the list of evaluations, or None once the source is exhausted.
+        """
+        bars = self.source.poll()
+        if bars is None:
+            return None
+        results = []
+        for ticker, timestamp, open_, high, low, close in bars:
+            result = self.process_bar(ticker, timestamp, open_, high, low, close)
+            if result is not None:
+                results.append(result)
+        return results
+
+    async def run(self, interval: float = MONITOR_INTERVAL, stop: asyncio.Event = None):
+        """
+        Poll until the source is exhausted or stop is set.
+        """
+        stop = stop or asyncio.Event()
+        await asyncio.to_thread(self.warmup)
+        while not stop.is_set():
+            results = await asyncio.to_thread(self.poll_once)
+            if results is None:
+                return
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+class ReplaySource:
+    """
+    Local stand-in for a quote feed: replays stored OHLC frames bar by bar,
+    one timestamp per poll, across all tickers.
+    """
+
+    def __init__(self, frames: dict):
+        rows = []
+        for ticker, frame in frames.items():
+            for ts, o, h, l, c in zip(frame.index, frame["Open"], frame["High"], frame["Low"], frame["Close"]):
+                rows.append((pd.Timestamp(ts), ticker, float(o), float(h), float(l), float(c)))
+        rows.sort(key=lambda r: r[0])
+        self._batches = deque()
+        for row in rows:
+            if not self._batches or self._batches[-1][0][0] != row[0]:
+                self._batches.append([])
+            self._batches[-1].append(row)
+
+    def poll(self):
+        if not self._batches:
+            return None
+        return [(ticker, ts, o, h, l, c) for ts, ticker, o, h, l, c in self._batches.popleft()]
+
+
+class PollingSource:
+    """
+    Live source: the watchlist's latest daily bars via the bulk fetch.
+    warmup() returns enough history to prime the dynamic window; each poll
+    then returns the latest bar, which replaces the state's latest bar while
+    its session is still open. Revisions of older bars are not picked up.
+    """
+
+    def __init__(self, watchlist: list, period: str = "1mo", interval: str = "1d"):
+        self.watchlist = watchlist
+        self.period = period
+        self.interval = interval
+
+    def _fetch(self, tail: int = None):
+        from agents.price_agent import fetch_prices_batch
+
+        prices = fetch_prices_batch(self.watchlist, period=self.period, interval=self.interval, refresh=True)
+        bars = []
+        for ticker, data in prices.items():
+            if data is None or data.empty:
+                continue
+            data = data.dropna(subset=["Open", "High", "Low", "Close"])
+            if tail is not None:
+                data = data.tail(tail)
+            for ts, o, h, l, c in zip(data.index, data["Open"], data["High"], data["Low"], data["Close"]):
+                bars.append((ticker, ts, float(o), float(h), float(l), float(c)))
+        return bars
+
+    def warmup(self):
+        return self._fetch()
+
+    def poll(self):
+        return self._fetch(tail=1)
+
+
+class AlertBroadcaster:
+    """
+    Fan-out of alert events to asyncio subscribers (SSE / WebSocket clients).
+    publish() is safe to call from any thread.
+    """
+
+    def __init__(self, history: int = 100):
+        self.recent = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event: dict):
+        self.recent.append(event)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def subscribe(self):
+        """
+        Async iterator over new alert events.
+        """
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.add(entry)
+        try:
+            while True:
+                yield await entry[1].get()
+        finally:
+            with self._lock:
+                self._subscribers.discard(entry)
+
+
+alert_broadcaster = AlertBroadcaster()
+
+
+def parse_watchlist(value: str) -> list:
+    return [t.strip().upper() for t in (value or "").split(",") if t.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitor a watchlist and print alerts as they trigger.")
+    parser.add_argument("--watchlist", default=getenv("MONITOR_WATCHLIST", "AAPL"),
+                        help="Comma-separated ticker symbols")
+    parser.add_argument("--interval", type=float, default=MONITOR_INTERVAL, help="Seconds between polls")
+    args = parser.parse_args()
+
+    def print_alert(result):
+        if result["alert"]:
+            print(json.dumps({**result, "received": datetime.utcnow().isoformat() + "Z"}))
+
+    monitor = PriceMonitor(PollingSource(parse_watchlist(args.watchlist)), on_result=print_alert)
+    try:
+        asyncio.run(monitor.run(interval=args.interval))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,178 @@
+"""
+fixtures.py
+
+Market-data and LLM fixtures for the benchmark suite, and local stand-ins that
+serve them in place of yfinance, Finnhub and OpenAI.
+
+Daily bars are synthetic: a deterministic random walk per symbol shaped like
+a yf.download result (synthetic_bars). No recorded bars are checked in, so the
+default suite and CI run on synthetic data only; bars recorded with
+record_bars.py into benchmarks/fixtures/recorded/<TICKER>.csv replace them
+for those tickers. The Finnhub quote and OpenAI completion JSON files are
+hand-written samples in the providers' response shapes.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+RECORDED_BARS_DIR = os.path.join(FIXTURES_DIR, "recorded")
+TRADING_DAYS = 252
+
+
+def universe(size: int) -> list:
+    """
+    Recorded tickers first, then synthetic symbols up to size.
+    """
+    recorded = (sorted(name[:-4] for name in os.listdir(RECORDED_BARS_DIR))
+                if os.path.isdir(RECORDED_BARS_DIR) else [])
+    return (recorded + [f"SYN{i:04d}" for i in range(size)])[:size]
+
+
+def synthetic_bars(ticker: str, days: int = TRADING_DAYS, end: str = None) -> pd.DataFrame:
+    """
+    Deterministic daily OHLCV frame shaped like an unadjusted yf.download result.
+    """
+    rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+    index = pd.bdate_range(end=end or pd.Timestamp.now().normalize(), periods=days, name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.018, days)))
+    open_ = close * (1 + rng.normal(0, 0.008, days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, days)))
+    volume = rng.integers(1_000_000, 50_000_000, days).astype(float)
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close,
+                         "Adj Close": close, "Volume": volume}, index=index)
+
+
+def bars_source(ticker: str) -> str:
+    """
+    "recorded" when record_bars.py saved bars for ticker, "synthetic" otherwise.
+    """
+    return "recorded" if os.path.exists(os.path.join(RECORDED_BARS_DIR, f"{ticker}.csv")) else "synthetic"
+
+
+def daily_bars(ticker: str) -> pd.DataFrame:
+    """
+    The recorded daily bars of ticker, or synthetic_bars(ticker) when there are none.
+    """
+    if bars_source(ticker) == "recorded":
+        return pd.read_csv(os.path.join(RECORDED_BARS_DIR, f"{ticker}.csv"), index_col=0, parse_dates=True)
+    return synthetic_bars(ticker)
+
+
+def load_json(name: str) -> dict:
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return json.load(f)
+
+
+class FixtureMarket:
+    """
+    Stand-in for yf.download and the Finnhub quote endpoint, with optional
+    simulated network latency (seconds per call).
+    """
+
+    def __init__(self, tickers: list, latency: float = 0.0):
+        self.frames = {t: daily_bars(t) for t in tickers}
+        self.quote = load_json("finnhub_quote.json")
+        self.latency = latency
+        self.calls = 0
+
+    def download(self, tickers, period=None, interval="1d", start=None, group_by=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+        frames = {}
+        for symbol in symbols:
+            frame = self.frames.get(symbol)
+            if frame is None:
+                continue
+            if start is not None:
+                frame = frame[frame.index >= pd.Timestamp(start).tz_localize(None)]
+            frames[symbol] = frame
+        if isinstance(tickers, str):
+            return frames.get(tickers, pd.DataFrame()).copy()
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+    def get(self, url, *args, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(status_code=200, headers={}, json=lambda: dict(self.quote))
+
+
+class FixtureLLM:
+    """
+    Stand-in for the OpenAI client: answers every prompt with the recorded completion.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.answer = json.dumps(load_json("openai_chat_completion.json"))
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, max_tokens, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        message = SimpleNamespace(content=self.answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@contextlib.contextmanager
+def standins(tickers: list, network_latency: float = 0.0, llm_latency: float = 0.0):
+    """
+    Route every provider, cache and database used by the pipeline to local
+    stand-ins and a scratch directory. Yields (market, llm).
+    """
+    from agents import kpi_agent, news_agent, price_agent
+    from orchestrator import ai_utils, db_utils, rolling_stats
+    from utils import cache
+    from utils.bar_store import BarStore
+    from utils.cache import TTLCache
+    from utils.memory import VectorStore
+    from utils.rate_limiter import TokenBucket
+
+    market = FixtureMarket(tickers, latency=network_latency)
+    llm = FixtureLLM(latency=llm_latency)
+    unlimited = TokenBucket(rate=1e9, capacity=1e9)  # the stand-ins have no quota
+    with tempfile.TemporaryDirectory() as scratch, contextlib.ExitStack() as stack:
+        market_cache = TTLCache(ttl=900, max_entries=max(512, 4 * len(tickers)))
+        memory = VectorStore(os.path.join(scratch, "memory"))
+        for target, name, value in [
+            (price_agent.yf, "download", market.download),
+            (price_agent.requests, "get", market.get),
+            (price_agent, "get_limiter", lambda provider: unlimited),
+            (price_agent, "market_cache", market_cache),
+            (cache, "market_cache", market_cache),
+            (price_agent, "bar_store", BarStore(os.path.join(scratch, "bars"))),
+            (db_utils, "DB_PATH", os.path.join(scratch, "agentic.db")),
+            (news_agent, "NEWS_DB_PATH", os.path.join(scratch, "news.db")),
+            (news_agent, "schedule_refresh", lambda ticker: None),  # news context stays a local read
+            (kpi_agent, "KPI_REPORTS_DIR", os.path.join(scratch, "reports")),
+            (rolling_stats, "_registry", {}),
+            (ai_utils, "llm_cache", TTLCache(ttl=86400)),
+            (ai_utils, "memory_store", memory),
+            (news_agent, "memory_store", memory),
+            (ai_utils, "_client", llm),
+            (ai_utils, "OPENAI_API_KEY", "benchmark"),
+        ]:
+            stack.enter_context(patch.object(target, name, value))
+        try:
+            yield market, llm
+        finally:
+            # Rows still queued by the handler belong to the scratch database
+            db_utils.price_log_writer.flush()
+            db_utils.close_connections()
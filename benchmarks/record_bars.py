@@ -0,0 +1,32 @@
+"""
+record_bars.py
+
+Record real daily bars into benchmarks/fixtures/recorded so the benchmark
+suite replays market data instead of synthetic random walks. Needs network.
+
+    python benchmarks/record_bars.py --tickers AAPL,MSFT,NVDA --period 1y
+"""
+
+import argparse
+import os
+
+import yfinance as yf
+
+from fixtures import RECORDED_BARS_DIR
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record yfinance daily bars as benchmark fixtures.")
+    parser.add_argument("--tickers", required=True, help="Comma-separated ticker symbols")
+    parser.add_argument("--period", default="1y")
+    args = parser.parse_args()
+
+    os.makedirs(RECORDED_BARS_DIR, exist_ok=True)
+    for ticker in [t.strip().upper() for t in args.tickers.split(",") if t.strip()]:
+        data = yf.download(ticker, period=args.period, interval="1d", progress=False,
+                           auto_adjust=False, multi_level_index=False)
+        if data.empty:
+            print(f"[WARN] No data for {ticker}, skipped.")
+            continue
+        path = os.path.join(RECORDED_BARS_DIR, f"{ticker}.csv")
+        data.to_csv(path)
+        print(f"[INFO] Recorded {len(data)} bars to {path}")
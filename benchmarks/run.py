@@ -0,0 +1,225 @@
+"""
+run.py
+
+Offline performance benchmarks for the price pipeline.
+
+Runs the hot paths (deltas, alert checks, 52-week stats, trend indicators,
+batch alert engine, price log writes and reads, and the full /price handler)
+against local fixtures at several universe sizes, and reports throughput,
+p50 / p99 latency and peak traced memory. Daily bars are synthetic unless
+recorded ones exist (see fixtures.py); each record says which ("bars").
+Results can be saved as JSON and compared with a previous run to spot regressions.
+
+    python benchmarks/run.py --sizes 10,100,500 --json bench.json
+    python benchmarks/run.py --compare bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import universe, daily_bars, bars_source, standins
+from agents.price_agent import (compute_deltas, check_alert_enriched, build_price_result, evaluate_prices_batch,
+                                new_price_result)
+from orchestrator.history_utils import history_from_prices, compute_52week_stats, compute_trend_indicators
+from orchestrator import db_utils
+
+DEFAULT_SIZES = [10, 100, 500]
+# Benchmarks whose later passes would hit the caches the first one filled
+SINGLE_PASS = {"price_handler"}
+
+
+def _frames(tickers):
+    return [daily_bars(t)[["Open", "High", "Low", "Close"]] for t in tickers]
+
+
+def _price_results(tickers):
+    results = []
+    for ticker, frame in zip(tickers, _frames(tickers)):
+        results.append(build_price_result(ticker, frame))
+    return results
+
+
+# Each benchmark takes the universe and returns (func, items, units_per_item):
+# func is timed once per item, throughput is reported in units (tickers) per second.
+
+def bench_compute_deltas(tickers):
+    return compute_deltas, _frames(tickers), 1
+
+
+def bench_check_alert_enriched(tickers):
+    return check_alert_enriched, _frames(tickers), 1
+
+
+def bench_compute_52week_stats(tickers):
+    return compute_52week_stats, [history_from_prices(f) for f in _frames(tickers)], 1
+
+
+def bench_compute_trend_indicators(tickers):
+    return compute_trend_indicators, [history_from_prices(f) for f in _frames(tickers)], 1
+
+
+def bench_alert_engine_batch(tickers):
+    prices = dict(zip(tickers, _frames(tickers)))
+    return evaluate_prices_batch, [prices], len(tickers)
+
+
+def bench_db_log_price_result(tickers):
+    db_utils.init_db()
+    return db_utils.log_price_result, _price_results(tickers), 1
+
+
+def bench_db_writer_batch(tickers):
+    db_utils.init_db()
+    results = _price_results(tickers)
+
+    def write_all(batch):
+        writer = db_utils.PriceLogWriter(batch_size=len(batch) + 1)
+        for result in batch:
+            writer.submit(result)
+        writer.flush()
+
+    return write_all, [results], len(tickers)
+
+
+def bench_db_query_price_logs(tickers):
+    db_utils.init_db()
+    db_utils.log_price_results(_price_results(tickers) * 20)
+    return lambda ticker: db_utils.query_price_logs(ticker=ticker, limit=10), list(tickers), 1
+
+
+def bench_price_handler(tickers):
+    from orchestrator.orchestrator import price_agent
+    db_utils.init_db()
+    return lambda ticker: asyncio.run(price_agent(ticker)), list(tickers), 1
+
+
+def bench_price_handler_warm(tickers):
+    # Bars stored and the market and LLM caches filled, as on a repeat request
+    func, items, units = bench_price_handler(tickers)
+    for ticker in items:
+        func(ticker)
+    return func, items, units
+
+
+BENCHMARKS = {
+    "compute_deltas": bench_compute_deltas,
+    "check_alert_enriched": bench_check_alert_enriched,
+    "compute_52week_stats": bench_compute_52week_stats,
+    "compute_trend_indicators": bench_compute_trend_indicators,
+    "alert_engine_batch": bench_alert_engine_batch,
+    "db_log_price_result": bench_db_log_price_result,
+    "db_writer_batch": bench_db_writer_batch,
+    "db_query_price_logs": bench_db_query_price_logs,
+    "price_handler": bench_price_handler,
+    "price_handler_warm": bench_price_handler_warm,
+}
+
+
+def measure(func, items, units_per_item=1, repeat=3, memory=True) -> dict:
+    """
+    Time func over every item (repeat passes) and, optionally, trace peak memory of one pass.
+    """
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            t0 = time.perf_counter_ns()
+            func(item)
+            latencies.append(time.perf_counter_ns() - t0)
+    total = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        for item in items:
+            func(item)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    latencies = np.array(latencies) / 1e6  # ms
+    return {
+        "calls": len(latencies),
+        "throughput": len(latencies) * units_per_item / total if total else float("inf"),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "peak_mib": peak / 2 ** 20 if peak is not None else None,
+    }
+
+
+def run_suite(sizes=DEFAULT_SIZES, names=None, repeat=3, memory=True, network_latency=0.0,
+              llm_latency=0.0) -> list:
+    """
+    Run the selected benchmarks at every universe size. Returns one record per (benchmark, size).
+    """
+    names = names or list(BENCHMARKS)
+    records = []
+    for size in sizes:
+        tickers = universe(size)
+        sources = {bars_source(t) for t in tickers}
+        bars = sources.pop() if len(sources) == 1 else "mixed"
+        for name in names:
+            # Fresh stand-ins, caches and database per benchmark so runs do not leak state
+            with standins(tickers, network_latency=network_latency, llm_latency=llm_latency):
+                func, items, units = BENCHMARKS[name](tickers)
+                record = measure(func, items, units, repeat=1 if name in SINGLE_PASS else repeat, memory=memory)
+            records.append({"benchmark": name, "size": size, "bars": bars, **record})
+    return records
+
+
+def format_table(records: list, baseline: list = None) -> str:
+    previous = {(r["benchmark"], r["size"]): r for r in baseline or []}
+    header = f"{'benchmark':<26}{'size':>6}{'calls':>8}{'tickers/s':>13}{'p50 ms':>10}{'p99 ms':>10}{'peak MiB':>10}"
+    if previous:
+        header += f"{'Δ p50':>9}{'Δ thru':>9}"
+    lines = [header, "-" * len(header)]
+    for r in records:
+        peak = f"{r['peak_mib']:.2f}" if r["peak_mib"] is not None else "-"
+        line = (f"{r['benchmark']:<26}{r['size']:>6}{r['calls']:>8}{r['throughput']:>13.1f}"
+                f"{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{peak:>10}")
+        old = previous.get((r["benchmark"], r["size"]))
+        if old:
+            line += f"{(r['p50_ms'] / old['p50_ms'] - 1) * 100:>+8.1f}%{(r['throughput'] / old['throughput'] - 1) * 100:>+8.1f}%"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline performance benchmarks.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Universe sizes")
+    parser.add_argument("--only", default=None, help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over each universe")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--network-latency", type=float, default=0.0, help="Simulated seconds per provider call")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM call")
+    parser.add_argument("--json", default=None, help="Write the results to this file")
+    parser.add_argument("--compare", default=None, help="Previous --json results to compare with")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)  # keep per-call logging out of the measurements
+    records = run_suite(
+        sizes=[int(s) for s in args.sizes.split(",")],
+        names=args.only.split(",") if args.only else None,
+        repeat=args.repeat,
+        memory=not args.no_memory,
+        network_latency=args.network_latency,
+        llm_latency=args.llm_latency,
+    )
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_table(records, baseline))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(records, f, indent=2)
@@ -0,0 +1,118 @@
+"""
+startup.py
+
+Cold-start benchmark: imports each entry point (API app, agents, CLIs) in a
+fresh interpreter and reports the import time, the whole process time and
+which heavy, deferred modules the import pulled in anyway.
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --only api --profile 15
+    python benchmarks/startup.py --budget 1.0   # exit 1 when the API import is slower
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# name -> module imported by that entry point
+STARTUP_TARGETS = {
+    "api": "orchestrator.orchestrator",
+    "price_agent": "agents.price_agent",
+    "news_agent": "agents.news_agent",
+    "kpi_agent": "agents.kpi_agent",
+    "price_monitor": "agents.price_monitor",
+    "scanner": "orchestrator.scanner",
+    "backtest": "agents.backtest",
+}
+# Only imported by the code paths that use them (see utils/lazy.py)
+DEFERRED_MODULES = ("pandas", "yfinance", "openai", "requests", "bs4", "PyPDF2", "plotly")
+API_IMPORT_BUDGET = 1.0  # seconds, enforced by tests/test_benchmarks.py
+
+_CHILD = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module({module!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_s": elapsed, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def _run(args: list) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def measure_startup(module: str, runs: int = 5) -> dict:
+    """
+    Import module in runs fresh interpreters: median / min import and process seconds,
+    and the deferred modules it loaded.
+    """
+    imports, walls, loaded = [], [], set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = json.loads(_run(["-c", _CHILD.format(module=module, deferred=DEFERRED_MODULES)]).stdout)
+        walls.append(time.perf_counter() - start)
+        imports.append(result["import_s"])
+        loaded.update(result["loaded"])
+    return {
+        "module": module,
+        "runs": runs,
+        "import_s": statistics.median(imports),
+        "import_min_s": min(imports),
+        "process_s": statistics.median(walls),
+        "deferred_loaded": sorted(loaded),
+    }
+
+
+def import_profile(module: str, top: int = 15) -> list:
+    """
+    [(self_us, cumulative_us, name)] of the slowest imports of module (python -X importtime).
+    """
+    stderr = _run(["-X", "importtime", "-c", f"import {module}"]).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def format_table(records: list) -> str:
+    header = f"{'target':<16}{'module':<28}{'import s':>10}{'min s':>8}{'process s':>11}  deferred loaded"
+    lines = [header, "-" * len(header)]
+    for r in records:
+        lines.append(f"{r['target']:<16}{r['module']:<28}{r['import_s']:>10.3f}{r['import_min_s']:>8.3f}"
+                     f"{r['process_s']:>11.3f}  {', '.join(r['deferred_loaded']) or '-'}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold-start import times of the entry points.")
+    parser.add_argument("--only", default=None, help=f"Comma-separated subset of: {', '.join(STARTUP_TARGETS)}")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument("--profile", type=int, default=0, help="Also list the N slowest imports of each target")
+    parser.add_argument("--budget", type=float, default=None,
+                        help=f"Fail when the API import takes longer (seconds, CI uses {API_IMPORT_BUDGET})")
+    parser.add_argument("--json", default=None, help="Write the results to this file")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(STARTUP_TARGETS)
+    records = [{"target": name, **measure_startup(STARTUP_TARGETS[name], runs=args.runs)} for name in names]
+    print(format_table(records))
+    for name in names if args.profile else []:
+        print(f"\n{name}: slowest imports (self / cumulative ms)")
+        for self_us, cumulative_us, module in import_profile(STARTUP_TARGETS[name], args.profile):
+            print(f"  {self_us / 1000:>8.1f} {cumulative_us / 1000:>8.1f}  {module}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(records, f, indent=2)
+    api = next((r for r in records if r["target"] == "api"), None)
+    if args.budget is not None and api is not None and api["import_s"] > args.budget:
+        sys.exit(f"[ERROR] API import took {api['import_s']:.3f}s, budget {args.budget:.3f}s")
@@ -1,15 +1,99 @@
-import openai
-import os
-from dotenv import load_dotenv
+from __future__ import annotations
 
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+from dataclasses import dataclass, field
+import re
+from utils.cache import TTLCache, SingleFlight
+from utils.config import getenv
+from utils.lazy import lazy_import
+from utils.memory import memory_store, format_memories
+from utils.telemetry import get_logger, count, timed
 
+pd = lazy_import("pandas")
+openai = lazy_import("openai")  # imported on the first LLM call, not at startup
+OPENAI_API_KEY = getenv("OPENAI_API_KEY")
+
+LLM_MODEL = getenv("LLM_MODEL", "gpt-3.5-turbo")
+LLM_CACHE_TTL = float(getenv("LLM_CACHE_TTL", 86400))  # same metrics within a day -> same answer
+LLM_CACHE_MAX_ENTRIES = int(getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+LLM_CACHE_PATH = getenv("LLM_CACHE_PATH", "")  # e.g. db/llm_cache.db to persist across restarts
+LLM_BATCH_SIZE = int(getenv("LLM_BATCH_SIZE", 20))  # tickers per batched decision request
+LLM_BATCH_WORKERS = int(getenv("LLM_BATCH_WORKERS", 4))  # batched requests in flight
+LLM_BATCH_TOKENS_PER_TICKER = 150
+MEMORY_CONTEXT_ITEMS = int(getenv("MEMORY_CONTEXT_ITEMS", 3))  # 0 disables retrieval
+MEMORY_LOOKBACK_DAYS = int(getenv("MEMORY_LOOKBACK_DAYS", 365))
+MEMORY_MAX_CHARS = 200  # per retrieved record, keeps the prompt size bounded
+
+llm_cache = TTLCache(
+    ttl=LLM_CACHE_TTL,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    path=LLM_CACHE_PATH or None,
+    table="llm_responses",
+)
+logger = get_logger(__name__)
+_inflight = SingleFlight()
+_client = None  # anything exposing chat.completions.create(...); None = openai
+
+def set_client(client):
+    """
+    Swap the chat completion client (e.g. a local fake in tests). None restores openai.
+    """
+    global _client
+    _client = client
+
+def _get_client():
+    if _client is not None:
+        return _client
+    openai.api_key = OPENAI_API_KEY
+    return openai
+
+def _prompt_key(model: str, messages: list, max_tokens: int, response_format: dict = None) -> str:
+    normalized = [
+        {"role": m["role"], "content": re.sub(r"\s+", " ", m["content"]).strip()}
+        for m in messages
+    ]
+    payload = json.dumps({"model": model, "messages": normalized, "max_tokens": max_tokens,
+                          "response_format": response_format}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _chat(messages: list, max_tokens: int, model: str = None, response_format: dict = None,
+          validate=None) -> str:
+    """
+    Cached, single-flight chat completion. Identical prompts within the TTL are
+    served locally; concurrent identical prompts share one upstream call.
+    Errors propagate and are never cached, nor are answers rejected by validate.
+    """
+    model = model or LLM_MODEL
+    key = _prompt_key(model, messages, max_tokens, response_format)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        count("llm_cache_hits_total")
+        return cached
+    count("llm_cache_misses_total")
+
+    def call():
+        cached = llm_cache.get(key)  # filled while we waited to lead
+        if cached is not None:
+            return cached
+        extra = {"response_format": response_format} if response_format else {}
+        count("llm_requests_total", model=model)
+        response = _get_client().chat.completions.create(model=model, messages=messages, max_tokens=max_tokens, **extra)
+        content = response.choices[0].message.content.strip()
+        if validate is not None:
+            validate(content)
+        llm_cache.set(key, content)
+        return content
+
+    return _inflight.do(key, call)
+
+@timed("llm_comment")
 def generate_price_comment(result: dict) -> str:
     """
     Generate a price movement comment using OpenAI API.
     """
-    if not openai.api_key:
+    if not OPENAI_API_KEY:
         return "⚠ No OpenAI API key configured."
 
     prompt = (
@@ -20,25 +104,22 @@ def generate_price_comment(result: dict) -> str:
     )
 
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
+        return _chat(
             messages=[
                 {"role": "system", "content": "You are a financial analyst bot."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=100
         )
-        return response.choices[0].message.content.strip()
     except Exception as e:
         return f"⚠ Error generating AI comment: {str(e)}"
 
-def generate_investment_decision(result: dict, stats: dict, trend: dict, news: str = ...) -> str:
+def _decision_context(result: dict, stats: dict, trend: dict, news: str, kpis: str = None,
+                      memory: str = None) -> str:
     """
-    Generate an investment decision with 52-week context.
+    Metrics, 52-week stats, trend indicators, news and (when available) reported
+    KPIs and retrieved history block shared by the decision prompts.
     """
-    if not openai.api_key:
-        return "⚠ No OpenAI API key configured."
-
     trend_text = ""
 
     for period in ["5d", "30d", "90d", "180d", "365d"]:
@@ -50,9 +131,7 @@ def generate_investment_decision(result: dict, stats: dict, trend: dict, news: s
             f"close_slope={trend.get(f'close_slope_{period}', 'N/A')}\n"
         )
 
-    # Exemple d'assemblage final dans le prompt
-    prompt = (
-        f"You are a financial analyst advising a trader.\n"
+    return (
         f"Stock: {result['ticker']}\n"
         f"Current metrics: delta_oc={result['metrics'].get('delta_oc', 'N/A')}%, "
         f"delta_hl={result['metrics'].get('delta_hl', 'N/A')}%\n"
@@ -62,23 +141,276 @@ def generate_investment_decision(result: dict, stats: dict, trend: dict, news: s
         f"std_delta_hl={stats.get('std_delta_hl', 'N/A')}%, 90th_delta_hl={stats.get('90th_delta_hl', 'N/A')}%\n"
         f"Trend indicators:\n{trend_text}"
         f"News context: {news}\n"
+        + (f"Latest reported KPIs: {kpis}\n" if kpis else "")
+        + (f"Relevant history:\n{memory}\n" if memory else "")
+    )
+
+def recall_context(result: dict, news: str = None, kpis: str = None) -> str:
+    """
+    The ticker's past decisions, news and KPIs most similar to the current
+    situation, as prompt lines, or None. Only records from before today are
+    searched, so the prompt (and its LLM cache key) is stable within a day.
+    Never raises: memory is an optional extra for the prompt.
+    """
+    if MEMORY_CONTEXT_ITEMS <= 0:
+        return None
+    try:
+        today = pd.Timestamp.now(tz="UTC").normalize()
+        query = " ".join(str(part) for part in (
+            f"delta_oc={result['metrics'].get('delta_oc')}% delta_hl={result['metrics'].get('delta_hl')}%",
+            "alert triggered" if result["alert"] else "",
+            news if news is not ... else "",
+            kpis or "",
+        ))
+        hits = memory_store.search(query, k=MEMORY_CONTEXT_ITEMS, ticker=result["ticker"],
+                                   since=today - pd.Timedelta(days=MEMORY_LOOKBACK_DAYS), until=today)
+        count("memory_recalls_total", hit=str(bool(hits)).lower())
+        return format_memories(hits, max_chars=MEMORY_MAX_CHARS) or None
+    except Exception as e:
+        logger.error("Memory recall failed for %s: %s", result.get("ticker"), e)
+        return None
+
+def remember(result: dict, decision: str = None, kpis: str = None):
+    """
+    Store a decision and the KPIs it was based on for later recall (news
+    articles are stored by the news agent as they are indexed).
+    Identical texts are stored once. Never raises.
+    """
+    ticker = result["ticker"]
+    records = [
+        {"text": text, "ticker": ticker, "kind": kind, "date": result.get("timestamp")}
+        for kind, text in (("decision", decision), ("kpi", kpis))
+        if isinstance(text, str) and text.strip()
+    ]
+    if not records:
+        return
+    try:
+        memory_store.add_many(records)
+    except Exception as e:
+        logger.error("Memory update failed for %s: %s", ticker, e)
+
+@timed("llm_decision")
+def generate_investment_decision(result: dict, stats: dict, trend: dict, news: str = ..., kpis: str = None) -> str:
+    """
+    Generate an investment decision with 52-week context and, when given, the
+    KPIs of the latest quarterly report (see kpi_agent.load_kpi_context).
+    """
+    if not OPENAI_API_KEY:
+        return "⚠ No OpenAI API key configured."
+
+    prompt = (
+        f"You are a financial analyst advising a trader.\n"
+        f"{_decision_context(result, stats, trend, news, kpis, recall_context(result, news, kpis))}"
         f"Based on this information, advise buy, hold, or sell. "
         f"Explain reasoning. Return JSON: "
         f'{{"decision": "...", "confidence": 0.0, "reasoning": "...", "key_factors": ["...", "..."]}}'
     )
 
-
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
+        decision = _chat(
             messages=[
                 {"role": "system", "content": "You are a financial analyst bot."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=300
         )
-        return response.choices[0].message.content.strip()
+        remember(result, decision, kpis)
+        return decision
     except Exception as e:
         return f"⚠ Error generating decision: {str(e)}"
 
+DECISIONS = ("buy", "hold", "sell")
+
+@dataclass
+class PriceAnalysis:
+    """
+    Structured answer of the combined comment + decision call.
+    """
+    comment: str
+    decision: str
+    confidence: float
+    reasoning: str
+    key_factors: list = field(default_factory=list)
+
+    def decision_dict(self) -> dict:
+        return {
+            "decision": self.decision,
+            "confidence": self.confidence,
+            "reasoning": self.reasoning,
+            "key_factors": self.key_factors,
+        }
+
+def _load_json_object(content) -> dict:
+    if isinstance(content, str):
+        text = content.strip()
+        if text.startswith("```"):
+            text = re.sub(r"^```(?:json)?|```$", "", text).strip()
+        try:
+            content = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"LLM answer is not valid JSON: {e}")
+    if not isinstance(content, dict):
+        raise ValueError("LLM answer is not a JSON object")
+    return content
+
+def _parse_decision(content: dict) -> dict:
+    """
+    Validate the decision fields of a decoded answer and return them normalized.
+    """
+    if not isinstance(content, dict):
+        raise ValueError("decision is not a JSON object")
+    decision = str(content.get("decision", "")).strip().lower()
+    reasoning = content.get("reasoning")
+    key_factors = content.get("key_factors", [])
+    try:
+        confidence = float(content.get("confidence"))
+    except (TypeError, ValueError):
+        raise ValueError("confidence must be a number")
+
+    if decision not in DECISIONS:
+        raise ValueError(f"decision must be one of {DECISIONS}, got {decision!r}")
+    if not 0.0 <= confidence <= 1.0:
+        raise ValueError("confidence must be between 0 and 1")
+    if not isinstance(reasoning, str):
+        raise ValueError("reasoning must be a string")
+    if not isinstance(key_factors, list) or not all(isinstance(k, str) for k in key_factors):
+        raise ValueError("key_factors must be a list of strings")
+
+    return {"decision": decision, "confidence": confidence, "reasoning": reasoning.strip(), "key_factors": key_factors}
+
+def parse_investment_decision(answer: str):
+    """
+    (decision dict, None) for a generate_investment_decision answer, or
+    (None, error message) when it is an error notice or not a valid decision.
+    """
+    if answer.startswith("⚠"):
+        return None, answer.lstrip("⚠").strip()
+    try:
+        return _parse_decision(_load_json_object(answer)), None
+    except ValueError as e:
+        return None, str(e)
+
+def parse_price_analysis(content) -> PriceAnalysis:
+    """
+    Parse and validate an LLM JSON answer (string or already decoded dict).
+    Raises ValueError when it does not match the expected structure.
+    """
+    content = _load_json_object(content)
+    comment = content.get("comment")
+    if not isinstance(comment, str) or not comment.strip():
+        raise ValueError("comment must be a non-empty string")
+    return PriceAnalysis(comment=comment.strip(), **_parse_decision(content))
+
+@timed("llm_analysis")
+def generate_price_analysis(result: dict, stats: dict, trend: dict, news: str = ..., kpis: str = None):
+    """
+    Generate the price comment and the investment decision in one structured call.
+    Returns a PriceAnalysis, or None when no key is configured or the answer is unusable.
+    """
+    if not OPENAI_API_KEY:
+        return None
+
+    prompt = (
+        f"You are a financial analyst advising a trader.\n"
+        f"{_decision_context(result, stats, trend, news, kpis, recall_context(result, news, kpis))}"
+        f"First comment on today's movement in simple financial terms (two sentences at most). "
+        f"Then, based on all of this information, advise buy, hold, or sell and explain your reasoning. "
+        f"Return only a JSON object: "
+        f'{{"comment": "...", "decision": "buy|hold|sell", "confidence": 0.0, "reasoning": "...", "key_factors": ["...", "..."]}}'
+    )
+
+    try:
+        content = _chat(
+            messages=[
+                {"role": "system", "content": "You are a financial analyst bot. Answer in JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=400,
+            response_format={"type": "json_object"},
+            validate=parse_price_analysis
+        )
+        analysis = parse_price_analysis(content)
+    except Exception as e:
+        logger.error("Combined price analysis failed: %s", e)
+        count("llm_errors_total", call="analysis")
+        return None
+    remember(result, f"{analysis.decision} (confidence {analysis.confidence:.2f}): {analysis.reasoning}", kpis)
+    return analysis
+
+def parse_decisions_batch(content, tickers: list) -> dict:
+    """
+    Parse a batched decision answer into {ticker: decision dict}.
+    Raises ValueError unless every requested ticker has a valid decision.
+    """
+    decisions = _load_json_object(content).get("decisions")
+    if not isinstance(decisions, dict):
+        raise ValueError("LLM answer has no 'decisions' object")
+    decisions = {str(t).strip().upper(): d for t, d in decisions.items()}
+    missing = [t for t in tickers if t.upper() not in decisions]
+    if missing:
+        raise ValueError(f"LLM answer is missing decisions for {missing}")
+    return {t: _parse_decision(decisions[t.upper()]) for t in tickers}
+
+def _decisions_chunk(chunk: list) -> dict:
+    tickers = [result["ticker"] for result, *_ in chunk]
+    sections = "\n".join(_decision_context(*item) for item in chunk)
+    prompt = (
+        f"You are a financial analyst advising a trader on {len(chunk)} stocks.\n"
+        f"{sections}\n"
+        f"For each stock, based on its own information only, advise buy, hold, or sell and explain reasoning. "
+        f"Return only a JSON object with one entry per ticker ({', '.join(tickers)}): "
+        f'{{"decisions": {{"TICKER": {{"decision": "buy|hold|sell", "confidence": 0.0, "reasoning": "...", "key_factors": ["...", "..."]}}}}}}'
+    )
+    content = _chat(
+        messages=[
+            {"role": "system", "content": "You are a financial analyst bot. Answer in JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=LLM_BATCH_TOKENS_PER_TICKER * len(chunk) + 50,
+        response_format={"type": "json_object"},
+        validate=lambda answer: parse_decisions_batch(answer, tickers)
+    )
+    return parse_decisions_batch(content, tickers)
+
+def _decisions_with_split(chunk: list) -> dict:
+    # An unusable answer for a chunk is retried as two halves, down to single tickers
+    try:
+        return _decisions_chunk(chunk)
+    except Exception as e:
+        if len(chunk) == 1:
+            logger.error("Decision for %s failed: %s", chunk[0][0]["ticker"], e)
+            count("llm_errors_total", call="decision_batch")
+            return {chunk[0][0]["ticker"]: None}
+        logger.warning("Batched decision for %d tickers failed, splitting: %s", len(chunk), e)
+        middle = len(chunk) // 2
+        return {**_decisions_with_split(chunk[:middle]), **_decisions_with_split(chunk[middle:])}
+
+@timed("llm_decision_batch")
+def generate_investment_decisions_batch(items: list, chunk_size: int = LLM_BATCH_SIZE,
+                                        max_workers: int = LLM_BATCH_WORKERS) -> dict:
+    """
+    Investment decisions for many tickers in a few requests.
+
+    items is a list of (result, stats, trend), (result, stats, trend, news) or
+    (result, stats, trend, news, kpis) tuples.
+    Tickers are packed chunk_size per request, at most max_workers requests run
+    at once. Returns {ticker: decision dict}, None for tickers without a usable answer.
+    """
+    normalized = {}
+    for item in items:
+        result, stats, trend, *extra = item
+        news = extra[0] if extra else "No news available."
+        kpis = extra[1] if len(extra) > 1 else None
+        normalized[result["ticker"]] = (result, stats or {}, trend or {}, news, kpis)
+    if not normalized:
+        return {}
+    if not OPENAI_API_KEY:
+        return dict.fromkeys(normalized)
 
+    entries = list(normalized.values())
+    chunks = [entries[i:i + max(chunk_size, 1)] for i in range(0, len(entries), max(chunk_size, 1))]
+    decisions = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        for chunk_decisions in executor.map(_decisions_with_split, chunks):
+            decisions.update(chunk_decisions)
+    return {ticker: decisions.get(ticker) for ticker in normalized}
@@ -1,45 +1,147 @@
+import atexit
 import sqlite3
 import os
+import threading
+import weakref
+from datetime import datetime, timezone
+from utils.config import getenv
+from utils.telemetry import get_logger, count, stage
 
-DB_PATH = os.path.join("db", "agentic.db")
-
-def init_db():
-    """
-    Initialize the SQLite database and create table if not exists.
-    """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS price_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticker TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            alert INTEGER NOT NULL,
-            delta_oc REAL,
-            delta_hl REAL,
-            static_oc_threshold REAL,
-            static_hl_threshold REAL,
-            dynamic_window INTEGER,
-            std_multiplier REAL
-        )
-    """)
-    conn.commit()
-    conn.close()
+logger = get_logger(__name__)
 
-def log_price_result(result: dict):
+DB_PATH = getenv("AGENTIC_DB_PATH", os.path.join("db", "agentic.db"))
+
+# Tuned for many concurrent readers plus a few writers on one file
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",   # safe with WAL, avoids an fsync per commit
+    "PRAGMA busy_timeout=5000",    # wait for the writer lock instead of 'database is locked'
+    "PRAGMA cache_size=-20000",    # ~20 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+)
+
+PRICE_LOG_COLUMNS = [
+    "id", "ticker", "timestamp", "alert", "delta_oc", "delta_hl",
+    "static_oc_threshold", "static_hl_threshold", "dynamic_window", "std_multiplier"
+]
+
+LOG_BATCH_SIZE = int(getenv("PRICE_LOG_BATCH_SIZE", 200))
+LOG_FLUSH_INTERVAL = float(getenv("PRICE_LOG_FLUSH_INTERVAL", 1.0))  # seconds
+LOG_MAX_PENDING = int(getenv("PRICE_LOG_MAX_PENDING", 100000))  # rows kept for retry while writes fail
+MAX_PAGE_SIZE = int(getenv("PRICE_LOG_MAX_PAGE_SIZE", 1000))  # rows per /price_logs JSON page
+STREAM_BATCH_SIZE = 500  # rows fetched from the cursor at a time when streaming
+
+class _PooledConnection(sqlite3.Connection):
     """
-    Insert a price agent result into the database.
+    sqlite3.Connection that can be weakly referenced by the registry.
+    """
+
+_local = threading.local()
+# (thread id, path) -> connection; entries go away with the thread that owned them
+_all_connections = weakref.WeakValueDictionary()
+_registry_lock = threading.Lock()
+_generation = 0  # bumped by close_connections(): older per-thread pools are stale
+_initialized = set()
+
+def get_connection(path: str = None) -> sqlite3.Connection:
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO price_logs (
-            ticker, timestamp, alert, delta_oc, delta_hl,
-            static_oc_threshold, static_hl_threshold, dynamic_window, std_multiplier
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    Return this thread's pooled connection to the database, opening it on first use.
+    """
+    path = path or DB_PATH
+    pool = getattr(_local, "connections", None)
+    if pool is None or getattr(_local, "generation", None) != _generation:
+        pool = _local.connections = {}
+        _local.generation = _generation
+
+    conn = pool.get(path)
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Each connection is only used by the thread that opened it; the flag just
+        # lets close_connections() close them all from the shutdown thread.
+        conn = sqlite3.connect(path, check_same_thread=False, factory=_PooledConnection)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        pool[path] = conn
+        with _registry_lock:
+            _all_connections[(threading.get_ident(), path)] = conn
+    return conn
+
+def close_connections():
+    """
+    Close every pooled connection (all threads). Call once on shutdown.
+    Threads that use the database afterwards open a new connection.
+    """
+    global _generation
+    with _registry_lock:
+        for conn in list(_all_connections.values()):
+            conn.close()
+        _all_connections.clear()
+        _initialized.clear()
+        _generation += 1
+    _local.__dict__.clear()
+
+def init_db(path: str = None):
+    """
+    Initialize the SQLite database: table and indexes. Runs the schema setup once per process.
+    """
+    path = path or DB_PATH
+    if path in _initialized:
+        return
+
+    conn = get_connection(path)
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS price_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ticker TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                alert INTEGER NOT NULL,
+                delta_oc REAL,
+                delta_hl REAL,
+                static_oc_threshold REAL,
+                static_hl_threshold REAL,
+                dynamic_window INTEGER,
+                std_multiplier REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_price_logs_ticker_id ON price_logs (ticker, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_price_logs_alert_id ON price_logs (alert, id)")
+        # since/until filters: a timestamp range, alone or for one ticker, then paged on id
+        conn.execute("DROP INDEX IF EXISTS idx_price_logs_timestamp")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_price_logs_timestamp_id ON price_logs (timestamp, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_price_logs_ticker_timestamp_id ON price_logs (ticker, timestamp, id)")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # Rows logged before timestamps had a fixed form ("…:33Z" on whole seconds)
+            conn.execute("UPDATE price_logs SET timestamp = substr(timestamp, 1, 19) || '.000000Z' "
+                         "WHERE length(timestamp) = 20 AND timestamp LIKE '%Z'")
+            conn.execute("PRAGMA user_version = 1")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rolling_stats (
+                ticker TEXT PRIMARY KEY,
+                state TEXT NOT NULL
+            )
+        """)
+    _initialized.add(path)
+
+INSERT_PRICE_LOG = """
+    INSERT INTO price_logs (
+        ticker, timestamp, alert, delta_oc, delta_hl,
+        static_oc_threshold, static_hl_threshold, dynamic_window, std_multiplier
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _stored_timestamp(value) -> str:
+    try:
+        return _timestamp_bound(value)
+    except (TypeError, ValueError):
+        return value  # kept as given rather than failing the whole batch
+
+def _price_log_row(result: dict) -> tuple:
+    return (
         result["ticker"],
-        result["timestamp"],
+        _stored_timestamp(result["timestamp"]),
         int(result["alert"]),
         result["metrics"].get("delta_oc"),
         result["metrics"].get("delta_hl"),
@@ -47,17 +149,147 @@ def log_price_result(result: dict):
         result["details"]["static_hl_threshold"],
         result["details"]["dynamic_window"],
         result["details"]["std_multiplier"]
-    ))
-    conn.commit()
-    conn.close()
+    )
+
+def log_price_result(result: dict):
+    """
+    Insert a price agent result into the database.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute(INSERT_PRICE_LOG, _price_log_row(result))
+
+def log_price_results(results: list, path: str = None):
+    """
+    Insert many price agent results in a single transaction.
+    """
+    conn = get_connection(path)
+    with conn:
+        conn.executemany(INSERT_PRICE_LOG, [_price_log_row(r) for r in results])
+
+class PriceLogWriter:
+    """
+    Write-behind queue for price_logs.
+
+    submit() only appends to an in-memory buffer. Rows are written with one
+    executemany transaction when batch_size rows are pending or every
+    flush_interval seconds, by a background thread once start() is called.
+    Without the thread, a full batch is written by the submitting caller.
+    A batch that fails to write (e.g. "database is locked") goes back to the
+    front of the queue and is retried on the next flush; beyond max_pending
+    queued rows the oldest are dropped.
+    """
+
+    def __init__(self, batch_size: int = LOG_BATCH_SIZE, flush_interval: float = LOG_FLUSH_INTERVAL, path: str = None,
+                 max_pending: int = LOG_MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.path = path
+        self.max_pending = max_pending
+        self._pending = []
+        self._failing = False  # last write failed: the background thread waits before retrying
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # keeps batches in submission order
+        self._thread = None
+        self._stopping = False
+
+    def submit(self, result: dict):
+        """
+        Queue a result for the next batch.
+        """
+        with self._cond:
+            self._pending.append(_price_log_row(result))
+            full = len(self._pending) >= self.batch_size
+            if full and self._thread is not None:
+                self._cond.notify()
+        if full and self._thread is None:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write every pending row now. Returns the number of rows written.
+        """
+        with self._write_lock:
+            with self._cond:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            try:
+                with stage("db_write"):
+                    try:
+                        self._write(rows)
+                    except sqlite3.OperationalError as e:
+                        logger.warning("Retrying %d price logs: %s", len(rows), e)
+                        self._write(rows)
+            except sqlite3.Error as e:
+                logger.error("Failed to write %d price logs, kept for the next flush: %s", len(rows), e)
+                count("price_log_errors_total")
+                self._requeue(rows)
+                return 0
+            self._failing = False
+            count("price_logs_written_total", len(rows))
+            return len(rows)
+
+    def _write(self, rows: list):
+        conn = get_connection(self.path)
+        with conn:
+            conn.executemany(INSERT_PRICE_LOG, rows)
+
+    def _requeue(self, rows: list):
+        with self._cond:
+            self._pending = rows + self._pending
+            self._failing = True
+            dropped = len(self._pending) - self.max_pending
+            if dropped > 0:
+                del self._pending[:dropped]
+                logger.error("Dropped %d price logs: more than %d pending", dropped, self.max_pending)
+                count("price_logs_dropped_total", dropped)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def start(self):
+        """
+        Start the background flush thread.
+        """
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="price-log-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and (len(self._pending) < self.batch_size or self._failing):
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def close(self):
+        """
+        Stop the background thread and flush whatever is left.
+        """
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+price_log_writer = PriceLogWriter()
+atexit.register(price_log_writer.close)
 
 def get_recent_logs(ticker: str, limit: int = 5) -> list:
     """
     Retrieve recent price logs for a given ticker from the database.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
+    rows = get_connection().execute(
         """
         SELECT timestamp, alert, delta_oc, delta_hl
         FROM price_logs
@@ -66,9 +298,7 @@ def get_recent_logs(ticker: str, limit: int = 5) -> list:
         LIMIT ?
         """,
         (ticker.upper(), limit)
-    )
-    rows = cursor.fetchall()
-    conn.close()
+    ).fetchall()
 
     # Format as list of dicts
     return [
@@ -76,6 +306,111 @@ def get_recent_logs(ticker: str, limit: int = 5) -> list:
         for r in rows
     ]
 
+def price_log_columns(columns=None) -> list:
+    """
+    Validated projection: a list or comma-separated string of price_logs columns (all when empty).
+    """
+    if not columns:
+        return list(PRICE_LOG_COLUMNS)
+    if isinstance(columns, str):
+        columns = columns.split(",")
+    selected = list(dict.fromkeys(c.strip() for c in columns if c.strip()))
+    unknown = [c for c in selected if c not in PRICE_LOG_COLUMNS]
+    if unknown or not selected:
+        raise ValueError(f"Unknown price_logs columns: {', '.join(unknown) or columns!r}")
+    return selected
+
+def _timestamp_bound(value) -> str:
+    """
+    value (datetime or ISO string) as stored in price_logs.timestamp: naive UTC with
+    microseconds and a trailing "Z". Stored values and bounds compare as text, so
+    both must use exactly this form ("…:33Z" would sort after "…:33.500000Z").
+    """
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat(timespec="microseconds") + "Z"
+
+def _price_logs_query(columns, alert=None, ticker=None, after_id=None, before_id=None, since=None, until=None,
+                      limit=None):
+    query = f"SELECT {', '.join(columns)} FROM price_logs"
+    conditions = []
+    params = []
+
+    if alert is not None:
+        conditions.append("alert = ?")
+        params.append(alert)
+    if ticker is not None:
+        conditions.append("ticker = ?")
+        params.append(ticker.upper())
+    if after_id is not None:
+        conditions.append("id > ?")
+        params.append(after_id)
+    if before_id is not None:
+        conditions.append("id < ?")
+        params.append(before_id)
+    if since is not None:
+        conditions.append("timestamp >= ?")
+        params.append(_timestamp_bound(since))
+    if until is not None:
+        conditions.append("timestamp < ?")
+        params.append(_timestamp_bound(until))
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    # Keyset pagination: walking forward from after_id reads oldest first, otherwise newest first
+    query += " ORDER BY id ASC" if after_id is not None else " ORDER BY id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, tuple(params)
+
+def query_price_logs(alert: int = None, ticker: str = None, limit: int = 10, columns=None, after_id: int = None,
+                     before_id: int = None, since=None, until=None) -> list:
+    """
+    Retrieve one page of price logs, optionally filtered by alert status, ticker and
+    timestamp range (since inclusive, until exclusive).
+
+    Pages are keyed on id: pass the last id of a page as before_id to get the next
+    older page, or as after_id to read forward (oldest first) from that id.
+    columns restricts the returned fields; limit is capped at MAX_PAGE_SIZE.
+    """
+    columns = price_log_columns(columns)
+    query, params = _price_logs_query(columns, alert, ticker, after_id, before_id, since, until,
+                                      limit=max(0, min(limit, MAX_PAGE_SIZE)))
+    rows = get_connection().execute(query, params).fetchall()
+    return [dict(zip(columns, row)) for row in rows]
+
+def _stream_rows(query: str, params: tuple, batch_size: int, path: str):
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=False)  # a streaming response may resume on other threads
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        conn.close()
+
+def iter_price_logs(alert: int = None, ticker: str = None, limit: int = None, columns=None, after_id: int = None,
+                    before_id: int = None, since=None, until=None, batch_size: int = STREAM_BATCH_SIZE,
+                    path: str = None):
+    """
+    Iterator over matching price log rows as tuples (in price_log_columns(columns) order),
+    fetching batch_size rows at a time so memory stays flat for any result size.
+    Same filters as query_price_logs; limit=None streams every row. Invalid
+    columns or bounds raise ValueError here, before anything is read.
+
+    Uses its own connection, closed when the iterator is exhausted or closed, so a
+    slow consumer never holds a pooled connection; under WAL it reads one snapshot
+    without blocking writers.
+    """
+    columns = price_log_columns(columns)
+    query, params = _price_logs_query(columns, alert, ticker, after_id, before_id, since, until, limit=limit)
+    return _stream_rows(query, params, batch_size, path)
+
 def compute_history_stats(history: list) -> dict:
     """
     Compute basic stats from recent history (mean, std, alert count).
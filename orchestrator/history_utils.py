@@ -1,57 +1,47 @@
-import yfinance as yf
-import pandas as pd
+from __future__ import annotations
+
 import numpy as np
+from utils.cache import cached_market_data
+from utils.config import getenv
+from agents.price_agent import fetch_price_yfinance, fetch_candles_finnhub
+from utils.telemetry import get_logger, count
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
 
-import yfinance as yf
-import pandas as pd
-import requests
-import os
+logger = get_logger(__name__)
 
-FINNHUB_API_KEY = os.getenv("FINNHUB_API_KEY")
+FINNHUB_API_KEY = getenv("FINNHUB_API_KEY")
 
+@cached_market_data("history", period="1y", interval="1d")
 def fetch_52week_history(ticker: str) -> pd.DataFrame:
     """
-    Try to fetch 52-week data with yfinance, fallback to Finnhub.
+    Try to fetch 52-week data with yfinance, fallback to Finnhub daily candles.
+    Both sources keep their bars in the local bar store.
     """
-    # First try yfinance
-    data = yf.download(ticker, period="1y", interval="1d", auto_adjust=False)
-    if not data.empty:
-        return _compute_deltas(data)
+    # First try yfinance (incremental update of the bar store)
+    data = fetch_price_yfinance(ticker, period="1y", interval="1d")
+    if data is not None and not data.empty:
+        return history_from_prices(data)
 
-    print(f"[WARN] yfinance failed for {ticker}, trying Finnhub...")
+    logger.warning("yfinance failed for %s, trying Finnhub...", ticker)
+    count("fallbacks_total", source="finnhub_candles")
 
     # Fallback to Finnhub
     if not FINNHUB_API_KEY:
-        print("[ERROR] No Finnhub API key configured.")
-        return pd.DataFrame()
-
-    url = f"https://finnhub.io/api/v1/stock/candle"
-    params = {
-        "symbol": ticker,
-        "resolution": "D",
-        "from": int((pd.Timestamp.now() - pd.Timedelta(days=365)).timestamp()),
-        "to": int(pd.Timestamp.now().timestamp()),
-        "token": FINNHUB_API_KEY
-    }
-
-    resp = requests.get(url, params=params)
-    if resp.status_code != 200:
-        print(f"[ERROR] Finnhub API error: {resp.status_code}")
+        logger.error("No Finnhub API key configured.")
         return pd.DataFrame()
+    return history_from_prices(fetch_candles_finnhub(ticker, period="1y", interval="1d"))
 
-    json_data = resp.json()
-    if json_data.get("s") != "ok":
-        print(f"[ERROR] Finnhub returned error status: {json_data.get('s')}")
+def history_from_prices(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the 52-week history view from an already fetched 1y daily OHLC frame.
+    Avoids a second download when the price agent already pulled the same year.
+    Intraday frames do not span a year; use fetch_52week_history for those tickers.
+    """
+    if data is None or data.empty:
         return pd.DataFrame()
-
-    df = pd.DataFrame({
-        "Open": json_data["o"],
-        "Close": json_data["c"],
-        "High": json_data["h"],
-        "Low": json_data["l"]
-    }, index=pd.to_datetime(json_data["t"], unit="s"))
-
-    return _compute_deltas(df)
+    return _compute_deltas(data[["Open", "High", "Low", "Close"]].copy())
 
 def _compute_deltas(data: pd.DataFrame) -> pd.DataFrame:
     data["Delta_OC"] = (abs(data["Open"] - data["Close"]) / data["Open"]) * 100
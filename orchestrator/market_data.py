@@ -0,0 +1,36 @@
+"""
+market_data.py
+
+Shared market-data layer for the orchestrator.
+Fetches the OHLC frame for a ticker once and derives every view the /price
+pipeline needs (alert deltas, 52-week history) from that single object.
+Other intervals (intraday, weekly) alert on their own bars and keep the daily
+52-week history, so the rolling daily stats never see non-daily bars.
+"""
+
+from agents.price_agent import fetch_price_with_fallback, compute_deltas
+from orchestrator.history_utils import fetch_52week_history, history_from_prices
+from utils.telemetry import stage
+
+
+def load_market_data(ticker: str, interval: str = "1d", period: str = "1y") -> dict:
+    """
+    Fetch the OHLC frame (1y daily by default) once and build the price and history views.
+    Only falls back to a dedicated 52-week fetch when the price fetch did not
+    return a full daily history (another interval, or the Finnhub single-quote fallback).
+    """
+    with stage("fetch"):
+        prices = fetch_price_with_fallback(ticker, period=period, interval=interval)
+
+    with stage("history"):
+        if prices is not None and len(prices) > 1 and interval == "1d":
+            history = history_from_prices(prices)
+        else:
+            history = fetch_52week_history(ticker)
+
+    return {
+        "ticker": ticker,
+        "interval": interval,
+        "prices": compute_deltas(prices) if prices is not None else None,
+        "history": history,
+    }
@@ -1,122 +1,320 @@
-from fastapi import FastAPI
-from agents.price_agent import fetch_price_with_fallback, compute_deltas, check_alert_enriched
-from datetime import datetime
-import pandas as pd
-from orchestrator.db_utils import init_db, log_price_result, get_recent_logs, compute_history_stats
-import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import csv
+import io
+import json
 import sqlite3
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import logging
+import time
+from agents.price_agent import (build_price_result, new_price_result, run_price_agent_batch, fetch_prices_batch,
+                                SUPPORTED_INTERVALS)
+from agents.kpi_agent import load_kpi_context
+from agents.news_agent import news_context as load_news_context, recent_news, search_news
+from agents.price_monitor import PriceMonitor, PollingSource, alert_broadcaster, parse_watchlist, MONITOR_INTERVAL
+from datetime import datetime
+from orchestrator.db_utils import (init_db, close_connections, price_log_writer, query_price_logs, iter_price_logs,
+                                   price_log_columns, STREAM_BATCH_SIZE)
 from fastapi import Query
-from typing import Optional
-from orchestrator.ai_utils import generate_price_comment, generate_investment_decision
-from orchestrator.history_utils import fetch_52week_history, compute_52week_stats, compute_trend_indicators
+from typing import Annotated, Optional
+from orchestrator.ai_utils import (generate_price_comment, generate_investment_decision, generate_price_analysis,
+                                  generate_investment_decisions_batch, parse_investment_decision)
+from orchestrator.history_utils import history_from_prices, fetch_52week_history
+from orchestrator.rolling_stats import update_rolling_context
+from orchestrator.market_data import load_market_data
+from orchestrator.scanner import start_scan, get_scan, cancel_scans
+from utils import telemetry
+from utils.config import getenv
+from utils.telemetry import get_logger, stage
+
+
+
+logger = get_logger(__name__)
+
+WORKER_THREADS = int(getenv("ORCHESTRATOR_THREADS", 64))  # blocking fetch / LLM / DB calls in flight
+MONITOR_WATCHLIST = parse_watchlist(getenv("MONITOR_WATCHLIST", ""))
+
+def _log_monitor_alert(result: dict):
+    if result["alert"]:
+        output = new_price_result(result["ticker"])
+        output["alert"] = True
+        output["metrics"] = {"delta_oc": result["delta_oc"], "delta_hl": result["delta_hl"]}
+        price_log_writer.submit(output)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Default pool (cpu + 4 threads) is too small when most threads wait on the network
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=WORKER_THREADS))
+    init_db()  # schema setup once per process, not per request
+    price_log_writer.start()
 
+    # Optional background monitor pushing alerts to /alerts/stream and /ws/alerts
+    monitor_stop = asyncio.Event()
+    monitor_task = None
+    if MONITOR_WATCHLIST:
+        monitor = PriceMonitor(PollingSource(MONITOR_WATCHLIST), broadcaster=alert_broadcaster,
+                               on_result=_log_monitor_alert)
+        monitor_task = asyncio.create_task(monitor.run(interval=MONITOR_INTERVAL, stop=monitor_stop))
+    yield
+    monitor_stop.set()
+    if monitor_task is not None:
+        await monitor_task
+    await asyncio.to_thread(cancel_scans)
+    price_log_writer.close()
+    close_connections()
 
-DB_PATH = os.path.join("db", "agentic.db")
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    # Per-request stage timings for the Server-Timing header; bypassed when metrics are off
+    if not telemetry.METRICS_ENABLED:
+        return await call_next(request)
+    token, timings = telemetry.begin_request()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        telemetry.end_request(token)
+    total = time.perf_counter() - start
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    telemetry.metrics.observe("request_duration_seconds", total, method=request.method, path=path)
+    telemetry.count("requests_total", method=request.method, path=path, status=response.status_code)
+    response.headers["Server-Timing"] = telemetry.server_timing(timings, total)
+    return response
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(telemetry.metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def root():
     return {"message": "Orchestrator is running"}
 
+def _check_interval(interval: str):
+    if interval not in SUPPORTED_INTERVALS:
+        raise HTTPException(status_code=400,
+                            detail=f"Unsupported interval {interval!r}, use one of {', '.join(SUPPORTED_INTERVALS)}")
+
+def _prepare_price_context(ticker: str, interval: str = "1d"):
+    """
+    Blocking part of /price: single market-data fetch, alert logic and 52-week context.
+    Runs in the worker pool so the event loop stays free.
+    """
+    market_data = load_market_data(ticker, interval=interval)
+    data = market_data["prices"]
+    if data is not None and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Fetched %d rows for %s (%s .. %s)\n%s\n%s", len(data), ticker,
+                     data.index.min(), data.index.max(), data.head(), data.tail())
+
+    with stage("compute"):
+        output = build_price_result(ticker, data, interval=interval)
+        stats_52w, trend = update_rolling_context(ticker, market_data["history"])
+    return output, stats_52w, trend
+
 @app.get("/price")
-def price_agent(ticker: str = "AAPL"):
-    init_db()
-    data = fetch_price_with_fallback(ticker)
-    print(f"[DEBUG] Raw data fetched (rows): {len(data)}")
-    print(f"[DEBUG] Data head:\n{data.head()}")
-    print(f"[DEBUG] Data tail:\n{data.tail()}")
-    output = {
-        "ticker": ticker,
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "alert": False,
-        "metrics": {},
-        "details": {
-            "static_oc_threshold": 5.0,
-            "static_hl_threshold": 7.0,
-            "dynamic_window": 3,
-            "std_multiplier": 2.0
-        }
-    }
-
-    if data is not None:
-        data = compute_deltas(data)
-        alert = check_alert_enriched(data)
-        output["alert"] = alert
-
-        latest_row = data.iloc[-1]
-        delta_oc_val = latest_row.get("Delta_OC", float("nan"))
-        delta_hl_val = latest_row.get("Delta_HL", float("nan"))
-
-        output["metrics"] = {
-            "delta_oc": float(delta_oc_val),
-            "delta_hl": float(delta_hl_val)
-        }
-
-    log_price_result(output)
-    comment = generate_price_comment(output)
+async def price_agent(ticker: str = "AAPL", combined: bool = True, interval: str = "1d"):
+    _check_interval(interval)
+    # News (local index) and the latest report's KPIs (cached by content) are read alongside the market data
+    (output, stats_52w, trend), news_context, kpi_context = await asyncio.gather(
+        asyncio.to_thread(_prepare_price_context, ticker, interval),
+        asyncio.to_thread(load_news_context, ticker),
+        asyncio.to_thread(load_kpi_context, ticker),
+    )
+
+    logger.debug("Decision input for %s", ticker, extra={
+        "metrics": output["metrics"], "alert": output["alert"], "stats_52w": stats_52w,
+        "trend": trend, "news_context": news_context, "kpi_context": kpi_context,
+    })
+
+    price_log_writer.submit(output)
+
+    # One structured call for comment + decision; falls back to the two legacy calls
+    if combined:
+        analysis = await asyncio.to_thread(generate_price_analysis, output, stats_52w, trend, news_context,
+                                           kpi_context)
+        if analysis is not None:
+            output["ia_comment"] = analysis.comment
+            output["ia_decision"] = analysis.decision_dict()
+            return output
+
+    # Both LLM calls only depend on the computed result: run them concurrently
+    comment, decision = await asyncio.gather(
+        asyncio.to_thread(generate_price_comment, output),
+        asyncio.to_thread(generate_investment_decision, output, stats_52w, trend, news_context, kpi_context),
+    )
     output["ia_comment"] = comment
-    history_data = fetch_52week_history(ticker)
-    stats_52w = compute_52week_stats(history_data)
-    news_context = "No major news affecting the stock reported today."  # ou récupéré de ton futur News Agent
-    trend = compute_trend_indicators(history_data)
-    print(f"[DEBUG] Number of data points: {len(data)}")
-    print(f"[DEBUG] First date: {data.index.min()}, Last date: {data.index.max()}")
-
-    print("\n📝 === DECISION INPUT DATA ===")
-    print(f"Ticker: {output['ticker']}")
-    print(f"Current metrics:")
-    print(f"  Delta_OC: {output['metrics'].get('delta_oc', 'N/A')}%")
-    print(f"  Delta_HL: {output['metrics'].get('delta_hl', 'N/A')}%")
-    print(f"Alert status: {'TRIGGERED' if output['alert'] else 'not triggered'}")
-
-    print("\n52-week stats:")
-    for key, value in stats_52w.items():
-        print(f"  {key}: {value}%")
-
-    print("\nTrend indicators (recent dynamics):")
-    for key, value in trend.items():
-        print(f"  {key}: {value}%")
-
-    print(f"\nNews context: {news_context}")
-    print("📝 === END OF INPUT DATA ===\n")
-    decision = generate_investment_decision(output, stats_52w, trend, news_context)
-    output["ia_decision"] = decision
+    # Same shape as the combined path: a decision object, or null plus the reason
+    output["ia_decision"], error = parse_investment_decision(decision)
+    if error is not None:
+        output["ia_error"] = error
     return output
 
+@app.get("/prices")
+async def prices_batch(
+    tickers: str = Query(..., description="Comma-separated ticker symbols"),
+    static_oc: float = Query(5.0, description="Static Open-Close threshold (%)"),
+    static_hl: float = Query(7.0, description="Static High-Low threshold (%)"),
+    dynamic_window: int = Query(3, description="Dynamic window (periods)"),
+    std_multiplier: float = Query(2.0, description="Std deviation multiplier"),
+    decisions: bool = Query(False, description="Add batched LLM investment decisions"),
+    interval: Annotated[str, Query(description="Bar interval (1d, or intraday: 1m, 5m, 15m, ...)")] = "1d"
+):
+    _check_interval(interval)
+    results = await asyncio.to_thread(
+        run_price_agent_batch,
+        tickers.split(","),
+        static_oc=static_oc,
+        static_hl=static_hl,
+        dynamic_window=dynamic_window,
+        std_multiplier=std_multiplier,
+        interval=interval
+    )
+    for output in results:
+        price_log_writer.submit(output)
+    if decisions:
+        batch = await asyncio.to_thread(_batch_decisions, results, interval)
+        for output in results:
+            output["ia_decision"] = batch.get(output["ticker"])
+    return results
+
+def _batch_decisions(results: list, interval: str = "1d") -> dict:
+    # The bulk fetch just cached every frame, so this only re-reads the cache
+    daily = interval == "1d"
+    prices = fetch_prices_batch([r["ticker"] for r in results]) if daily else {}
+    items = []
+    for output in results:
+        ticker = output["ticker"]
+        # Same rule as load_market_data: only a full daily frame feeds the 52-week context,
+        # a single quote row or another interval falls back to the daily history
+        frame = prices.get(ticker)
+        if frame is not None and len(frame) > 1:
+            history = history_from_prices(frame)
+        else:
+            history = fetch_52week_history(ticker)
+        stats, trend = update_rolling_context(ticker, history)
+        items.append((output, stats, trend, load_news_context(ticker), load_kpi_context(ticker)))
+    return generate_investment_decisions_batch(items)
+
+@app.post("/scan")
+def create_scan(
+    tickers: str = Query(..., description="Comma-separated ticker symbols"),
+    static_oc: float = Query(5.0, description="Static Open-Close threshold (%)"),
+    static_hl: float = Query(7.0, description="Static High-Low threshold (%)"),
+    dynamic_window: int = Query(3, description="Dynamic window (periods)"),
+    std_multiplier: float = Query(2.0, description="Std deviation multiplier")
+):
+    scan = start_scan(tickers.split(","), static_oc=static_oc, static_hl=static_hl,
+                      dynamic_window=dynamic_window, std_multiplier=std_multiplier)
+    return scan.progress()
+
+def _scan_or_404(scan_id: str):
+    scan = get_scan(scan_id)
+    if scan is None:
+        raise HTTPException(status_code=404, detail=f"Unknown scan {scan_id}")
+    return scan
+
+@app.get("/scan/{scan_id}")
+def scan_progress(scan_id: str, alerts: bool = Query(False, description="Include the alerting results")):
+    scan = _scan_or_404(scan_id)
+    progress = scan.progress()
+    if alerts:
+        progress["alerts"] = list(scan.alerts)
+    return progress
+
+@app.delete("/scan/{scan_id}")
+def cancel_scan(scan_id: str):
+    scan = _scan_or_404(scan_id)
+    scan.cancel()
+    return scan.progress()
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def _export_chunks(rows, columns: list, fmt: str):
+    """
+    Encode rows as NDJSON or CSV, yielding one text chunk per STREAM_BATCH_SIZE rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        if fmt == "csv":
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row))))
+            buffer.write("\n")
+        pending += 1
+        if pending >= STREAM_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
 @app.get("/price_logs")
 def get_price_logs(
     alert: Optional[int] = Query(None, description="Filter by alert status (1 or 0)"),
     ticker: Optional[str] = Query(None, description="Filter by ticker symbol"),
-    limit: int = Query(10, description="Limit number of results (default 10)")
+    limit: Optional[int] = Query(None, description="Limit number of results (default 10, every row when exporting)"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns to return (default: all)"),
+    after_id: Optional[int] = Query(None, description="Rows with a larger id, oldest first (forward cursor)"),
+    before_id: Optional[int] = Query(None, description="Rows with a smaller id, newest first (next page cursor)"),
+    since: Optional[str] = Query(None, description="Earliest timestamp, ISO 8601 (inclusive)"),
+    until: Optional[str] = Query(None, description="Latest timestamp, ISO 8601 (exclusive)"),
+    fmt: str = Query("json", alias="format", description="json (one page), ndjson or csv (streamed export)")
 ):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    filters = {"alert": alert, "ticker": ticker, "columns": columns, "after_id": after_id,
+               "before_id": before_id, "since": since, "until": until}
+    try:
+        if fmt == "json":
+            return query_price_logs(limit=10 if limit is None else limit, **filters)
+        if fmt not in EXPORT_MEDIA_TYPES:
+            raise ValueError(f"Unsupported format: {fmt!r}")
+        rows = iter_price_logs(limit=limit, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    query = "SELECT * FROM price_logs"
-    conditions = []
-    params = []
+    headers = {"Content-Disposition": "attachment; filename=price_logs.csv"} if fmt == "csv" else None
+    return StreamingResponse(_export_chunks(rows, price_log_columns(columns), fmt),
+                             media_type=EXPORT_MEDIA_TYPES[fmt], headers=headers)
 
-    if alert is not None:
-        conditions.append("alert = ?")
-        params.append(alert)
-    if ticker is not None:
-        conditions.append("ticker = ?")
-        params.append(ticker.upper())
-
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-
-    query += " ORDER BY id DESC LIMIT ?"
-    params.append(limit)
+@app.get("/news")
+def get_news(
+    ticker: Optional[str] = Query(None, description="Ticker symbol"),
+    q: Optional[str] = Query(None, description="Full-text query over indexed titles and bodies"),
+    limit: int = Query(10, description="Number of articles")
+):
+    if q:
+        try:
+            return search_news(q, ticker=ticker, limit=limit)
+        except sqlite3.OperationalError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid search query: {e}")
+    if not ticker:
+        raise HTTPException(status_code=400, detail="ticker or q is required")
+    return recent_news(ticker, limit=limit)
 
-    cursor.execute(query, tuple(params))
-    columns = [col[0] for col in cursor.description]
-    rows = cursor.fetchall()
+@app.get("/alerts/recent")
+def recent_alerts(limit: int = Query(20, description="Number of recent monitor alerts")):
+    return list(alert_broadcaster.recent)[-limit:][::-1]
 
-    conn.close()
+@app.get("/alerts/stream")
+async def stream_alerts():
+    async def events():
+        async for event in alert_broadcaster.subscribe():
+            yield f"event: alert\ndata: {json.dumps(event)}\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream")
 
-    # Convert to list of dicts
-    results = [dict(zip(columns, row)) for row in rows]
-    return results
\ No newline at end of file
+@app.websocket("/ws/alerts")
+async def websocket_alerts(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        async for event in alert_broadcaster.subscribe():
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
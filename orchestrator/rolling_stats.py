@@ -0,0 +1,259 @@
+"""
+rolling_stats.py
+
+Incremental per-ticker statistics for the 52-week context.
+Keeps running sums and a sorted window so a new daily bar updates
+compute_52week_stats / compute_trend_indicators outputs in O(1)
+(O(log n) search for the quantile) instead of recomputing a year of data.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import math
+import threading
+from collections import deque
+
+from orchestrator.db_utils import get_connection, init_db
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+STATS_WINDOW = 252  # 52 weeks of trading days
+TREND_WINDOWS = [(5, "5d"), (30, "30d"), (90, "90d"), (180, "180d"), (250, "365d")]
+REBUILD_EVERY = 1000  # re-sum from scratch periodically to bound float drift
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    """
+    Linear-interpolated percentile of an already sorted list (numpy's default method).
+    """
+    position = (len(sorted_values) - 1) * q / 100
+    lo = math.floor(position)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (position - lo)
+
+
+class RollingStats:
+    """
+    Sliding-window statistics over daily bars (timestamp, Delta_OC, Delta_HL, Close).
+
+    Every window (the 52-week stats window and each trend window) keeps count,
+    sums and sums of squares plus sum(g * close), where g is a global bar counter,
+    so the least-squares close slope is available without refitting.
+    """
+
+    def __init__(self, stats_window: int = STATS_WINDOW):
+        self.stats_window = stats_window
+        self.windows = {"52w": stats_window}
+        self.windows.update({label: size for size, label in TREND_WINDOWS})
+        self.bars = deque(maxlen=max(self.windows.values()) + 1)  # (ts, g, oc, hl, close)
+        self._lock = threading.Lock()
+        self._rebuild()
+
+    # Internal bookkeeping
+
+    def _rebuild(self):
+        self._counter = 0
+        self._updates = 0
+        bars = list(self.bars)
+        self.bars.clear()
+        self._sums = {name: dict.fromkeys(["n", "oc", "hl", "oc2", "hl2", "close", "gclose"], 0.0)
+                      for name in self.windows}
+        self._sorted_oc = []
+        self._sorted_hl = []
+        for ts, _, oc, hl, close in bars:
+            self._append(ts, oc, hl, close)
+        self._updates = 0
+
+    def _apply(self, name: str, bar: tuple, sign: int):
+        _, g, oc, hl, close = bar
+        sums = self._sums[name]
+        sums["n"] += sign
+        sums["oc"] += sign * oc
+        sums["hl"] += sign * hl
+        sums["oc2"] += sign * oc * oc
+        sums["hl2"] += sign * hl * hl
+        sums["close"] += sign * close
+        sums["gclose"] += sign * g * close
+
+    def _apply_sorted(self, bar: tuple, sign: int):
+        for values, value in ((self._sorted_oc, bar[2]), (self._sorted_hl, bar[3])):
+            if sign > 0:
+                bisect.insort(values, value)
+            else:
+                del values[bisect.bisect_left(values, value)]
+
+    def _append(self, ts: int, oc: float, hl: float, close: float):
+        bar = (ts, self._counter, oc, hl, close)
+        self._counter += 1
+        self.bars.append(bar)
+        for name, size in self.windows.items():
+            self._apply(name, bar, +1)
+            if len(self.bars) > size:
+                self._apply(name, self.bars[-size - 1], -1)
+        self._apply_sorted(bar, +1)
+        if len(self.bars) > self.stats_window:
+            self._apply_sorted(self.bars[-self.stats_window - 1], -1)
+
+    def _replace_last(self, ts: int, oc: float, hl: float, close: float):
+        # The last bar sits in every window, so only its values change
+        old = self.bars[-1]
+        bar = (ts, old[1], oc, hl, close)
+        for name in self.windows:
+            self._apply(name, old, -1)
+            self._apply(name, bar, +1)
+        self._apply_sorted(old, -1)
+        self._apply_sorted(bar, +1)
+        self.bars[-1] = bar
+
+    # Public API
+
+    @property
+    def last_timestamp(self):
+        return pd.Timestamp(self.bars[-1][0]) if self.bars else None
+
+    def update(self, timestamp, delta_oc: float, delta_hl: float, close: float) -> bool:
+        """
+        Add one bar. A bar with the same timestamp as the latest one replaces it
+        (e.g. today's bar while the session is still open); older bars are ignored.
+        Returns True when a new bar was appended.
+        """
+        if any(math.isnan(v) for v in (delta_oc, delta_hl, close)):
+            return False
+        ts = pd.Timestamp(timestamp).value
+        with self._lock:
+            if self.bars and ts < self.bars[-1][0]:
+                return False
+            if self.bars and ts == self.bars[-1][0]:
+                self._replace_last(ts, float(delta_oc), float(delta_hl), float(close))
+                return False
+            self._append(ts, float(delta_oc), float(delta_hl), float(close))
+            self._updates += 1
+            if self._updates >= REBUILD_EVERY:
+                self._rebuild()
+            return True
+
+    def update_from_history(self, history: pd.DataFrame) -> int:
+        """
+        Feed only the bars of a history frame (with Delta_OC, Delta_HL, Close)
+        that are not older than the latest stored bar. Returns the number appended.
+        """
+        if history is None or history.empty:
+            return 0
+        if self.bars:
+            history = history[pd.DatetimeIndex(history.index).as_unit("ns").asi8 >= self.bars[-1][0]]
+        appended = 0
+        for ts, oc, hl, close in zip(history.index, history["Delta_OC"], history["Delta_HL"], history["Close"]):
+            appended += self.update(ts, float(oc), float(hl), float(close))
+        return appended
+
+    def stats_52week(self) -> dict:
+        """
+        Same output as history_utils.compute_52week_stats over the stats window.
+        """
+        with self._lock:
+            sums = self._sums["52w"]
+            n = sums["n"]
+            if n == 0:
+                return {
+                    "mean_delta_oc": None,
+                    "std_delta_oc": None,
+                    "90th_delta_oc": None,
+                    "mean_delta_hl": None,
+                    "std_delta_hl": None,
+                    "90th_delta_hl": None
+                }
+            mean_oc = sums["oc"] / n
+            mean_hl = sums["hl"] / n
+            return {
+                "mean_delta_oc": mean_oc,
+                "std_delta_oc": math.sqrt(max(sums["oc2"] / n - mean_oc * mean_oc, 0.0)),
+                "90th_delta_oc": _percentile(self._sorted_oc, 90),
+                "mean_delta_hl": mean_hl,
+                "std_delta_hl": math.sqrt(max(sums["hl2"] / n - mean_hl * mean_hl, 0.0)),
+                "90th_delta_hl": _percentile(self._sorted_hl, 90)
+            }
+
+    def trend_indicators(self) -> dict:
+        """
+        Same output as history_utils.compute_trend_indicators.
+        """
+        indicators = {}
+        with self._lock:
+            for size, label in TREND_WINDOWS:
+                sums = self._sums[label]
+                if sums["n"] < size:
+                    indicators[f"mean_delta_oc_{label}"] = None
+                    indicators[f"mean_delta_hl_{label}"] = None
+                    indicators[f"mean_close_{label}"] = None
+                    indicators[f"close_slope_{label}"] = None
+                    continue
+
+                n = size
+                first_g = self.bars[-n][1]
+                sum_x = n * (n - 1) / 2
+                sum_xx = (n - 1) * n * (2 * n - 1) / 6
+                sum_xy = sums["gclose"] - first_g * sums["close"]  # x relative to window start
+
+                indicators[f"mean_delta_oc_{label}"] = sums["oc"] / n
+                indicators[f"mean_delta_hl_{label}"] = sums["hl"] / n
+                indicators[f"mean_close_{label}"] = sums["close"] / n
+                indicators[f"close_slope_{label}"] = (n * sum_xy - sum_x * sums["close"]) / (n * sum_xx - sum_x ** 2)
+        return indicators
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "stats_window": self.stats_window,
+                "bars": [[ts, oc, hl, close] for ts, _, oc, hl, close in self.bars],
+            }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RollingStats":
+        stats = cls(stats_window=state.get("stats_window", STATS_WINDOW))
+        for ts, oc, hl, close in state.get("bars", []):
+            stats._append(ts, oc, hl, close)
+        return stats
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def load_rolling_stats(ticker: str) -> RollingStats:
+    """
+    Return the in-process stats for a ticker, loading the persisted state on first use.
+    """
+    ticker = ticker.upper()
+    with _registry_lock:
+        stats = _registry.get(ticker)
+        if stats is None:
+            init_db()
+            row = get_connection().execute(
+                "SELECT state FROM rolling_stats WHERE ticker = ?", (ticker,)
+            ).fetchone()
+            stats = RollingStats.from_dict(json.loads(row[0])) if row else RollingStats()
+            _registry[ticker] = stats
+        return stats
+
+
+def save_rolling_stats(ticker: str, stats: RollingStats):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO rolling_stats (ticker, state) VALUES (?, ?)",
+            (ticker.upper(), json.dumps(stats.to_dict()))
+        )
+
+
+def update_rolling_context(ticker: str, history: pd.DataFrame):
+    """
+    Feed the new bars of a history frame and return (stats_52w, trend).
+    Persists the state when a new daily bar was added.
+    """
+    stats = load_rolling_stats(ticker)
+    if stats.update_from_history(history):
+        save_rolling_stats(ticker, stats)
+    return stats.stats_52week(), stats.trend_indicators()
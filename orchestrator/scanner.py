@@ -0,0 +1,279 @@
+"""
+scanner.py
+
+Scan runner for large ticker universes.
+Fetches chunks of the universe on a thread pool (network bound) and runs the
+alert and 52-week stats computation on a process pool (CPU bound), streaming
+each chunk's results to the price log writer as soon as it completes.
+Scans report progress and can be cancelled; run one from the CLI or the API.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import partial
+from multiprocessing import get_context
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.price_agent import fetch_prices_batch, evaluate_prices_batch
+from orchestrator.db_utils import init_db, price_log_writer
+from utils.config import getenv
+from orchestrator.history_utils import history_from_prices, compute_52week_stats
+from utils.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+SCAN_CHUNK_SIZE = int(getenv("SCAN_CHUNK_SIZE", 50))  # tickers per fetch / compute task
+SCAN_FETCH_WORKERS = int(getenv("SCAN_FETCH_WORKERS", 8))
+SCAN_COMPUTE_WORKERS = int(getenv("SCAN_COMPUTE_WORKERS", os.cpu_count() or 1))
+SCAN_HISTORY = 20  # finished scans kept for GET /scan/{id}
+
+
+def evaluate_chunk(prices: dict, params: dict) -> list:
+    """
+    Price agent results plus 52-week stats for one fetched chunk. Runs in a worker process.
+    """
+    results = evaluate_prices_batch(prices, **params)
+    for output in results:
+        data = prices.get(output["ticker"])
+        output["stats_52w"] = compute_52week_stats(history_from_prices(data)) if data is not None and len(data) > 1 else None
+    return results
+
+
+class Scan:
+    """
+    One scan of a ticker universe.
+
+    run() blocks until every chunk is evaluated or the scan is cancelled;
+    start() runs it on a background thread. on_result is called with each
+    ticker's result as its chunk completes.
+    """
+
+    def __init__(self, tickers: list, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0,
+                 period: str = "1y", chunk_size: int = SCAN_CHUNK_SIZE, fetch_workers: int = SCAN_FETCH_WORKERS,
+                 compute_workers: int = SCAN_COMPUTE_WORKERS, on_result=None, fetch=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+        self.params = {"static_oc": static_oc, "static_hl": static_hl,
+                       "dynamic_window": dynamic_window, "std_multiplier": std_multiplier}
+        self.period = period
+        self.chunk_size = max(1, chunk_size)
+        self.fetch_workers = max(1, fetch_workers)
+        self.compute_workers = compute_workers
+        self.on_result = on_result
+        self.fetch = fetch or (lambda chunk: fetch_prices_batch(chunk, period=self.period))
+
+        self.status = "pending"
+        self.error = None
+        self.fetched = 0
+        self.completed = 0
+        self.failed = 0
+        self.alerts = []
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._thread = None
+
+    def progress(self) -> dict:
+        with self._lock:
+            elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+            return {
+                "scan_id": self.id,
+                "status": self.status,
+                "total": len(self.tickers),
+                "fetched": self.fetched,
+                "completed": self.completed,
+                "failed": self.failed,
+                "alerts_found": len(self.alerts),
+                "elapsed": round(elapsed, 3),
+                "error": self.error,
+            }
+
+    def cancel(self):
+        """
+        Stop scheduling new chunks; chunks already being fetched or computed finish.
+        """
+        self._cancel.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def start(self) -> "Scan":
+        self._thread = threading.Thread(target=self.run, name=f"scan-{self.id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _collect(self, results: list):
+        with self._lock:
+            self.completed += len(results)
+            self.alerts.extend(r for r in results if r["alert"])
+        if self.on_result is not None:
+            for result in results:
+                self.on_result(result)
+
+    def _compute_failed(self, chunk: list, error: Exception):
+        logger.error("Scan %s compute failed for %d tickers: %s", self.id, len(chunk), error)
+        with self._lock:
+            self.failed += len(chunk)
+
+    def _collect_future(self, chunk: list, future):
+        if future.cancelled():
+            return
+        try:
+            results = future.result()
+        except Exception as e:
+            self._compute_failed(chunk, e)
+            return
+        self._collect(results)
+
+    def run(self) -> "Scan":
+        with self._lock:
+            self.status = "running"
+            self.started_at = time.time()
+        chunks = [self.tickers[i:i + self.chunk_size] for i in range(0, len(self.tickers), self.chunk_size)]
+        # spawn: scans run on a thread of the server, and forking a threaded process is unsafe
+        compute_pool = (ProcessPoolExecutor(max_workers=self.compute_workers, mp_context=get_context("spawn"))
+                        if self.compute_workers > 0 else None)
+        fetch_pool = ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix=f"scan-{self.id}")
+        compute_futures = []
+        try:
+            fetch_futures = {fetch_pool.submit(self.fetch, chunk): chunk for chunk in chunks}
+            for future in as_completed(fetch_futures):
+                if self._cancel.is_set():
+                    break
+                chunk = fetch_futures[future]
+                try:
+                    prices = future.result()
+                except Exception as e:
+                    logger.error("Scan %s fetch failed for %d tickers: %s", self.id, len(chunk), e)
+                    with self._lock:
+                        self.failed += len(chunk)
+                    continue
+                with self._lock:
+                    self.fetched += len(chunk)
+                if compute_pool is None:
+                    try:
+                        results = evaluate_chunk(prices, self.params)
+                    except Exception as e:
+                        self._compute_failed(chunk, e)
+                        continue
+                    self._collect(results)
+                else:
+                    compute_future = compute_pool.submit(evaluate_chunk, prices, self.params)
+                    compute_future.add_done_callback(partial(self._collect_future, chunk))
+                    compute_futures.append(compute_future)
+            fetch_pool.shutdown(wait=True, cancel_futures=True)
+            if self._cancel.is_set():
+                for compute_future in compute_futures:
+                    compute_future.cancel()
+            if compute_pool is not None:
+                compute_pool.shutdown(wait=True)
+            status = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            logger.error("Scan %s failed: %s", self.id, e)
+            fetch_pool.shutdown(wait=False, cancel_futures=True)
+            if compute_pool is not None:
+                compute_pool.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self.error = str(e)
+            status = "failed"
+        with self._lock:
+            self.status = status
+            self.finished_at = time.time()
+        self._done.set()
+        return self
+
+
+_scans = OrderedDict()
+_scans_lock = threading.Lock()
+
+
+def start_scan(tickers: list, **kwargs) -> Scan:
+    """
+    Start a background scan that streams its results to the price log writer.
+    """
+    kwargs.setdefault("on_result", price_log_writer.submit)
+    scan = Scan(tickers, **kwargs)
+    with _scans_lock:
+        _scans[scan.id] = scan
+        finished = [s for s in _scans.values() if s._done.is_set()]
+        for old in finished[:max(0, len(finished) - SCAN_HISTORY)]:
+            del _scans[old.id]
+    return scan.start()
+
+
+def get_scan(scan_id: str) -> Scan:
+    with _scans_lock:
+        return _scans.get(scan_id)
+
+
+def cancel_scans():
+    """
+    Cancel every running scan (shutdown).
+    """
+    with _scans_lock:
+        scans = list(_scans.values())
+    for scan in scans:
+        scan.cancel()
+    for scan in scans:
+        scan.wait()
+
+
+def read_universe(path: str) -> list:
+    """
+    Tickers from a file: one per line or comma-separated, '#' starts a comment.
+    """
+    with open(path) as f:
+        text = "\n".join(line.split("#")[0] for line in f)
+    return [t for t in text.replace(",", "\n").split() if t]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan a ticker universe and log every result.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--tickers", help="Comma-separated ticker symbols")
+    source.add_argument("--universe", help="File with one ticker per line")
+    parser.add_argument("--static-oc", type=float, default=5.0)
+    parser.add_argument("--static-hl", type=float, default=7.0)
+    parser.add_argument("--dynamic-window", type=int, default=3)
+    parser.add_argument("--std-multiplier", type=float, default=2.0)
+    parser.add_argument("--chunk-size", type=int, default=SCAN_CHUNK_SIZE)
+    parser.add_argument("--fetch-workers", type=int, default=SCAN_FETCH_WORKERS)
+    parser.add_argument("--compute-workers", type=int, default=SCAN_COMPUTE_WORKERS,
+                        help="Processes for the stats / alert computation (0 = in the fetch thread)")
+    parser.add_argument("--no-log", action="store_true", help="Do not write results to price_logs")
+    args = parser.parse_args()
+
+    tickers = args.tickers.split(",") if args.tickers else read_universe(args.universe)
+    if not args.no_log:
+        init_db()
+        price_log_writer.start()
+
+    def on_result(result):
+        if not args.no_log:
+            price_log_writer.submit(result)
+        if result["alert"]:
+            print(f"[ALERT] {result['ticker']} {result['metrics']}")
+
+    scan = Scan(tickers, static_oc=args.static_oc, static_hl=args.static_hl, dynamic_window=args.dynamic_window,
+                std_multiplier=args.std_multiplier, chunk_size=args.chunk_size, fetch_workers=args.fetch_workers,
+                compute_workers=args.compute_workers, on_result=on_result).start()
+    try:
+        while not scan.wait(2.0):
+            p = scan.progress()
+            logger.info("Fetched %d/%d, evaluated %d, alerts %d",
+                        p["fetched"], p["total"], p["completed"], p["alerts_found"])
+    except KeyboardInterrupt:
+        logger.info("Cancelling scan...")
+        scan.cancel()
+        scan.wait()
+    price_log_writer.close()
+    logger.info("Scan %s: %s", scan.status, scan.progress())
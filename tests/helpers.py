@@ -0,0 +1,54 @@
+"""
+Test data shared by several test modules.
+"""
+
+import time
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+def make_frames(n_tickers=8, n_days=40, seed=7):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=n_days, freq="D")
+    frames = {}
+    for i in range(n_tickers):
+        open_ = 100 + rng.normal(0, 1, n_days).cumsum()
+        close = open_ * (1 + rng.normal(0, 0.02, n_days))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.02, n_days)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.02, n_days)))
+        frame = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close}, index=dates)
+        # Late listings and missing sessions so tickers do not share a calendar
+        frame = frame.iloc[i:]
+        frame = frame.drop(frame.index[rng.choice(len(frame), size=i % 4, replace=False)])
+        frames[f"T{i}"] = frame
+    return frames
+
+class SharedStateYfinance:
+    """
+    Stand-in for yfinance with its global download state: like yfinance 0.2.x,
+    every download() resets shared._DFS / _ERRORS, fills them ticker by ticker
+    and builds its result from them, so unserialized concurrent calls mix up
+    their tickers and errors.
+    """
+
+    def __init__(self, frames: dict, rate_limited=(), delay: float = 0.002):
+        self.frames = frames
+        self.rate_limited = set(rate_limited)
+        self.delay = delay
+        self.shared = SimpleNamespace(_DFS={}, _ERRORS={}, _TRACEBACKS={})
+
+    def download(self, tickers, group_by=None, **kwargs):
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+        self.shared._DFS, self.shared._ERRORS, self.shared._TRACEBACKS = {}, {}, {}
+        for symbol in symbols:
+            time.sleep(self.delay)  # one request per ticker
+            if symbol in self.rate_limited:
+                self.shared._ERRORS[symbol] = "YFRateLimitError('Rate limited. Try after a while.')"
+            elif symbol in self.frames:
+                self.shared._DFS[symbol] = self.frames[symbol]
+        time.sleep(self.delay)
+        if isinstance(tickers, str):
+            return self.shared._DFS.get(tickers, pd.DataFrame()).copy()
+        if not self.shared._DFS:
+            return pd.DataFrame()
+        return pd.concat(dict(self.shared._DFS), axis=1, sort=True)
@@ -0,0 +1,198 @@
+"""
+Unit tests for the cached, single-flight LLM calls in ai_utils, using a local fake client.
+"""
+
+import json
+import re
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from orchestrator import ai_utils
+from utils.cache import TTLCache
+from utils.memory import VectorStore
+
+class FakeClient:
+    """
+    Stand-in for the OpenAI client: counts calls and echoes a canned answer.
+    """
+
+    def __init__(self, answer="Looks stable.", delay=0.0, error=None):
+        self.answer = answer
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, max_tokens, **kwargs):
+        self.calls.append({"model": model, "messages": messages, "max_tokens": max_tokens, **kwargs})
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        message = SimpleNamespace(content=self.answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def make_result(ticker="AAPL", delta_oc=1.25):
+    return {"ticker": ticker, "alert": False, "metrics": {"delta_oc": delta_oc, "delta_hl": 2.5}}
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient()
+        ai_utils.set_client(self.client)
+        self.addCleanup(ai_utils.set_client, None)
+        for p in (patch.object(ai_utils, "llm_cache", TTLCache(ttl=60)),
+                  patch.object(ai_utils, "OPENAI_API_KEY", "test-key")):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_identical_prompts_hit_cache(self):
+        self.assertEqual(ai_utils.generate_price_comment(make_result()), "Looks stable.")
+        self.assertEqual(ai_utils.generate_price_comment(make_result()), "Looks stable.")
+        self.assertEqual(len(self.client.calls), 1)
+        ai_utils.generate_price_comment(make_result(delta_oc=3.0))
+        self.assertEqual(len(self.client.calls), 2)
+
+    def test_prompt_key_normalizes_whitespace_and_includes_model(self):
+        messages = [{"role": "user", "content": "Comment  on\nAAPL "}]
+        same = [{"role": "user", "content": "Comment on AAPL"}]
+        self.assertEqual(ai_utils._prompt_key("m", messages, 100), ai_utils._prompt_key("m", same, 100))
+        self.assertNotEqual(ai_utils._prompt_key("m", messages, 100), ai_utils._prompt_key("other", messages, 100))
+
+    def test_concurrent_requests_share_one_upstream_call(self):
+        self.client.delay = 0.2
+        answers = []
+        threads = [threading.Thread(target=lambda: answers.append(ai_utils.generate_price_comment(make_result())))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(answers, ["Looks stable."] * 8)
+        self.assertEqual(len(self.client.calls), 1)
+
+    def test_errors_are_not_cached(self):
+        self.client.error = RuntimeError("upstream down")
+        self.assertIn("upstream down", ai_utils.generate_price_comment(make_result()))
+        self.client.error = None
+        self.assertEqual(ai_utils.generate_price_comment(make_result()), "Looks stable.")
+        self.assertEqual(len(self.client.calls), 2)
+
+ANALYSIS_JSON = (
+    '{"comment": "Quiet session.", "decision": "Hold", "confidence": 0.6, '
+    '"reasoning": "No anomaly.", "key_factors": ["low volatility"]}'
+)
+
+class TestCombinedAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient(answer=ANALYSIS_JSON)
+        ai_utils.set_client(self.client)
+        self.addCleanup(ai_utils.set_client, None)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.memory = VectorStore(tmpdir.name)
+        for p in (patch.object(ai_utils, "llm_cache", TTLCache(ttl=60)),
+                  patch.object(ai_utils, "memory_store", self.memory),
+                  patch.object(ai_utils, "OPENAI_API_KEY", "test-key")):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_single_structured_call(self):
+        analysis = ai_utils.generate_price_analysis(make_result(), {}, {}, "No news.")
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual(self.client.calls[0]["response_format"], {"type": "json_object"})
+        self.assertEqual(analysis.comment, "Quiet session.")
+        self.assertEqual(analysis.decision_dict(), {
+            "decision": "hold", "confidence": 0.6, "reasoning": "No anomaly.", "key_factors": ["low volatility"]
+        })
+
+    def test_parse_rejects_invalid_answers(self):
+        self.assertEqual(ai_utils.parse_price_analysis("```json\n" + ANALYSIS_JSON + "\n```").decision, "hold")
+        for bad in ["not json", "[]", ANALYSIS_JSON.replace("Hold", "maybe"), ANALYSIS_JSON.replace("0.6", "7"),
+                    ANALYSIS_JSON.replace('"Quiet session."', '""')]:
+            with self.assertRaises(ValueError):
+                ai_utils.parse_price_analysis(bad)
+
+    def test_reported_kpis_are_added_to_the_prompt(self):
+        ai_utils.generate_price_analysis(make_result(), {}, {}, "No news.")
+        self.assertNotIn("reported KPIs", self.client.calls[0]["messages"][-1]["content"])
+        ai_utils.generate_price_analysis(make_result(), {}, {}, "No news.", "revenue=$94.9 billion (from q2.pdf)")
+        self.assertIn("Latest reported KPIs: revenue=$94.9 billion (from q2.pdf)", self.client.calls[1]["messages"][-1]["content"])
+
+    def test_decisions_are_remembered_and_recalled_on_later_days(self):
+        ai_utils.generate_price_analysis(make_result(), {}, {}, "No news.")
+        self.assertEqual([h["kind"] for h in self.memory.search("hold", ticker="AAPL")], ["decision"])
+        self.assertNotIn("Relevant history", self.client.calls[0]["messages"][-1]["content"])  # same day
+
+        self.memory.add("sell (confidence 0.70): guidance cut after a weak quarter.", "AAPL", "decision", "2024-05-02")
+        self.memory.add("buy (confidence 0.90): unrelated ticker.", "MSFT", "decision", "2024-05-02")
+        with patch.object(ai_utils, "MEMORY_LOOKBACK_DAYS", 36500):
+            ai_utils.generate_price_analysis(make_result(delta_oc=-4.0), {}, {}, "No news.")
+        prompt = self.client.calls[1]["messages"][-1]["content"]
+        self.assertIn("Relevant history:\n- 2024-05-02 [decision] sell (confidence 0.70)", prompt)
+        self.assertNotIn("MSFT", prompt)
+        self.assertNotIn("No anomaly", prompt)
+
+    def test_invalid_answer_is_not_cached(self):
+        self.client.answer = "Sorry, I cannot help."
+        self.assertIsNone(ai_utils.generate_price_analysis(make_result(), {}, {}, "No news."))
+        self.client.answer = ANALYSIS_JSON
+        self.assertIsNotNone(ai_utils.generate_price_analysis(make_result(), {}, {}, "No news."))
+        self.assertEqual(len(self.client.calls), 2)
+
+class BatchClient(FakeClient):
+    """
+    Answers a batched decision prompt with one decision per ticker it lists.
+    """
+
+    def __init__(self, drop=(), **kwargs):
+        super().__init__(**kwargs)
+        self.drop = set(drop)
+
+    def create(self, model, messages, max_tokens, **kwargs):
+        self.calls.append({"model": model, "messages": messages, "max_tokens": max_tokens, **kwargs})
+        tickers = re.findall(r"^Stock: (\S+)$", messages[-1]["content"], flags=re.M)
+        answer = json.dumps({"decisions": {
+            t: {"decision": "hold", "confidence": 0.5, "reasoning": f"{t} is flat", "key_factors": []}
+            for t in tickers if t not in self.drop
+        }})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+class TestBatchedDecisions(unittest.TestCase):
+    def setUp(self):
+        for p in (patch.object(ai_utils, "llm_cache", TTLCache(ttl=60)),
+                  patch.object(ai_utils, "OPENAI_API_KEY", "test-key")):
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(ai_utils.set_client, None)
+
+    def items(self, count):
+        return [(make_result(f"T{i}"), {}, {}) for i in range(count)]
+
+    def test_packs_tickers_into_chunks(self):
+        client = BatchClient()
+        ai_utils.set_client(client)
+        decisions = ai_utils.generate_investment_decisions_batch(self.items(45), chunk_size=20, max_workers=2)
+
+        self.assertEqual(len(client.calls), 3)
+        self.assertEqual(list(decisions), [f"T{i}" for i in range(45)])
+        self.assertEqual(decisions["T44"]["reasoning"], "T44 is flat")
+        self.assertEqual(client.calls[0]["max_tokens"], 20 * ai_utils.LLM_BATCH_TOKENS_PER_TICKER + 50)
+
+    def test_incomplete_answer_is_split_until_isolated(self):
+        client = BatchClient(drop={"T2"})
+        ai_utils.set_client(client)
+        decisions = ai_utils.generate_investment_decisions_batch(self.items(4), chunk_size=4)
+
+        self.assertIsNone(decisions["T2"])
+        self.assertEqual(decisions["T3"]["decision"], "hold")
+        # [T0..T3] -> [T0, T1] ok, [T2, T3] -> [T2] fails, [T3] ok
+        self.assertEqual(len(client.calls), 5)
+
+    def test_without_key_returns_none_per_ticker(self):
+        with patch.object(ai_utils, "OPENAI_API_KEY", None):
+            self.assertEqual(ai_utils.generate_investment_decisions_batch(self.items(2)), {"T0": None, "T1": None})
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,71 @@
+"""
+Unit tests for the vectorized alert engine: it must match check_alert_enriched
+on every bar of every ticker.
+"""
+
+import contextlib
+import io
+import unittest
+import numpy as np
+import pandas as pd
+from agents.price_agent import check_alert_enriched, evaluate_prices_batch
+from agents.alert_engine import build_panel, evaluate_alert_panel, latest_alerts
+from helpers import make_frames
+
+class TestAlertEngine(unittest.TestCase):
+    def assert_matches_scalar(self, frames, **params):
+        alerts, _ = evaluate_alert_panel(build_panel(frames), **params)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for ticker, frame in frames.items():
+                for i in range(len(frame)):
+                    expected = check_alert_enriched(frame.iloc[:i + 1], **params)
+                    self.assertEqual(bool(alerts.at[frame.index[i], ticker]), expected,
+                                     f"{ticker} @ {frame.index[i]} with {params}")
+
+    def test_matches_check_alert_enriched_defaults(self):
+        self.assert_matches_scalar(make_frames())
+
+    def test_matches_check_alert_enriched_dynamic_only(self):
+        frames = make_frames(seed=11)
+        self.assert_matches_scalar(frames, static_oc=50.0, static_hl=50.0, dynamic_window=3, std_multiplier=1.0)
+        self.assert_matches_scalar(frames, static_oc=50.0, static_hl=50.0, dynamic_window=5, std_multiplier=0.5)
+
+    def test_reason_codes_and_latest(self):
+        frames = {"AAPL": pd.DataFrame([
+            {'Open': 100, 'Close': 101, 'High': 102, 'Low': 99},
+            {'Open': 100, 'Close': 100.5, 'High': 101, 'Low': 99.5},
+            {'Open': 100, 'Close': 99.8, 'High': 100.5, 'Low': 98},
+            {'Open': 100, 'Close': 100.2, 'High': 101, 'Low': 99},
+            {'Open': 100, 'Close': 100.1, 'High': 100.8, 'Low': 99.2},
+            {'Open': 100, 'Close': 110, 'High': 111, 'Low': 99}
+        ], index=pd.date_range("2024-01-01", periods=6, freq="D"))}
+        panel = build_panel(frames)
+
+        _, reasons = evaluate_alert_panel(panel)
+        self.assertEqual(reasons["AAPL"].iloc[-1], "static_oc")
+        _, reasons = evaluate_alert_panel(panel, static_oc=20.0, static_hl=20.0, std_multiplier=1.0)
+        self.assertEqual(reasons["AAPL"].iloc[-1], "dynamic_oc")
+
+        latest = latest_alerts(panel)
+        self.assertTrue(latest.at["AAPL", "alert"])
+        self.assertAlmostEqual(latest.at["AAPL", "delta_oc"], 10.0)
+
+    def test_mixed_sources_share_one_panel(self):
+        # A yfinance frame next to a Finnhub quote row (RangeIndex) and a tz-aware intraday frame
+        daily = make_frames(n_tickers=1)["T0"]
+        quote = pd.DataFrame([{'Open': 100.0, 'Close': 110.0, 'High': 111.0, 'Low': 99.0}])
+        intraday = daily.tail(3).set_axis(pd.date_range("2024-02-12 14:30", periods=3, freq="5min", tz="UTC"))
+        untimed = daily.reset_index(drop=True)
+
+        panel = build_panel({"AAPL": daily, "MSFT": quote, "NVDA": intraday, "BAD": untimed})
+        self.assertIsInstance(panel.index, pd.DatetimeIndex)
+        self.assertIsNone(panel.index.tz)
+        self.assertEqual(sorted(panel["Close"].columns), ["AAPL", "MSFT", "NVDA"])
+
+        results = {r["ticker"]: r for r in evaluate_prices_batch({"AAPL": daily, "MSFT": quote})}
+        self.assertTrue(results["MSFT"]["alert"])
+        self.assertAlmostEqual(results["MSFT"]["metrics"]["delta_oc"], 10.0)
+        self.assertEqual(results["AAPL"]["alert"], check_alert_enriched(daily))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
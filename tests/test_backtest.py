@@ -0,0 +1,61 @@
+"""
+Unit tests for the backtester: per-bar alerts must match the alert engine and
+the statistics must match a straightforward pandas computation.
+"""
+
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from agents.alert_engine import build_panel, evaluate_alert_panel
+from agents.backtest import parameter_grid, run_backtest, load_history
+from utils.bar_store import BarStore
+from helpers import make_frames
+
+class TestBacktest(unittest.TestCase):
+    def setUp(self):
+        self.frames = make_frames(n_tickers=6, n_days=80)
+        self.panel = build_panel(self.frames)
+
+    def expected_row(self, params, horizon=5, hit_move=2.0):
+        alerts, _ = evaluate_alert_panel(self.panel, **params)
+        returns = []
+        for ticker, frame in self.frames.items():
+            fwd = (frame["Close"].shift(-horizon) / frame["Close"] - 1) * 100
+            returns.append(fwd[alerts.loc[frame.index, ticker].to_numpy()].dropna())
+        returns = pd.concat(returns)
+        return int(alerts.to_numpy().sum()), returns.mean(), (returns.abs() >= hit_move).mean()
+
+    def test_matches_alert_engine_and_pandas_returns(self):
+        grid = parameter_grid(static_oc=[2.0, 5.0], static_hl=[4.0, 7.0], dynamic_window=[3, 5],
+                              std_multiplier=[1.0, 2.0])
+        results = run_backtest(self.panel, grid, horizons=(1, 5), workers=1)
+
+        self.assertEqual(len(results), 16)
+        for i, params in enumerate(grid):
+            row = results.iloc[i]
+            n_alerts, mean_return, hit_rate = self.expected_row(params)
+            self.assertEqual(row["n_alerts"], n_alerts, params)
+            self.assertEqual(row[["n_static_oc", "n_static_hl", "n_dynamic_oc", "n_dynamic_hl"]].sum(), n_alerts)
+            self.assertAlmostEqual(row["mean_return_5"], mean_return)
+            self.assertAlmostEqual(row["hit_rate_5"], hit_rate)
+
+    def test_process_pool_matches_in_process(self):
+        grid = parameter_grid(static_oc=[3.0, 5.0], static_hl=7.0, dynamic_window=[2, 3, 4], std_multiplier=[1.5, 2.0])
+        serial = run_backtest(self.panel, grid, workers=1)
+        parallel = run_backtest(self.panel, grid, workers=2)
+        pd.testing.assert_frame_equal(serial, parallel)
+        self.assertEqual(parallel[["static_oc", "dynamic_window", "std_multiplier"]].values.tolist(),
+                         [[p["static_oc"], p["dynamic_window"], p["std_multiplier"]] for p in grid])
+
+    def test_load_history_reads_bar_store(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = BarStore(root)
+            for ticker, frame in self.frames.items():
+                store.append(ticker, "1d", frame)
+            panel = load_history(list(self.frames), store=store)
+        self.assertEqual(list(panel["Close"].columns), list(self.frames))
+        np.testing.assert_allclose(panel["Close"]["T3"].dropna().to_numpy(), self.frames["T3"]["Close"].to_numpy())
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
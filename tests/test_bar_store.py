@@ -0,0 +1,83 @@
+"""
+Unit tests for the columnar bar store.
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from utils.bar_store import BarStore, BAR_DTYPE, period_start
+
+def make_bars(start, periods, base=100.0, freq="D", tz=None):
+    index = pd.date_range(start, periods=periods, freq=freq, tz=tz)
+    close = base + np.arange(periods, dtype=float)
+    return pd.DataFrame({"Open": close - 0.5, "High": close + 1, "Low": close - 1,
+                         "Close": close, "Volume": np.full(periods, 1000.0)}, index=index)
+
+class TestBarStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.store = BarStore(self.tmpdir.name)
+
+    def test_round_trip_and_layout(self):
+        frame = make_bars("2024-01-01", 10)
+        self.assertEqual(self.store.append("aapl", "1d", frame), 10)
+
+        path = os.path.join(self.tmpdir.name, "1d", "AAPL.bin")
+        self.assertEqual(os.path.getsize(path), 10 * BAR_DTYPE.itemsize)
+        pd.testing.assert_frame_equal(self.store.read("AAPL"), frame, check_freq=False, check_names=False, check_index_type=False)
+        self.assertEqual(self.store.tickers("1d"), ["AAPL"])
+
+    def test_append_only_adds_newer_bars_and_replaces_last(self):
+        self.store.append("AAPL", "1d", make_bars("2024-01-01", 5))
+        revised = make_bars("2024-01-03", 5, base=200.0)  # overlaps 01-03..01-05
+
+        self.assertEqual(self.store.append("AAPL", "1d", revised), 2)
+        stored = self.store.read("AAPL")
+        self.assertEqual(len(stored), 7)
+        self.assertEqual(stored.loc["2024-01-04", "Close"], 103.0)  # older bars are immutable
+        self.assertEqual(stored.loc["2024-01-05", "Close"], 202.0)  # last bar revised
+        self.assertEqual(stored["Close"].iloc[-1], 204.0)
+
+    def test_merge_backfills_older_history(self):
+        self.store.append("AAPL", "1d", make_bars("2024-02-01", 5))
+        self.assertEqual(self.store.merge("AAPL", "1d", make_bars("2024-01-01", 30)), 30 + 5)
+        first, last = self.store.bounds("AAPL", "1d")
+        self.assertEqual((first, last), (pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-05")))
+        self.assertTrue(self.store.read("AAPL").index.is_monotonic_increasing)
+
+    def test_backfill_marker_keeps_the_earliest_start(self):
+        self.assertIsNone(self.store.backfilled_from("AAPL", "1d"))
+        self.store.mark_backfilled("AAPL", "1d", "2024-01-01")
+        self.store.mark_backfilled("AAPL", "1d", "2024-06-01")
+        self.assertEqual(self.store.backfilled_from("AAPL", "1d"), pd.Timestamp("2024-01-01"))
+        self.assertIsNone(self.store.backfilled_from("AAPL", "5m"))
+        self.assertEqual(self.store.tickers("1d"), [])
+
+    def test_range_reads(self):
+        self.store.append("AAPL", "1d", make_bars("2023-01-01", 500))
+        window = self.store.read("AAPL", "1d", start="2023-03-01", end="2023-03-10")
+        self.assertEqual(window.index[0], pd.Timestamp("2023-03-01"))
+        self.assertEqual(len(window), 10)
+
+        year = self.store.read_period("AAPL", "1d", "1y")
+        self.assertEqual(year.index[0], period_start("1y", year.index[-1]))
+        self.assertTrue(self.store.read("MSFT").empty)
+        self.assertEqual(self.store.bounds("MSFT"), (None, None))
+
+    def test_intraday_bars_stored_in_utc(self):
+        frame = make_bars("2024-01-02 09:30", 3, freq="5min", tz="America/New_York")
+        self.store.append("AAPL", "5m", frame)
+        stored = self.store.read("AAPL", "5m")
+        self.assertEqual(stored.index[0], pd.Timestamp("2024-01-02 14:30"))
+        self.assertEqual(stored.index.name, "Datetime")
+
+    def test_missing_volume_is_left_out(self):
+        frame = make_bars("2024-01-01", 3).drop(columns="Volume")
+        self.store.append("AAPL", "1d", frame)
+        self.assertEqual(list(self.store.read("AAPL").columns), ["Open", "High", "Low", "Close"])
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,109 @@
+"""
+Unit tests for the compact float32 bars and on-demand resampling.
+"""
+
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from utils.bar_store import BarStore
+from utils.bars import Bars, load_bars, interval_ns, is_intraday
+
+def minute_bars(start, periods, freq="1min"):
+    index = pd.date_range(start, periods=periods, freq=freq)
+    close = 100.0 + np.arange(periods, dtype=float) / 100
+    return pd.DataFrame({"Open": close - 0.01, "High": close + 0.02, "Low": close - 0.02,
+                         "Close": close, "Volume": np.full(periods, 10.0)}, index=index)
+
+class TestBars(unittest.TestCase):
+    def test_intervals(self):
+        self.assertEqual(interval_ns("15m"), 15 * 60 * 10**9)
+        self.assertEqual(interval_ns("1h"), interval_ns("60m"))
+        self.assertTrue(is_intraday("4h"))
+        self.assertFalse(is_intraday("1wk"))
+        with self.assertRaises(ValueError):
+            interval_ns("1y")
+
+    def test_frame_round_trip_is_float32_backed(self):
+        frame = minute_bars("2024-03-04 14:30", 390)
+        bars = Bars.from_frame(frame, "1m")
+
+        self.assertEqual(bars.close.dtype, np.float32)
+        self.assertEqual(bars.nbytes, 390 * 28)
+        restored = bars.to_frame()
+        self.assertEqual(restored.index.name, "Datetime")
+        self.assertEqual(restored["Close"].dtype, np.float64)
+        np.testing.assert_allclose(restored["Close"], frame["Close"], rtol=1e-6)
+        self.assertTrue(restored.index.equals(frame.index))
+
+    def test_resample_aggregates_ohlcv(self):
+        bars = Bars.from_frame(minute_bars("2024-03-04 14:30", 10), "1m").resample("5m")
+
+        self.assertEqual(len(bars), 2)
+        frame = bars.to_frame()
+        self.assertEqual(frame.index[1], pd.Timestamp("2024-03-04 14:35"))
+        self.assertAlmostEqual(frame["Open"].iloc[0], 99.99, places=4)
+        self.assertAlmostEqual(frame["High"].iloc[0], 100.06, places=4)
+        self.assertAlmostEqual(frame["Low"].iloc[1], 100.03, places=4)
+        self.assertAlmostEqual(frame["Close"].iloc[1], 100.09, places=4)
+        self.assertEqual(frame["Volume"].iloc[0], 50.0)
+
+    def test_hourly_buckets_start_at_the_session_open(self):
+        two_sessions = pd.concat([minute_bars("2024-03-04 14:30", 390, "5min").iloc[:78],
+                                  minute_bars("2024-03-12 13:30", 78, "5min")])  # after the DST switch
+        hourly = Bars.from_frame(two_sessions, "5m").resample("1h").to_frame()
+
+        self.assertEqual(hourly.index[0], pd.Timestamp("2024-03-04 14:30"))
+        self.assertIn(pd.Timestamp("2024-03-12 13:30"), hourly.index)
+        self.assertEqual(len(hourly), 14)  # 6.5 hours a session: six full bars and a half bar
+
+    def test_daily_and_weekly_follow_the_calendar(self):
+        bars = Bars.from_frame(minute_bars("2024-03-04 14:30", 3 * 288, "5min"), "5m")
+        daily = bars.resample("1d")
+        self.assertEqual(list(daily.index), list(pd.date_range("2024-03-04", periods=4, freq="D")))
+        self.assertEqual(daily.index.name, "Date")
+
+        weekly = Bars.from_frame(minute_bars("2024-03-06", 10, "D"), "1d").resample("1wk")
+        self.assertEqual(list(weekly.index), [pd.Timestamp("2024-03-04"), pd.Timestamp("2024-03-11")])
+
+    def test_finer_interval_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Bars.from_frame(minute_bars("2024-03-04 14:30", 10, "5min"), "5m").resample("1m")
+
+    def test_slicing(self):
+        bars = Bars.from_frame(minute_bars("2024-03-04 14:30", 390), "1m")
+        self.assertEqual(len(bars.between("2024-03-04 15:00", "2024-03-04 15:09")), 10)
+        self.assertEqual(len(Bars.empty("1m").last("5d")), 0)
+        self.assertEqual(len(bars[-5:]), 5)
+
+    def test_deltas_match_compute_deltas(self):
+        from agents.price_agent import compute_deltas
+        frame = minute_bars("2024-03-04 14:30", 20)
+        delta_oc, delta_hl = Bars.from_frame(frame, "1m").deltas()
+        expected = compute_deltas(frame)
+        np.testing.assert_allclose(delta_oc, expected["Delta_OC"], atol=1e-4)
+        np.testing.assert_allclose(delta_hl, expected["Delta_HL"], atol=1e-4)
+
+class TestLoadBars(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.store = BarStore(tmpdir.name)
+        self.store.append("AAPL", "1m", minute_bars("2024-03-04 14:30", 60))
+        self.store.append("AAPL", "5m", minute_bars("2024-03-04 14:30", 12, "5min"))
+
+    def test_stored_interval_is_read_directly(self):
+        self.assertEqual(self.store.intervals("AAPL"), ["1m", "5m"])
+        self.assertEqual(len(load_bars(self.store, "AAPL", "1m", start="2024-03-04 15:00")), 30)
+
+    def test_missing_interval_is_resampled_from_the_coarsest_divisor(self):
+        bars = load_bars(self.store, "AAPL", "15m")
+        self.assertEqual(bars.interval, "15m")
+        self.assertEqual(len(bars), 4)
+        self.assertEqual(bars.volume[0], 30.0)  # three 5m bars, not fifteen 1m bars
+
+        self.assertEqual(len(load_bars(self.store, "AAPL", "1d")), 1)
+        self.assertEqual(len(load_bars(self.store, "MSFT", "15m")), 0)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
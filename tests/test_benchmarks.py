@@ -0,0 +1,58 @@
+"""
+Smoke test of the benchmark suite: every benchmark runs offline against the fixture stand-ins.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from fixtures import bars_source, standins, synthetic_bars, universe
+from run import BENCHMARKS, run_suite, format_table
+from startup import API_IMPORT_BUDGET, STARTUP_TARGETS, measure_startup
+from orchestrator import db_utils
+from orchestrator.orchestrator import price_agent
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_fixture_bars_are_deterministic(self):
+        a, b = synthetic_bars("SYN0001"), synthetic_bars("SYN0001")
+        self.assertTrue(a.equals(b))
+        self.assertTrue((a["High"] >= a[["Open", "Close"]].max(axis=1)).all())
+
+    def test_standins_serve_the_handler(self):
+        tickers = universe(2)
+        with standins(tickers) as (market, llm):
+            db_utils.init_db()
+            result = asyncio.run(price_agent(tickers[0]))
+        self.assertEqual(result["ticker"], tickers[0])
+        self.assertEqual(result["ia_decision"]["decision"], "hold")
+        self.assertGreater(market.calls, 0)
+        self.assertEqual(llm.calls, 1)
+
+    def test_suite_runs_every_benchmark(self):
+        records = run_suite(sizes=[2], repeat=1)
+        self.assertEqual([r["benchmark"] for r in records], list(BENCHMARKS))
+        for record in records:
+            self.assertGreater(record["calls"], 0)
+            self.assertGreater(record["throughput"], 0)
+            self.assertLessEqual(record["p50_ms"], record["p99_ms"])
+            self.assertIsNotNone(record["peak_mib"])
+            self.assertEqual(record["bars"], bars_source(universe(2)[0]))  # synthetic unless recorded locally
+        table = format_table(records, baseline=records)
+        self.assertIn("price_handler", table)
+        self.assertIn("+0.0%", table)
+
+
+class TestStartup(unittest.TestCase):
+    def test_api_import_defers_heavy_modules_and_meets_the_budget(self):
+        record = measure_startup(STARTUP_TARGETS["api"], runs=3)
+        self.assertEqual(record["deferred_loaded"], [])
+        self.assertGreater(record["process_s"], record["import_s"])
+        self.assertLess(record["import_min_s"], API_IMPORT_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
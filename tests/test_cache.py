@@ -0,0 +1,83 @@
+"""
+Unit tests for the TTL + LRU market-data cache.
+"""
+
+import os
+import tempfile
+import unittest
+import pandas as pd
+from utils.cache import TTLCache, cached_market_data
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_entries_expire_after_ttl(self):
+        cache = TTLCache(ttl=10, clock=self.clock)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.clock.now += 11
+        self.assertIsNone(cache.get("a"))
+
+    def test_lru_eviction(self):
+        cache = TTLCache(ttl=10, max_entries=2, clock=self.clock)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_persistent_tier_survives_restart(self):
+        frame = pd.DataFrame({"Close": [1.0, 2.0]})
+        TTLCache(ttl=10, path=self.path, clock=self.clock).set("AAPL", frame)
+
+        restarted = TTLCache(ttl=10, path=self.path, clock=self.clock)
+        pd.testing.assert_frame_equal(restarted.get("AAPL"), frame)
+        self.clock.now += 11
+        self.assertIsNone(TTLCache(ttl=10, path=self.path, clock=self.clock).get("AAPL"))
+
+    def test_decorator_caches_by_ticker_period_interval_source(self):
+        cache = TTLCache(ttl=10, clock=self.clock)
+        calls = []
+
+        @cached_market_data("test", cache=cache)
+        def fetch(ticker: str, period="5d", interval="1d"):
+            calls.append((ticker, period, interval))
+            return pd.DataFrame({"Close": [float(len(calls))]})
+
+        fetch("AAPL")
+        first = fetch("AAPL", period="5d")
+        first["Close"] = -1.0  # callers must not be able to corrupt the cache
+        self.assertEqual(fetch("aapl")["Close"].iloc[0], 1.0)
+        fetch("AAPL", period="1y")
+        self.assertEqual(len(calls), 2)
+
+    def test_decorator_does_not_cache_empty_results(self):
+        cache = TTLCache(ttl=10, clock=self.clock)
+        calls = []
+
+        @cached_market_data("test", period="quote", interval="quote", cache=cache)
+        def fetch(ticker: str):
+            calls.append(ticker)
+            return None
+
+        fetch("AAPL")
+        fetch("AAPL")
+        self.assertEqual(len(calls), 2)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
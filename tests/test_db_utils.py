@@ -0,0 +1,234 @@
+"""
+Unit tests for the pooled SQLite access layer.
+"""
+
+import gc
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from orchestrator import db_utils
+
+def make_result(ticker, alert=False, delta_oc=1.0, timestamp="2024-01-01T00:00:00Z"):
+    return {
+        "ticker": ticker,
+        "timestamp": timestamp,
+        "alert": alert,
+        "metrics": {"delta_oc": delta_oc, "delta_hl": 2.0},
+        "details": {"static_oc_threshold": 5.0, "static_hl_threshold": 7.0,
+                    "dynamic_window": 3, "std_multiplier": 2.0}
+    }
+
+class TestDbUtils(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = patch.object(db_utils, "DB_PATH", os.path.join(self.tmpdir.name, "db", "agentic.db"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+        self.addCleanup(db_utils.close_connections)
+        db_utils.init_db()
+
+    def test_wal_mode_and_indexes(self):
+        conn = db_utils.get_connection()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn("idx_price_logs_ticker_id", indexes)
+        self.assertIn("idx_price_logs_alert_id", indexes)
+        self.assertIn("idx_price_logs_timestamp_id", indexes)
+
+    def test_time_window_of_one_ticker_uses_its_index(self):
+        query, params = db_utils._price_logs_query(["id"], ticker="aapl", since="2024-05-01", until="2024-06-01",
+                                                   limit=10)
+        plan = " ".join(r[-1] for r in db_utils.get_connection().execute(f"EXPLAIN QUERY PLAN {query}", params))
+        self.assertIn("idx_price_logs_ticker_timestamp_id (ticker=? AND timestamp>? AND timestamp<?)", plan)
+
+    def test_connection_is_pooled_per_thread(self):
+        self.assertIs(db_utils.get_connection(), db_utils.get_connection())
+        other = []
+        thread = threading.Thread(target=lambda: other.append(db_utils.get_connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], db_utils.get_connection())
+
+    def test_threads_reconnect_after_close_connections(self):
+        ready, closed, done = threading.Event(), threading.Event(), threading.Event()
+        counts = []
+
+        def worker():
+            db_utils.get_connection()
+            ready.set()
+            closed.wait(5)
+            counts.append(db_utils.get_connection().execute("SELECT COUNT(*) FROM price_logs").fetchone()[0])
+            done.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        ready.wait(5)
+        db_utils.close_connections()
+        closed.set()
+        thread.join()
+        self.assertEqual(counts, [0])
+
+    def test_finished_threads_leave_the_registry(self):
+        threads = [threading.Thread(target=db_utils.get_connection) for _ in range(5)]
+        for t in threads:
+            t.start()
+            t.join()
+        gc.collect()
+        self.assertEqual(len(db_utils._all_connections), 1)  # this thread's
+
+    def test_schema_setup_runs_once(self):
+        with patch.object(db_utils, "get_connection") as mock_conn:
+            db_utils.init_db()
+            mock_conn.assert_not_called()
+
+    def test_concurrent_writers_and_filtered_reads(self):
+        def writer(ticker):
+            for i in range(25):
+                db_utils.log_price_result(make_result(ticker, alert=i % 5 == 0, delta_oc=float(i)))
+
+        threads = [threading.Thread(target=writer, args=(t,)) for t in ["AAPL", "MSFT", "NVDA", "TSLA"]]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        logs = db_utils.query_price_logs(ticker="aapl", limit=100)
+        self.assertEqual(len(logs), 25)
+        self.assertEqual(logs[0]["delta_oc"], 24.0)
+        self.assertEqual(list(logs[0].keys()), db_utils.PRICE_LOG_COLUMNS)
+        self.assertEqual(len(db_utils.query_price_logs(alert=1, limit=100)), 20)
+        self.assertEqual(len(db_utils.get_recent_logs("MSFT", limit=3)), 3)
+
+    def count_rows(self):
+        return db_utils.get_connection().execute("SELECT COUNT(*) FROM price_logs").fetchone()[0]
+
+    def test_writer_buffers_until_explicit_flush(self):
+        writer = db_utils.PriceLogWriter(batch_size=100, flush_interval=60)
+        for i in range(10):
+            writer.submit(make_result("AAPL", delta_oc=float(i)))
+        self.assertEqual(self.count_rows(), 0)
+        self.assertEqual(writer.flush(), 10)
+        self.assertEqual(self.count_rows(), 10)
+        self.assertEqual(db_utils.query_price_logs(ticker="AAPL")[0]["delta_oc"], 9.0)
+
+    def test_writer_flushes_when_batch_is_full(self):
+        writer = db_utils.PriceLogWriter(batch_size=5, flush_interval=60)
+        for i in range(12):
+            writer.submit(make_result("AAPL"))
+        self.assertEqual(self.count_rows(), 10)
+        self.assertEqual(writer.pending(), 2)
+
+    def test_background_writer_flushes_on_interval_and_close(self):
+        writer = db_utils.PriceLogWriter(batch_size=1000, flush_interval=0.05)
+        writer.start()
+        writer.submit(make_result("AAPL"))
+        for _ in range(100):
+            if self.count_rows() == 1:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(self.count_rows(), 1)
+
+        writer.submit(make_result("MSFT"))
+        writer.close()
+        self.assertEqual(self.count_rows(), 2)
+
+    def test_failed_batch_is_kept_and_retried(self):
+        real = db_utils.get_connection
+
+        class Locked:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def executemany(self, *args):
+                raise db_utils.sqlite3.OperationalError("database is locked")
+
+        writer = db_utils.PriceLogWriter(batch_size=100, flush_interval=60, max_pending=15)
+        for i in range(10):
+            writer.submit(make_result("AAPL", delta_oc=float(i)))
+        with patch.object(db_utils, "get_connection", return_value=Locked()) as locked:
+            self.assertEqual(writer.flush(), 0)
+            self.assertEqual(locked.call_count, 2)  # retried once
+        self.assertEqual(writer.pending(), 10)
+        self.assertEqual(self.count_rows(), 0)
+
+        # Still failing: the queue stays bounded, oldest rows first to go
+        for i in range(10, 20):
+            writer.submit(make_result("AAPL", delta_oc=float(i)))
+        with patch.object(db_utils, "get_connection", return_value=Locked()):
+            writer.flush()
+        self.assertEqual(writer.pending(), 15)
+
+        with patch.object(db_utils, "get_connection", side_effect=real):
+            self.assertEqual(writer.flush(), 15)
+        logs = db_utils.query_price_logs(ticker="AAPL", limit=100)
+        self.assertEqual([row["delta_oc"] for row in logs], [float(i) for i in range(19, 4, -1)])
+
+    def test_keyset_pages_cover_every_row_once(self):
+        db_utils.log_price_results([make_result("AAPL", delta_oc=float(i)) for i in range(25)])
+        seen, cursor = [], None
+        while True:
+            page = db_utils.query_price_logs(limit=10, before_id=cursor, columns="id")
+            if not page:
+                break
+            seen += [row["id"] for row in page]
+            cursor = page[-1]["id"]
+        self.assertEqual(seen, list(range(25, 0, -1)))
+
+        forward = db_utils.query_price_logs(limit=5, after_id=20)
+        self.assertEqual([row["id"] for row in forward], [21, 22, 23, 24, 25])
+
+    def test_projection_and_time_range(self):
+        db_utils.log_price_results([make_result("AAPL", timestamp=f"2024-01-0{d}T12:30:00.250000Z") for d in range(1, 6)])
+        logs = db_utils.query_price_logs(columns="timestamp, ticker", since="2024-01-02", until="2024-01-04T00:00:00+00:00")
+        self.assertEqual([list(row) for row in logs], [["timestamp", "ticker"]] * 2)
+        self.assertEqual([row["timestamp"][:10] for row in logs], ["2024-01-03", "2024-01-02"])
+        self.assertEqual(len(db_utils.query_price_logs(since="2024-01-05T12:30:00.250000Z")), 1)
+        with self.assertRaises(ValueError):
+            db_utils.query_price_logs(columns="id,secret")
+
+    def test_bounds_compare_with_whole_second_timestamps(self):
+        db_utils.log_price_results([make_result("AAPL", timestamp="2024-01-05T12:00:33Z"),
+                                    make_result("AAPL", timestamp="2024-01-05T12:00:33.5Z")])
+        stamps = lambda **bounds: [r["timestamp"] for r in db_utils.query_price_logs(columns="timestamp", **bounds)]
+        self.assertEqual(stamps(since="2024-01-05T12:00:33.5Z"), ["2024-01-05T12:00:33.500000Z"])
+        self.assertEqual(stamps(until="2024-01-05T12:00:33.5Z"), ["2024-01-05T12:00:33.000000Z"])
+        self.assertEqual(len(stamps(since="2024-01-05T12:00:33", until="2024-01-05T12:00:34")), 2)
+
+    def test_legacy_whole_second_timestamps_are_rewritten(self):
+        path = os.path.join(self.tmpdir.name, "legacy.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE price_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, ticker TEXT NOT NULL, "
+                     "timestamp TEXT NOT NULL, alert INTEGER NOT NULL, delta_oc REAL, delta_hl REAL, "
+                     "static_oc_threshold REAL, static_hl_threshold REAL, dynamic_window INTEGER, "
+                     "std_multiplier REAL)")
+        conn.executemany("INSERT INTO price_logs (ticker, timestamp, alert) VALUES ('AAPL', ?, 0)",
+                         [("2024-01-05T12:00:33Z",), ("2024-01-05T12:00:33.250000Z",)])
+        conn.commit()
+        conn.close()
+        db_utils.init_db(path)
+        rows = db_utils.get_connection(path).execute("SELECT timestamp FROM price_logs ORDER BY id").fetchall()
+        self.assertEqual([r[0] for r in rows], ["2024-01-05T12:00:33.000000Z", "2024-01-05T12:00:33.250000Z"])
+
+    def test_page_size_is_capped(self):
+        db_utils.log_price_results([make_result("AAPL")] * 12)
+        with patch.object(db_utils, "MAX_PAGE_SIZE", 5):
+            self.assertEqual(len(db_utils.query_price_logs(limit=100)), 5)
+
+    def test_iter_streams_in_batches(self):
+        db_utils.log_price_results([make_result("AAPL", alert=i % 2 == 0, delta_oc=float(i)) for i in range(23)])
+        rows = db_utils.iter_price_logs(alert=1, columns=["id", "delta_oc"], batch_size=4)
+        self.assertEqual(next(rows), (23, 22.0))
+        self.assertEqual(len(list(rows)), 11)
+        self.assertEqual(len(list(db_utils.iter_price_logs(after_id=20))), 3)
+        with self.assertRaises(ValueError):
+            db_utils.iter_price_logs(since="yesterday")
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
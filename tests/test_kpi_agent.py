@@ -0,0 +1,156 @@
+"""
+Unit tests for the KPI agent, using small PDFs written by the tests.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from agents import kpi_agent
+from utils.cache import TTLCache
+
+def make_pdf(path, pages):
+    """
+    Minimal PDF with one Helvetica text line per entry of each page.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        text = " ".join(f"({line}) Tj 0 -16 Td" for line in lines)
+        stream = f"BT /F1 11 Tf 72 720 Td {text} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+REPORT_PAGES = [
+    ["Second quarter results"],
+    ["Total revenue was $94.9 billion, up 5%", "Net income of $(1.2) billion"],
+    ["Diluted EPS $1.40", "Gross margin 46.3%"],
+    ["Appendix", "Total revenue $94,930 million"],
+]
+
+class TestExtractKpis(unittest.TestCase):
+    def test_values_units_and_signs(self):
+        kpis = kpi_agent.extract_kpis(
+            "Revenue grew 5% year over year\nNet sales of $12.5 million\nOperating margin -3.5%\n"
+            "Free cash flow -$5 billion\nEarnings per diluted share of $0.85\nNet income 2023"
+        )
+        self.assertEqual(kpis["revenue"], {"value": 12.5e6, "unit": "USD", "text": "$12.5 million"})
+        self.assertEqual(kpis["operating_margin"]["value"], -3.5)
+        self.assertEqual(kpis["free_cash_flow"]["value"], -5e9)
+        self.assertEqual(kpis["eps"], {"value": 0.85, "unit": "USD/share", "text": "$0.85"})
+        self.assertNotIn("net_income", kpis)
+
+class TestExtractReports(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.cache = TTLCache(ttl=60)
+        self.paths = []
+        for name, pages in [("a.pdf", REPORT_PAGES), ("b.pdf", REPORT_PAGES[2:] * 5), ("c.pdf", REPORT_PAGES)]:
+            self.paths.append(os.path.join(self.tmpdir, name))
+            make_pdf(self.paths[-1], pages)
+
+    def test_parallel_matches_inline_and_earliest_page_wins(self):
+        inline = kpi_agent.extract_reports(self.paths, workers=0, pages_per_task=2, cache=TTLCache(ttl=60))
+        parallel = kpi_agent.extract_reports(self.paths, workers=2, pages_per_task=2, cache=self.cache)
+        self.assertEqual(inline, parallel)
+        report = parallel[0]
+        self.assertEqual(report["n_pages"], 4)
+        self.assertIn("Diluted EPS $1.40", report["pages"][2])
+        self.assertEqual(report["kpis"]["revenue"]["value"], 94.9e9)
+        self.assertEqual(report["kpis"]["revenue"]["page"], 2)
+        self.assertEqual(parallel[1]["n_pages"], 10)
+        self.assertEqual(parallel[2]["sha256"], report["sha256"])
+
+    def test_unchanged_reports_are_served_from_cache(self):
+        with patch.object(kpi_agent, "_extract_pages", wraps=kpi_agent._extract_pages) as extract:
+            first = kpi_agent.extract_reports(self.paths, workers=0, pages_per_task=2, cache=self.cache)
+            self.assertEqual(extract.call_count, 2 + 5)  # c.pdf has the same content as a.pdf
+            second = kpi_agent.extract_reports(self.paths, workers=0, cache=self.cache)
+            self.assertEqual(extract.call_count, 7)
+        self.assertEqual([r["cached"] for r in first], [False, False, False])
+        self.assertEqual([r["cached"] for r in second], [True, True, True])
+        self.assertEqual(second[1]["kpis"], first[1]["kpis"])
+
+        make_pdf(self.paths[1], REPORT_PAGES[:2])
+        third = kpi_agent.extract_reports(self.paths, workers=0, cache=self.cache)
+        self.assertEqual([r["cached"] for r in third], [True, False, True])
+
+    def test_untouched_files_are_not_rehashed(self):
+        first = kpi_agent.extract_reports(self.paths[:1], workers=0, cache=self.cache)
+        self.assertEqual(len(first[0]["pages"]), 4)
+        with patch.object(kpi_agent, "file_sha256") as sha256:
+            second = kpi_agent.extract_reports(self.paths[:1], workers=0, cache=self.cache)
+        sha256.assert_not_called()
+        self.assertNotIn("pages", second[0])
+        self.assertEqual(kpi_agent.cached_report(self.paths[0], self.cache), {"n_pages": 4, "kpis": first[0]["kpis"]})
+        self.assertIsNone(kpi_agent.cached_report(self.paths[1], self.cache))
+
+    def test_new_extractor_version_reuses_the_cached_text(self):
+        first = kpi_agent.extract_reports(self.paths[:1], workers=0, cache=self.cache)
+        sha = first[0]["sha256"]
+        self.assertIsInstance(self.cache.get(kpi_agent._text_key(sha)), bytes)  # stored compressed
+        self.assertEqual(kpi_agent.cached_pages(sha, self.cache), first[0]["pages"])
+        with patch.object(kpi_agent, "EXTRACTOR_VERSION", "test"), \
+                patch.object(kpi_agent, "_extract_pages", wraps=kpi_agent._extract_pages) as extract:
+            second = kpi_agent.extract_reports(self.paths[:1], workers=0, cache=self.cache)
+            third = kpi_agent.extract_reports(self.paths[:1], workers=0, cache=self.cache)
+        extract.assert_not_called()
+        self.assertEqual(second[0]["kpis"], first[0]["kpis"])
+        self.assertEqual(second[0]["pages"], first[0]["pages"])
+        self.assertEqual([second[0]["cached"], third[0]["cached"]], [False, True])
+
+    def test_broken_files_are_reported_not_raised(self):
+        broken = os.path.join(self.tmpdir, "broken.pdf")
+        with open(broken, "wb") as f:
+            f.write(b"not a pdf")
+        with self.assertLogs("agents.kpi_agent", level="ERROR"):
+            results = kpi_agent.extract_reports([broken, os.path.join(self.tmpdir, "missing.pdf"), self.paths[0]],
+                                                workers=0, cache=self.cache)
+        self.assertIn("error", results[0])
+        self.assertIn("error", results[1])
+        self.assertEqual(results[2]["kpis"]["eps"]["value"], 1.4)
+
+class TestKpiContext(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for p in (patch.object(kpi_agent, "KPI_REPORTS_DIR", self.root),
+                  patch.object(kpi_agent, "kpi_cache", TTLCache(ttl=60))):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_latest_report_feeds_the_prompt(self):
+        self.assertIsNone(kpi_agent.load_kpi_context("AAPL"))
+        os.makedirs(os.path.join(self.root, "AAPL"))
+        old, new = (os.path.join(self.root, "AAPL", name) for name in ("q1.pdf", "q2.pdf"))
+        make_pdf(old, [["Total revenue $90.8 billion"]])
+        make_pdf(new, REPORT_PAGES)
+        os.utime(old, (1_000_000, 1_000_000))
+        with patch.object(kpi_agent, "extract_reports", wraps=kpi_agent.extract_reports) as extract:
+            self.assertIsNone(kpi_agent.load_kpi_context("aapl"))  # not extracted yet: scheduled, not awaited
+            kpi_agent._extract_executor.submit(lambda: None).result(timeout=30)  # single worker: runs after it
+            context = kpi_agent.load_kpi_context("aapl")
+            self.assertEqual(extract.call_count, 1)
+        self.assertTrue(context.startswith("revenue=$94.9 billion, net_income=$(1.2) billion"))
+        self.assertTrue(context.endswith("(from q2.pdf)"))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
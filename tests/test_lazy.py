@@ -0,0 +1,55 @@
+"""
+Unit tests for the deferred imports and the one-time .env loading.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from utils import config
+from utils.lazy import LazyModule, lazy_import, is_loaded
+
+
+class TestLazyImport(unittest.TestCase):
+    def setUp(self):
+        modules = patch.dict(sys.modules)  # restores colorsys (and anything imported here) afterwards
+        modules.start()
+        self.addCleanup(modules.stop)
+        sys.modules.pop("colorsys", None)
+
+    def test_module_is_imported_on_first_attribute_access(self):
+        colorsys = lazy_import("colorsys")
+        self.assertIsInstance(colorsys, LazyModule)
+        self.assertFalse(is_loaded(colorsys))
+        self.assertNotIn("colorsys", sys.modules)
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertTrue(is_loaded(colorsys))
+        self.assertIs(lazy_import("colorsys"), sys.modules["colorsys"])
+
+    def test_patching_through_the_stand_in_patches_the_module(self):
+        colorsys = lazy_import("colorsys")
+        with patch.object(colorsys, "rgb_to_hsv", lambda r, g, b: "patched"):
+            self.assertEqual(sys.modules["colorsys"].rgb_to_hsv(0, 0, 0), "patched")
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+
+
+class TestConfig(unittest.TestCase):
+    def test_env_file_is_loaded_once_without_overriding_the_environment(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, ".env")
+            with open(path, "w") as f:
+                f.write("AGENTIC_TEST_FROM_FILE=file\nAGENTIC_TEST_SET=file\n")
+            with patch.object(config, "_loaded", False), \
+                    patch.dict(os.environ, {"AGENTIC_TEST_SET": "environment"}):
+                self.assertTrue(config.load_config(path))
+                self.assertFalse(config.load_config(path))
+                self.assertEqual(config.getenv("AGENTIC_TEST_FROM_FILE"), "file")
+                self.assertEqual(config.getenv("AGENTIC_TEST_SET"), "environment")
+                self.assertEqual(config.getenv("AGENTIC_TEST_MISSING", "default"), "default")
+            os.environ.pop("AGENTIC_TEST_FROM_FILE", None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Unit tests for the shared market-data layer.
+"""
+
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from orchestrator.market_data import load_market_data
+from orchestrator.history_utils import history_from_prices, compute_52week_stats
+
+class TestMarketData(unittest.TestCase):
+    def setUp(self):
+        index = pd.date_range("2024-01-01", periods=6, freq="D")
+        self.mock_data = pd.DataFrame([
+            {'Open': 100, 'Close': 101, 'High': 102, 'Low': 99},
+            {'Open': 100, 'Close': 100.5, 'High': 101, 'Low': 99.5},
+            {'Open': 100, 'Close': 99.8, 'High': 100.5, 'Low': 98},
+            {'Open': 100, 'Close': 100.2, 'High': 101, 'Low': 99},
+            {'Open': 100, 'Close': 100.1, 'High': 100.8, 'Low': 99.2},
+            {'Open': 100, 'Close': 110, 'High': 111, 'Low': 99}
+        ], index=index)
+
+    def test_history_from_prices_does_not_mutate_input(self):
+        history = history_from_prices(self.mock_data)
+        self.assertIn('Delta_OC', history.columns)
+        self.assertNotIn('Delta_OC', self.mock_data.columns)
+        self.assertAlmostEqual(history['Delta_OC'].iloc[2], 0.2, places=6)
+
+    @patch("orchestrator.market_data.fetch_52week_history")
+    @patch("orchestrator.market_data.fetch_price_with_fallback")
+    def test_single_fetch_feeds_history(self, mock_fetch, mock_history):
+        mock_fetch.return_value = self.mock_data
+        market_data = load_market_data("AAPL")
+
+        mock_fetch.assert_called_once_with("AAPL", period="1y", interval="1d")
+        mock_history.assert_not_called()
+        self.assertIn('Delta_OC', market_data["prices"].columns)
+        stats = compute_52week_stats(market_data["history"])
+        self.assertAlmostEqual(stats["90th_delta_oc"], 5.5, places=6)
+
+    @patch("orchestrator.market_data.fetch_52week_history")
+    @patch("orchestrator.market_data.fetch_price_with_fallback")
+    def test_quote_fallback_fetches_history(self, mock_fetch, mock_history):
+        mock_fetch.return_value = self.mock_data.tail(1)
+        mock_history.return_value = pd.DataFrame()
+        market_data = load_market_data("AAPL")
+
+        mock_history.assert_called_once_with("AAPL")
+        self.assertEqual(len(market_data["prices"]), 1)
+
+    @patch("orchestrator.market_data.fetch_52week_history")
+    @patch("orchestrator.market_data.fetch_price_with_fallback")
+    def test_intraday_prices_keep_daily_history(self, mock_fetch, mock_history):
+        mock_fetch.return_value = self.mock_data.set_axis(pd.date_range("2024-01-02 14:30", periods=6, freq="5min"))
+        mock_history.return_value = history_from_prices(self.mock_data)
+        market_data = load_market_data("AAPL", interval="5m", period="5d")
+
+        mock_fetch.assert_called_once_with("AAPL", period="5d", interval="5m")
+        mock_history.assert_called_once_with("AAPL")
+        self.assertEqual(len(market_data["prices"]), 6)
+        self.assertIs(market_data["history"], mock_history.return_value)
+
+    @patch("orchestrator.market_data.fetch_52week_history")
+    @patch("orchestrator.market_data.fetch_price_with_fallback")
+    def test_weekly_prices_keep_daily_history(self, mock_fetch, mock_history):
+        mock_fetch.return_value = self.mock_data.set_axis(pd.date_range("2024-01-01", periods=6, freq="W-MON"))
+        load_market_data("AAPL", interval="1wk")
+        mock_history.assert_called_once_with("AAPL")
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+"""
+Unit tests for the local vector memory: persistence, de-duplication, filters and the IVF index.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from utils import memory
+from utils.memory import VectorStore, hash_embed, format_memories
+
+TOPICS = ["revenue beat estimates", "supplier warns on demand", "dividend raised", "ceo resigns",
+          "guidance cut", "share buyback announced", "regulator opens probe", "new product launch"]
+
+
+class TestVectorStore(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.root = os.path.join(tmpdir.name, "memory")
+        self.store = VectorStore(self.root)
+
+    def test_embedding_is_normalized_and_similarity_ranks_topics(self):
+        self.assertAlmostEqual(float(np.linalg.norm(hash_embed("Apple beats revenue estimates"))), 1.0, places=5)
+        self.assertFalse(hash_embed("").any())
+        close = hash_embed("revenue beat estimates") @ hash_embed("quarterly revenue beat analyst estimates")
+        far = hash_embed("revenue beat estimates") @ hash_embed("ceo resigns after probe")
+        self.assertGreater(close, far)
+
+    def test_records_persist_and_duplicates_are_stored_once(self):
+        self.assertTrue(self.store.add("Supplier warns on demand.", "aapl", "news", "2024-05-02",
+                                       {"url": "https://example.com/a"}))
+        self.assertFalse(self.store.add("Supplier warns on demand.", "AAPL", "news", "2024-05-03"))
+        self.assertTrue(self.store.add("Supplier warns on demand.", "MSFT", "news", "2024-05-02"))
+        self.assertEqual(len(self.store), 2)
+
+        reopened = VectorStore(self.root)
+        hits = reopened.search("demand warning from a supplier", k=5, ticker="AAPL")
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0]["ticker"], "AAPL")
+        self.assertEqual(hits[0]["date"][:10], "2024-05-02")
+        self.assertEqual(hits[0]["metadata"], {"url": "https://example.com/a"})
+        self.assertFalse(reopened.add("Supplier warns on demand.", "AAPL", "news"))
+
+    def test_filters_by_ticker_kind_and_date(self):
+        self.store.add_many([
+            {"text": "hold: no anomaly", "ticker": "AAPL", "kind": "decision", "date": "2024-05-01"},
+            {"text": "sell: guidance cut", "ticker": "AAPL", "kind": "decision", "date": "2024-06-01"},
+            {"text": "guidance cut by management", "ticker": "AAPL", "kind": "news", "date": "2024-06-01"},
+            {"text": "sell: guidance cut", "ticker": "MSFT", "kind": "decision", "date": "2024-06-01"},
+        ])
+        hits = self.store.search("guidance cut", k=10, ticker="AAPL", kind="decision")
+        self.assertEqual([h["text"] for h in hits], ["sell: guidance cut", "hold: no anomaly"])
+        hits = self.store.search("guidance cut", k=10, ticker="AAPL", since="2024-05-15", until="2024-07-01")
+        self.assertEqual({h["kind"] for h in hits}, {"decision", "news"})
+        self.assertEqual(self.store.search("guidance cut", ticker="AAPL", until="2024-05-01"), [])
+        self.assertEqual(self.store.search("guidance cut", ticker="NVDA"), [])
+        self.assertEqual(self.store.search("guidance cut", k=1, kind=["news"])[0]["kind"], "news")
+
+    def test_ivf_index_is_trained_and_keeps_recall(self):
+        records = [{"text": f"{topic} for company {i}", "ticker": f"T{i % 7}", "kind": "news",
+                    "date": f"2024-01-{1 + i % 28:02d}"}
+                   for i, topic in enumerate(TOPICS * 60)]
+        with patch.object(memory, "IVF_TRAIN_MIN", 200), patch.object(memory, "EXACT_SEARCH_LIMIT", 50):
+            self.store.add_many(records[:240])
+            self.assertTrue(os.path.exists(os.path.join(self.root, "ivf.npy")))
+            self.store.add_many(records[240:])  # assigned to the existing lists
+            meta, _ = self.store._read()
+            self.assertTrue((meta["list"] >= 0).all())
+
+            found = 0
+            for i in range(0, len(records), 37):
+                hits = self.store.search(records[i]["text"], k=1, nprobe=4)
+                found += hits[0]["text"] == records[i]["text"]
+            self.assertGreaterEqual(found / len(range(0, len(records), 37)), 0.9)
+
+            hits = self.store.search("dividend raised", k=3, ticker="T3")
+            self.assertTrue(all(h["ticker"] == "T3" and "dividend" in h["text"] for h in hits))
+
+    def test_format_memories_truncates(self):
+        hits = [{"date": "2024-05-02T00:00:00", "kind": "news", "text": "Apple  beats\nestimates " + "x" * 300}]
+        line = format_memories(hits, max_chars=40)
+        self.assertTrue(line.startswith("- 2024-05-02 [news] Apple beats estimates"))
+        self.assertEqual(len(line), len("- 2024-05-02 [news] ") + 40)
+        self.assertEqual(format_memories([]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+Unit tests for the news agent, against a local HTML / RSS fixture server.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+from agents import news_agent
+from orchestrator import db_utils
+from utils.memory import VectorStore
+
+ARTICLE = """<html><head><title>{title} - Example News</title>
+<meta property="og:title" content="{title}">
+<meta property="article:published_time" content="{published}">
+<script>var tracking = 1;</script></head>
+<body><nav><p>Markets Tech Earnings</p></nav>
+<article><h1>{title}</h1>{paragraphs}</article>
+<footer><p>Copyright Example News</p></footer></body></html>"""
+
+def article_html(title, published, *paragraphs):
+    return ARTICLE.format(title=title, published=published, paragraphs="".join(f"<p>{p}</p>" for p in paragraphs))
+
+def rss(items):
+    entries = "".join(
+        f"<item><title>{title}</title><link>{link}</link><pubDate>{date}</pubDate>"
+        f"<description>&lt;b&gt;{summary}&lt;/b&gt;</description></item>"
+        for title, link, date, summary in items
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>AAPL</title>{entries}</channel></rss>'
+
+class FixtureServer:
+    """
+    Serves self.pages ({path: (status, body)}) on localhost; the feed honours If-None-Match.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fixture.requests.append(self.path)
+                status, body = fixture.pages.get(self.path, (404, "not found"))
+                etag = f'"{hash(body)}"'
+                if self.path.startswith("/feed/") and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class TestNewsAgent(unittest.TestCase):
+    def setUp(self):
+        self.server = FixtureServer()
+        self.addCleanup(self.server.close)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.addCleanup(db_utils.close_connections)
+        self.path = os.path.join(tmpdir.name, "news.db")
+        self.memory = VectorStore(os.path.join(tmpdir.name, "memory"))
+        for p in (patch.object(news_agent, "NEWS_DB_PATH", self.path),
+                  patch.object(news_agent, "memory_store", self.memory),
+                  patch.object(news_agent, "NEWS_FEED_URL", self.server.url + "/feed/{ticker}.xml")):
+            p.start()
+            self.addCleanup(p.stop)
+
+        now = time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime())
+        earlier = time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime(time.time() - 3600))
+        self.feed_items = [
+            ("Apple beats estimates", f"{self.server.url}/a/1.html", now, "Revenue rose 5%."),
+            ("Apple beats estimates (syndicated)", f"{self.server.url}/b/1.html", now, "Revenue rose 5%."),
+            ("Supplier warns on demand", f"{self.server.url}/a/2.html", earlier, "Orders slowed."),
+            ("Unavailable story", f"{self.server.url}/a/404.html", earlier, "Analysts cut targets."),
+        ]
+        story = ("Apple reported quarterly revenue above estimates.", "Services grew at a record pace.")
+        self.server.pages = {
+            "/feed/AAPL.xml": (200, rss(self.feed_items)),
+            "/a/1.html": (200, article_html("Apple beats estimates", "2024-05-02T20:30:00Z", *story)),
+            "/b/1.html": (200, article_html("Apple beats estimates", "2024-05-02T20:35:00Z", *story)),
+            "/a/2.html": (200, article_html("Supplier warns", "2024-05-02T19:00:00Z", "A key supplier warned on iPhone demand.")),
+        }
+
+    def article_requests(self):
+        return [p for p in self.server.requests if not p.startswith("/feed/")]
+
+    def test_refresh_dedups_and_only_pulls_what_is_new(self):
+        self.assertEqual(news_agent.refresh_news("aapl"), 3)  # the syndicated copy has the same text
+        self.assertEqual(len(self.article_requests()), 4)
+
+        # Unchanged feed: one conditional request, no article downloads
+        self.assertEqual(news_agent.refresh_news("AAPL"), 0)
+        self.assertEqual(len(self.article_requests()), 4)
+        self.assertEqual(self.server.requests[-1], "/feed/AAPL.xml")
+
+        self.feed_items.insert(0, ("New product launch", f"{self.server.url}/a/3.html",
+                                   self.feed_items[0][2], "A new device."))
+        self.server.pages["/feed/AAPL.xml"] = (200, rss(self.feed_items))
+        self.server.pages["/a/3.html"] = (200, article_html("Launch", "2024-05-03T10:00:00Z", "Apple unveiled a device."))
+        self.assertEqual(news_agent.refresh_news("AAPL"), 1)
+        self.assertEqual(self.article_requests()[4:], ["/a/3.html"])  # known and duplicate URLs are skipped
+
+    def test_only_served_feeds_count_as_successes(self):
+        self.server.pages["/feed/AAPL.xml"] = (503, "unavailable")
+        with patch.object(news_agent, "get_limiter") as get_limiter:
+            self.assertEqual(news_agent.refresh_news("AAPL"), 0)
+            get_limiter.return_value.record_success.assert_not_called()
+            self.server.pages["/feed/AAPL.xml"] = (200, rss(self.feed_items))
+            self.assertEqual(news_agent.refresh_news("AAPL"), 3)
+            get_limiter.return_value.record_success.assert_called_once_with()
+
+    def test_articles_are_parsed_and_searchable(self):
+        news_agent.refresh_news("AAPL")
+        recent = news_agent.recent_news("AAPL", limit=10)
+        self.assertEqual(len(recent), 3)
+        self.assertEqual(recent[0]["title"], "Apple beats estimates")
+        self.assertEqual(recent[0]["summary"], "Revenue rose 5%.")
+
+        hits = news_agent.search_news("supplier demand", ticker="AAPL")
+        self.assertEqual([h["title"] for h in hits], ["Supplier warns on demand"])
+        self.assertEqual(news_agent.search_news("copyright OR tracking"), [])  # boilerplate is not indexed
+        self.assertEqual([h["title"] for h in news_agent.search_news("analysts")], ["Unavailable story"])
+
+        memories = self.memory.search("supplier demand", k=1, ticker="AAPL", kind="news")
+        self.assertEqual(memories[0]["text"], "Supplier warns on demand Orders slowed.")
+        self.assertEqual(memories[0]["metadata"], {"url": f"{self.server.url}/a/2.html"})
+
+    def test_context_is_a_local_read_that_schedules_stale_refreshes(self):
+        with patch.object(news_agent, "schedule_refresh") as schedule:
+            self.assertEqual(news_agent.news_context("AAPL"), news_agent.NO_NEWS)
+            schedule.assert_called_once_with("AAPL")
+
+        news_agent.refresh_news("AAPL")
+        requests_before = len(self.server.requests)
+        with patch.object(news_agent, "schedule_refresh") as schedule:
+            start = time.perf_counter()
+            context = news_agent.news_context("AAPL")
+            elapsed = time.perf_counter() - start
+            schedule.assert_not_called()
+        self.assertEqual(len(self.server.requests), requests_before)
+        self.assertLess(elapsed, 0.05)
+        self.assertIn("Apple beats estimates: Revenue rose 5%.", context)
+        self.assertEqual(context.count(" | "), 2)
+
+    def test_background_refresh_runs_once_per_ticker(self):
+        futures = [news_agent.schedule_refresh("AAPL") for _ in range(3)]
+        self.assertIsNotNone(futures[0])
+        self.assertEqual(futures[1:], [None, None])
+        self.assertEqual(futures[0].result(timeout=10), 3)
+        self.assertEqual(news_agent.schedule_refresh("AAPL").result(timeout=10), 0)  # done, so a new one may start
+
+    def test_parse_atom_feed(self):
+        atom = ('<feed xmlns="http://www.w3.org/2005/Atom"><entry><title>T</title>'
+                '<link href="https://example.com/x"/><updated>2024-05-02T10:00:00+02:00</updated>'
+                '<summary>S</summary></entry></feed>')
+        self.assertEqual(news_agent.parse_feed(atom), [
+            {"url": "https://example.com/x", "title": "T", "published": "2024-05-02T08:00:00Z", "summary": "S"}
+        ])
+        self.assertEqual(news_agent.parse_feed("<html>"), [])
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
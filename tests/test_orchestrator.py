@@ -0,0 +1,217 @@
+"""
+Unit tests for the async /price handler.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import pandas as pd
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from agents.price_agent import compute_deltas
+from orchestrator import orchestrator, db_utils
+from orchestrator.ai_utils import PriceAnalysis
+from utils import telemetry
+from utils.telemetry import Metrics
+from orchestrator.history_utils import history_from_prices, compute_52week_stats, compute_trend_indicators
+
+LEGACY_DECISION = '{"decision": "Hold", "confidence": 0.6, "reasoning": "range-bound", "key_factors": ["trend"]}'
+
+def slow(value, delay=0.2):
+    def call(*args, **kwargs):
+        time.sleep(delay)
+        return value
+    return call
+
+class TestPriceHandler(unittest.TestCase):
+    def setUp(self):
+        index = pd.date_range("2024-01-01", periods=6, freq="D")
+        prices = pd.DataFrame({
+            'Open': [100.0] * 6,
+            'Close': [101, 100.5, 99.8, 100.2, 100.1, 110],
+            'High': [102, 101, 100.5, 101, 100.8, 111],
+            'Low': [99, 99.5, 98, 99, 99.2, 99]
+        }, index=index)
+        self.prices = prices
+        market_data = {
+            "ticker": "AAPL",
+            "prices": compute_deltas(prices),
+            "history": history_from_prices(prices),
+        }
+        patches = [
+            patch.object(orchestrator, "init_db"),
+            patch.object(orchestrator, "load_market_data", return_value=market_data),
+            patch.object(orchestrator, "price_log_writer"),
+            patch.object(orchestrator, "update_rolling_context",
+                         side_effect=lambda t, h: (compute_52week_stats(h), compute_trend_indicators(h))),
+            patch.object(orchestrator, "generate_price_comment", side_effect=slow("comment")),
+            patch.object(orchestrator, "generate_investment_decision", side_effect=slow(LEGACY_DECISION)),
+            patch.object(orchestrator, "load_kpi_context", return_value="eps=$1.40 (from q2.pdf)"),
+            patch.object(orchestrator, "load_news_context", return_value="2024-05-02 Apple beats estimates"),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_stages_run_concurrently_with_same_response_shape(self):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = asyncio.run(orchestrator.price_agent("AAPL", combined=False))
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.35)  # two 0.2s LLM stages, not 0.4s in sequence
+        self.assertEqual(list(output.keys()),
+                         ["ticker", "timestamp", "alert", "metrics", "details", "ia_comment", "ia_decision"])
+        self.assertTrue(output["alert"])
+        self.assertEqual(output["ia_comment"], "comment")
+        self.assertEqual(output["ia_decision"], {"decision": "hold", "confidence": 0.6, "reasoning": "range-bound",
+                                                 "key_factors": ["trend"]})
+        orchestrator.price_log_writer.submit.assert_called_once()
+
+    def test_combined_mode_returns_structured_decision(self):
+        analysis = PriceAnalysis("comment", "buy", 0.7, "momentum", ["trend"])
+        with patch.object(orchestrator, "generate_price_analysis", return_value=analysis) as generate, \
+                contextlib.redirect_stdout(io.StringIO()):
+            output = asyncio.run(orchestrator.price_agent("AAPL"))
+
+        orchestrator.generate_price_comment.assert_not_called()
+        orchestrator.generate_investment_decision.assert_not_called()
+        self.assertEqual(generate.call_args.args[-2:], ("2024-05-02 Apple beats estimates", "eps=$1.40 (from q2.pdf)"))
+        self.assertEqual(output["ia_comment"], "comment")
+        self.assertEqual(output["ia_decision"]["decision"], "buy")
+
+    def test_combined_mode_falls_back_to_two_calls(self):
+        with patch.object(orchestrator, "generate_price_analysis", return_value=None), \
+                contextlib.redirect_stdout(io.StringIO()):
+            output = asyncio.run(orchestrator.price_agent("AAPL"))
+        self.assertEqual(output["ia_decision"]["decision"], "hold")
+        self.assertNotIn("ia_error", output)
+
+    def test_unusable_legacy_decision_is_null_with_error(self):
+        for answer, error in [("I would buy.", "not valid JSON"), ("⚠ No OpenAI API key configured.", "No OpenAI")]:
+            with patch.object(orchestrator, "generate_investment_decision", return_value=answer), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                output = asyncio.run(orchestrator.price_agent("AAPL", combined=False))
+            self.assertIsNone(output["ia_decision"])
+            self.assertIn(error, output["ia_error"])
+
+    def test_prices_batch_adds_batched_decisions(self):
+        prices = {"AAPL": self.prices, "MSFT": self.prices}
+        decision = {"decision": "hold", "confidence": 0.5, "reasoning": "flat", "key_factors": []}
+        with patch.object(orchestrator, "run_price_agent_batch",
+                          return_value=[orchestrator.new_price_result(t) for t in prices]), \
+                patch.object(orchestrator, "fetch_prices_batch", return_value=prices), \
+                patch.object(orchestrator, "generate_investment_decisions_batch",
+                             return_value={"AAPL": decision, "MSFT": None}) as batch:
+            output = asyncio.run(orchestrator.prices_batch("AAPL,MSFT", decisions=True))
+
+        self.assertEqual(batch.call_count, 1)
+        self.assertEqual([item[0]["ticker"] for item in batch.call_args.args[0]], ["AAPL", "MSFT"])
+        self.assertEqual(output[0]["ia_decision"], decision)
+        self.assertIsNone(output[1]["ia_decision"])
+
+    def test_intraday_interval_reaches_the_market_data_layer(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = asyncio.run(orchestrator.price_agent("AAPL", combined=False, interval="5m"))
+
+        orchestrator.load_market_data.assert_called_once_with("AAPL", interval="5m")
+        self.assertEqual(output["details"]["interval"], "5m")
+        with self.assertRaises(HTTPException) as raised:
+            asyncio.run(orchestrator.price_agent("AAPL", interval="3m"))
+        self.assertEqual(raised.exception.status_code, 400)
+
+    def test_batch_decisions_use_daily_history_for_other_intervals(self):
+        weekly = self.prices.set_axis(pd.date_range("2024-01-01", periods=6, freq="W-MON"))
+        with patch.object(orchestrator, "fetch_prices_batch", return_value={"AAPL": weekly}) as fetch, \
+                patch.object(orchestrator, "fetch_52week_history", return_value=history_from_prices(self.prices)) as history, \
+                patch.object(orchestrator, "generate_investment_decisions_batch", return_value={}):
+            orchestrator._batch_decisions([orchestrator.new_price_result("AAPL")], interval="1wk")
+
+        fetch.assert_not_called()
+        history.assert_called_once_with("AAPL")
+        orchestrator.update_rolling_context.assert_called_once_with("AAPL", history.return_value)
+
+    def test_batch_decisions_do_not_persist_a_quote_row(self):
+        quote = self.prices.tail(1)
+        with patch.object(orchestrator, "fetch_prices_batch", return_value={"AAPL": quote, "MSFT": None}), \
+                patch.object(orchestrator, "fetch_52week_history", return_value=history_from_prices(self.prices)) as history, \
+                patch.object(orchestrator, "generate_investment_decisions_batch", return_value={}):
+            orchestrator._batch_decisions([orchestrator.new_price_result(t) for t in ["AAPL", "MSFT"]])
+
+        self.assertEqual([c.args for c in history.call_args_list], [("AAPL",), ("MSFT",)])
+        for call in orchestrator.update_rolling_context.call_args_list:
+            self.assertEqual(len(call.args[1]), len(self.prices))
+
+    def test_server_timing_header_lists_stages(self):
+        request = Request({"type": "http", "method": "GET", "path": "/price", "headers": [], "query_string": b""})
+
+        async def call_next(request):
+            return JSONResponse(await orchestrator.price_agent("AAPL", combined=False))
+
+        with patch.object(telemetry, "metrics", Metrics()), patch.object(telemetry, "METRICS_ENABLED", True), \
+                contextlib.redirect_stdout(io.StringIO()):
+            response = asyncio.run(orchestrator.request_timing(request, call_next))
+            rendered = telemetry.metrics.render()
+
+        self.assertRegex(response.headers["Server-Timing"], r"^compute;dur=[\d.]+, total;dur=[\d.]+$")
+        self.assertIn('agentic_stage_duration_seconds_count{stage="compute"} 1', rendered)
+        self.assertIn("agentic_request_duration_seconds_count", rendered)
+
+class TestPriceLogsEndpoint(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        patcher = patch.object(db_utils, "DB_PATH", os.path.join(tmpdir.name, "agentic.db"))
+        patcher.start()
+        self.addCleanup(tmpdir.cleanup)
+        self.addCleanup(patcher.stop)
+        self.addCleanup(db_utils.close_connections)
+        db_utils.init_db()
+        db_utils.log_price_results([
+            {"ticker": "AAPL", "timestamp": f"2024-01-01T00:00:{i:02d}Z", "alert": i % 3 == 0,
+             "metrics": {"delta_oc": float(i), "delta_hl": 1.0},
+             "details": {"static_oc_threshold": 5.0, "static_hl_threshold": 7.0,
+                         "dynamic_window": 3, "std_multiplier": 2.0}}
+            for i in range(1200)
+        ])
+
+    def get(self, **params):
+        # Handlers called directly receive Query() defaults, so pass every parameter
+        args = {"alert": None, "ticker": None, "limit": None, "columns": None, "after_id": None,
+                "before_id": None, "since": None, "until": None, "fmt": "json"}
+        return orchestrator.get_price_logs(**{**args, **params})
+
+    def body(self, response):
+        async def read():
+            return "".join([chunk async for chunk in response.body_iterator])
+        return asyncio.run(read())
+
+    def test_json_page_defaults_to_ten_rows(self):
+        page = self.get(columns="id,delta_oc", before_id=100)
+        self.assertEqual(page[0], {"id": 99, "delta_oc": 98.0})
+        self.assertEqual(len(page), 10)
+
+    def test_ndjson_export_streams_every_row(self):
+        response = self.get(fmt="ndjson", columns="id,alert", after_id=0)
+        self.assertEqual(response.media_type, "application/x-ndjson")
+        lines = self.body(response).splitlines()
+        self.assertEqual(len(lines), 1200)
+        self.assertEqual(json.loads(lines[0]), {"id": 1, "alert": 1})
+
+    def test_csv_export_with_filters(self):
+        response = self.get(fmt="csv", alert=1, columns="ticker,delta_oc", limit=3)
+        self.assertEqual(self.body(response).splitlines(), ["ticker,delta_oc", "AAPL,1197.0", "AAPL,1194.0", "AAPL,1191.0"])
+
+    def test_invalid_request_is_rejected(self):
+        for params in ({"columns": "nope"}, {"fmt": "xml"}, {"fmt": "csv", "until": "soon"}):
+            with self.assertRaises(HTTPException) as ctx:
+                self.get(**params)
+            self.assertEqual(ctx.exception.status_code, 400)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
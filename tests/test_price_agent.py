@@ -2,9 +2,18 @@
 Unit tests for price_agent.py enriched alert logic.
 """
 
+import tempfile
+import threading
 import unittest
+from unittest.mock import Mock, patch
 import pandas as pd
-from agents.price_agent import compute_deltas, check_alert_enriched
+from types import SimpleNamespace
+from agents.price_agent import (compute_deltas, check_alert_enriched, fetch_prices_batch, build_price_result,
+                                run_price_agent_batch, fetch_price_yfinance, fetch_price_with_fallback, clamp_period)
+from utils.bar_store import BarStore
+from utils.bars import Bars
+from utils.cache import TTLCache, market_data_key
+from helpers import SharedStateYfinance
 
 class TestPriceAgent(unittest.TestCase):
     def setUp(self):
@@ -42,5 +51,245 @@ class TestPriceAgent(unittest.TestCase):
         alert = check_alert_enriched(normal_data, static_oc=20.0, static_hl=20.0, std_multiplier=3.0)
         self.assertFalse(alert)
 
+class TestFetchPricesBatch(unittest.TestCase):
+    def setUp(self):
+        index = pd.date_range("2024-01-01", periods=3, freq="D")
+        frames = {
+            "AAPL": pd.DataFrame({'Open': [100, 100, 100], 'High': [102, 101, 111],
+                                  'Low': [99, 99.5, 99], 'Close': [101, 100.5, 110]}, index=index),
+            "MSFT": pd.DataFrame({'Open': [50, 50, 50], 'High': [51, 51, 51],
+                                  'Low': [49, 49, 49], 'Close': [50.5, 50.2, 50.1]}, index=index),
+        }
+        self.bulk = pd.concat(frames, axis=1)
+        self.cache = TTLCache(ttl=60)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.store = BarStore(tmpdir.name)
+        for patcher in (patch("agents.price_agent.market_cache", self.cache),
+                        patch("agents.price_agent.bar_store", self.store),
+                        patch("agents.price_agent.fetch_candles_finnhub", return_value=None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("agents.price_agent.fetch_price_finnhub")
+    @patch("agents.price_agent.yf.download")
+    def test_single_bulk_download_split_per_ticker(self, mock_download, mock_finnhub):
+        mock_download.return_value = self.bulk
+        mock_finnhub.return_value = None
+
+        results = fetch_prices_batch(["aapl", "MSFT", "ZZZZ"])
+
+        mock_download.assert_called_once()
+        self.assertEqual(mock_download.call_args.args[0], ["AAPL", "MSFT", "ZZZZ"])
+        self.assertEqual(list(results["AAPL"].columns), ['Open', 'High', 'Low', 'Close'])
+        self.assertEqual(results["MSFT"]['Close'].iloc[-1], 50.1)
+        mock_finnhub.assert_called_once_with("ZZZZ")
+        self.assertIsNone(results["ZZZZ"])
+
+        self.assertTrue(build_price_result("AAPL", results["AAPL"])["alert"])
+        self.assertFalse(build_price_result("MSFT", results["MSFT"])["alert"])
+
+    @patch("agents.price_agent.fetch_price_finnhub")
+    @patch("agents.price_agent.yf.download")
+    def test_cached_tickers_skip_download(self, mock_download, mock_finnhub):
+        mock_download.return_value = self.bulk
+        fetch_prices_batch(["AAPL", "MSFT"])
+        fetch_prices_batch(["MSFT", "AAPL"])
+        mock_download.assert_called_once()
+        mock_finnhub.assert_not_called()
+
+    @patch("agents.price_agent.fetch_price_finnhub")
+    @patch("agents.price_agent.yf.download")
+    def test_batch_results_match_single_ticker_path(self, mock_download, mock_finnhub):
+        mock_download.return_value = self.bulk
+        mock_finnhub.return_value = None
+
+        results = {r["ticker"]: r for r in run_price_agent_batch(["AAPL", "MSFT", "ZZZZ"])}
+        for ticker in ["AAPL", "MSFT"]:
+            expected = build_price_result(ticker, self.bulk[ticker])
+            self.assertEqual(results[ticker]["alert"], expected["alert"])
+            self.assertAlmostEqual(results[ticker]["metrics"]["delta_oc"], expected["metrics"]["delta_oc"])
+        self.assertEqual(results["ZZZZ"]["metrics"], {})
+
+    @patch("agents.price_agent.fetch_price_finnhub")
+    @patch("agents.price_agent.yf.download")
+    def test_known_tickers_only_download_new_bars(self, mock_download, mock_finnhub):
+        mock_download.return_value = self.bulk
+        fetch_prices_batch(["AAPL", "MSFT"])
+        self.assertEqual(mock_download.call_args.kwargs["period"], "1y")
+
+        next_day = pd.concat({t: self.bulk[t].iloc[[-1]].rename(index=lambda _: pd.Timestamp("2024-01-04"))
+                              for t in ["AAPL", "MSFT"]}, axis=1)
+        mock_download.return_value = next_day
+        results = fetch_prices_batch(["AAPL", "MSFT"], refresh=True)
+
+        self.assertEqual(mock_download.call_args.kwargs["start"], "2024-01-03")
+        self.assertNotIn("period", mock_download.call_args.kwargs)
+        self.assertEqual(len(results["AAPL"]), 4)
+        self.assertEqual(self.store.count("MSFT", "1d"), 4)
+        mock_finnhub.assert_not_called()
+
+class TestFetchPriceYfinanceStore(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.store = BarStore(tmpdir.name)
+        for patcher in (patch("utils.cache.market_cache", TTLCache(ttl=60)),
+                        patch("agents.price_agent.bar_store", self.store)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("agents.price_agent.yf.download")
+    def test_restart_reads_store_and_fetches_increment(self, mock_download):
+        end = pd.Timestamp.now().normalize()
+        year = pd.DataFrame({'Open': 100.0, 'High': 101.0, 'Low': 99.0, 'Close': 100.5},
+                            index=pd.date_range(end=end - pd.Timedelta(days=1), periods=400, freq="D"))
+        self.store.append("AAPL", "1d", year)
+        mock_download.return_value = year.iloc[[-1]].rename(index=lambda _: end)
+
+        data = fetch_price_yfinance("AAPL", period="1y", interval="1d")
+
+        self.assertEqual(mock_download.call_args.kwargs["start"], (end - pd.Timedelta(days=1)).strftime("%Y-%m-%d"))
+        self.assertEqual(data.index[-1], end)
+        self.assertEqual(self.store.count("AAPL", "1d"), 401)
+
+    def test_concurrent_downloads_keep_their_own_rate_limit_state(self):
+        end = pd.Timestamp.now().normalize()
+        frames = {f"T{i}": pd.DataFrame({'Open': 10.0 + i, 'High': 11.0 + i, 'Low': 9.0 + i, 'Close': 10.5 + i},
+                                        index=pd.date_range(end=end, periods=5, freq="D")) for i in range(8)}
+        limiter = Mock()
+        with patch("agents.price_agent.yf", SharedStateYfinance(frames, rate_limited={"T0"})), \
+                patch("agents.price_agent.get_limiter", return_value=limiter):
+            threads = [threading.Thread(target=fetch_price_yfinance, args=(t,)) for t in list(frames) * 3]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(limiter.record_rate_limited.call_count, 3)
+        self.assertEqual(limiter.record_success.call_count, 21)
+        for i in range(1, 8):
+            self.assertEqual(self.store.read(f"T{i}")["Close"].iloc[-1], 10.5 + i)
+        self.assertEqual(self.store.count("T0", "1d"), 0)
+
+    @patch("agents.price_agent.yf.download")
+    def test_recent_listing_is_backfilled_once(self, mock_download):
+        end = pd.Timestamp.now().normalize()
+        listed = pd.DataFrame({'Open': 10.0, 'High': 11.0, 'Low': 9.0, 'Close': 10.5},
+                              index=pd.date_range(end=end - pd.Timedelta(days=1), periods=30, freq="D"))
+        mock_download.return_value = listed
+        fetch_price_yfinance("NEWCO", period="1y", interval="1d")
+        self.assertEqual(mock_download.call_args.kwargs["period"], "1y")
+
+        with patch("utils.cache.market_cache", TTLCache(ttl=60)):
+            mock_download.return_value = listed.iloc[[-1]].rename(index=lambda _: end)
+            data = fetch_price_yfinance("NEWCO", period="1y", interval="1d")
+        self.assertNotIn("period", mock_download.call_args.kwargs)
+        self.assertEqual(len(data), 31)
+
+        with patch("utils.cache.market_cache", TTLCache(ttl=60)):
+            fetch_price_yfinance("NEWCO", period="2y", interval="1d")
+        self.assertEqual(mock_download.call_args.kwargs["period"], "2y")  # reaches further back: once more
+
+class TestIntraday(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.store = BarStore(tmpdir.name)
+        self.cache = TTLCache(ttl=60)
+        for patcher in (patch("utils.cache.market_cache", self.cache),
+                        patch("agents.price_agent.market_cache", self.cache),
+                        patch("agents.price_agent.bar_store", self.store)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        index = pd.date_range(pd.Timestamp.now().normalize() - pd.Timedelta(days=1) + pd.Timedelta(hours=14.5),
+                              periods=78, freq="5min")
+        self.session = pd.DataFrame({'Open': 100.0, 'High': 101.0, 'Low': 99.0, 'Close': 100.5,
+                                     'Volume': 1000.0}, index=index)
+
+    def test_periods_are_capped_for_intraday_intervals(self):
+        self.assertEqual(clamp_period("1y", "1m"), "7d")
+        self.assertEqual(clamp_period("5d", "1m"), "5d")
+        self.assertEqual(clamp_period("max", "5m"), "60d")
+        self.assertEqual(clamp_period("5y", "1d"), "5y")
+
+    @patch("agents.price_agent.yf.download")
+    def test_coarser_interval_is_resampled_from_stored_bars(self, mock_download):
+        mock_download.return_value = self.session
+        data = fetch_price_with_fallback("AAPL", period="1mo", interval="15m")
+
+        self.assertEqual(mock_download.call_args.kwargs["interval"], "5m")
+        self.assertEqual(mock_download.call_args.kwargs["period"], "1mo")
+        self.assertEqual(self.store.intervals("AAPL"), ["5m"])
+        self.assertEqual(len(data), 26)
+        self.assertEqual(data["Volume"].iloc[0], 3000.0)
+        self.assertEqual(data.index.name, "Datetime")
+
+    @patch("agents.price_agent.yf.download")
+    def test_intraday_frames_are_cached_as_compact_bars(self, mock_download):
+        mock_download.return_value = self.session
+        first = fetch_price_yfinance("AAPL", period="5d", interval="5m")
+        cached = self.cache.get(market_data_key("AAPL", "5d", "5m", "yfinance"))
+
+        self.assertIsInstance(cached, Bars)
+        self.assertEqual(cached.nbytes, 78 * 28)
+        second = fetch_price_yfinance("AAPL", period="5d", interval="5m")
+        self.assertEqual(mock_download.call_count, 1)
+        pd.testing.assert_frame_equal(first, second)
+
+        run_price_agent_batch(["AAPL"], interval="5m", period="5d")
+        self.assertEqual(mock_download.call_count, 1)  # served by the same cache entry
+
+    @patch("agents.price_agent.FINNHUB_API_KEY", "test")
+    @patch("agents.price_agent.requests.get")
+    @patch("agents.price_agent.yf.download", return_value=pd.DataFrame())
+    def test_finnhub_candles_fallback_fills_the_store(self, mock_download, mock_get):
+        ts = self.session.index.as_unit("s").asi8.tolist()
+        candles = {"s": "ok", "t": ts, "o": [100.0] * 78, "h": [101.0] * 78, "l": [99.0] * 78,
+                   "c": [100.5] * 78, "v": [1000] * 78}
+        mock_get.return_value = SimpleNamespace(status_code=200, headers={}, json=lambda: candles)
+
+        data = fetch_price_with_fallback("AAPL", period="5d", interval="5m")
+
+        self.assertEqual(mock_get.call_args.kwargs["params"]["resolution"], "5")
+        self.assertEqual(len(data), 78)
+        self.assertEqual(self.store.count("AAPL", "5m"), 78)
+
+    @patch("orchestrator.history_utils.FINNHUB_API_KEY", "test")
+    @patch("agents.price_agent.FINNHUB_API_KEY", "test")
+    @patch("agents.price_agent.get_limiter")
+    @patch("agents.price_agent.requests.get")
+    @patch("agents.price_agent.yf.download", return_value=pd.DataFrame())
+    def test_history_fallback_reports_finnhub_successes_only(self, mock_download, mock_get, mock_limiter):
+        from orchestrator.history_utils import fetch_52week_history
+        daily = self.session.iloc[:5].set_axis(pd.date_range("2024-05-27", periods=5, freq="D"))
+        candles = {"s": "ok", "t": daily.index.as_unit("s").asi8.tolist(), "o": [100.0] * 5, "h": [101.0] * 5,
+                   "l": [99.0] * 5, "c": [100.5] * 5}
+        limiters = {}
+        mock_limiter.side_effect = lambda provider: limiters.setdefault(provider, Mock())
+
+        mock_get.return_value = SimpleNamespace(status_code=500, headers={}, json=lambda: {})
+        self.assertTrue(fetch_52week_history("MSFT").empty)
+        finnhub = limiters["finnhub"]
+        finnhub.record_success.assert_not_called()
+
+        mock_get.return_value = SimpleNamespace(status_code=200, headers={}, json=lambda: candles)
+        self.assertEqual(len(fetch_52week_history("AAPL")), 5)
+        finnhub.record_success.assert_called_once_with()
+        finnhub.record_rate_limited.assert_not_called()
+
+    @patch("agents.price_agent.fetch_candles_finnhub", return_value=None)
+    @patch("agents.price_agent.requests.get")
+    @patch("agents.price_agent.yf.download", return_value=pd.DataFrame())
+    def test_quote_fallback_is_timestamped(self, mock_download, mock_get, mock_candles):
+        quote = {"c": 101.0, "o": 100.0, "h": 102.0, "l": 99.0, "t": 1717171200}
+        mock_get.return_value = SimpleNamespace(status_code=200, headers={}, json=lambda: quote)
+
+        data = fetch_price_with_fallback("AAPL", interval="5m")
+
+        mock_candles.assert_called_once_with("AAPL", period="1y", interval="5m")
+        self.assertEqual(data.index[0], pd.Timestamp("2024-05-31 16:00"))
+        self.assertEqual(build_price_result("AAPL", data, interval="5m")["details"]["interval"], "5m")
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
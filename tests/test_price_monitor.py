@@ -0,0 +1,80 @@
+"""
+Unit tests for the streaming price monitor, run against a local replay source.
+"""
+
+import asyncio
+import contextlib
+import io
+import unittest
+import pandas as pd
+from agents.price_agent import check_alert_enriched
+from agents.price_monitor import PriceMonitor, ReplaySource, AlertBroadcaster
+from helpers import make_frames
+
+class TestPriceMonitor(unittest.TestCase):
+    def test_replay_matches_check_alert_enriched(self):
+        frames = make_frames(n_tickers=5, n_days=30, seed=5)
+        params = dict(static_oc=3.0, static_hl=6.0, dynamic_window=3, std_multiplier=1.0)
+        results = []
+        monitor = PriceMonitor(ReplaySource(frames), on_result=results.append, **params)
+        asyncio.run(monitor.run(interval=0))
+
+        self.assertEqual(len(results), sum(len(f) for f in frames.values()))
+        self.assertTrue(any(r["alert"] for r in results))
+        with contextlib.redirect_stdout(io.StringIO()):
+            for r in results:
+                frame = frames[r["ticker"]]
+                history = frame[frame.index <= pd.Timestamp(r["timestamp"])]
+                self.assertEqual(r["alert"], check_alert_enriched(history, **params), r)
+
+    def test_revised_bar_replaces_latest(self):
+        monitor = PriceMonitor(ReplaySource({}))
+        monitor.process_bar("AAPL", "2024-01-01", 100, 101, 99, 100.5)
+        result = monitor.process_bar("AAPL", "2024-01-01", 100, 111, 99, 110)
+        self.assertEqual(result["reason"], "static_oc")
+        self.assertEqual(monitor.states["AAPL"].count, 1)
+        self.assertIsNone(monitor.process_bar("AAPL", "2023-12-29", 100, 101, 99, 100))
+
+    def test_polling_the_same_bar_notifies_once(self):
+        broadcaster = AlertBroadcaster()
+        results = []
+        monitor = PriceMonitor(ReplaySource({}), broadcaster=broadcaster, on_result=results.append)
+        for _ in range(3):
+            result = monitor.process_bar("AAPL", "2024-01-01", 100, 111, 99, 110)
+            self.assertEqual(result["reason"], "static_oc")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(len(broadcaster.recent), 1)
+
+        # Same bar, new reason: the change is passed on
+        monitor.process_bar("AAPL", "2024-01-01", 100, 108, 99, 101)
+        self.assertEqual([r["reason"] for r in results], ["static_oc", "static_hl"])
+        monitor.process_bar("AAPL", "2024-01-02", 100, 111, 99, 110)
+        self.assertEqual(len(broadcaster.recent), 3)
+
+    def test_alerts_are_pushed_to_subscribers(self):
+        broadcaster = AlertBroadcaster()
+        frames = {"AAPL": pd.DataFrame({'Open': [100.0, 100.0], 'High': [101.0, 111.0],
+                                        'Low': [99.0, 99.0], 'Close': [100.5, 110.0]},
+                                       index=pd.date_range("2024-01-01", periods=2))}
+
+        async def run():
+            received = []
+
+            async def consume():
+                async for event in broadcaster.subscribe():
+                    received.append(event)
+                    return
+
+            consumer = asyncio.create_task(consume())
+            await asyncio.sleep(0)  # let the consumer subscribe
+            await PriceMonitor(ReplaySource(frames), broadcaster=broadcaster).run(interval=0)
+            await asyncio.wait_for(consumer, timeout=1)
+            return received
+
+        received = asyncio.run(run())
+        self.assertEqual(received[0]["ticker"], "AAPL")
+        self.assertEqual(received[0]["reason"], "static_oc")
+        self.assertEqual(list(broadcaster.recent), received)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,82 @@
+"""
+Unit tests for the per-provider token-bucket rate limiter.
+"""
+
+import asyncio
+import threading
+import unittest
+from utils.rate_limiter import TokenBucket, get_limiter
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.time = FakeTime()
+        self.bucket = TokenBucket(rate=1.0, capacity=3, clock=self.time.clock, sleep=self.time.sleep)
+
+    def test_no_wait_within_budget(self):
+        for _ in range(3):
+            self.bucket.acquire()
+        self.assertEqual(self.time.sleeps, [])
+
+    def test_waits_only_when_budget_used_up(self):
+        for _ in range(4):
+            self.bucket.acquire()
+        self.assertEqual(len(self.time.sleeps), 1)
+        self.assertAlmostEqual(self.time.sleeps[0], 1.0)
+
+    def test_rate_limited_backs_off_and_recovers(self):
+        self.bucket.record_rate_limited()
+        self.assertAlmostEqual(self.bucket.rate, 0.5)
+        self.bucket.acquire()
+        self.assertAlmostEqual(self.time.sleeps[0], 2.0)
+
+        self.bucket.record_rate_limited(retry_after=5)
+        self.assertAlmostEqual(self.bucket.backoff, 2.0)
+        for _ in range(10):
+            self.bucket.record_success()
+        self.assertEqual(self.bucket.rate, self.bucket.base_rate)
+        self.assertEqual(self.bucket.backoff, 0.0)
+
+    def test_async_acquire(self):
+        bucket = TokenBucket(rate=1000.0, capacity=1)
+
+        async def run():
+            await asyncio.gather(*(bucket.acquire_async() for _ in range(5)))
+
+        asyncio.run(run())
+        self.assertLessEqual(bucket.tokens, 0)
+
+    def test_concurrent_threads_share_budget(self):
+        bucket = TokenBucket(rate=1.0, capacity=2, clock=self.time.clock, sleep=lambda s: None)
+        waits = []
+        lock = threading.Lock()
+
+        def worker():
+            wait = bucket._reserve()
+            with lock:
+                waits.append(wait)
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(waits), [0.0, 0.0, 1.0, 2.0, 3.0])
+
+    def test_limiters_are_shared_per_provider(self):
+        self.assertIs(get_limiter("finnhub"), get_limiter("finnhub"))
+        self.assertIsNot(get_limiter("finnhub"), get_limiter("yfinance"))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,71 @@
+"""
+Unit tests for incremental 52-week stats and trend indicators.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from orchestrator import db_utils, rolling_stats
+from orchestrator.history_utils import history_from_prices, compute_52week_stats, compute_trend_indicators
+from orchestrator.rolling_stats import RollingStats, STATS_WINDOW
+
+def make_history(n_days=320, seed=3):
+    rng = np.random.default_rng(seed)
+    open_ = 150 + rng.normal(0, 2, n_days).cumsum()
+    close = open_ * (1 + rng.normal(0, 0.015, n_days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n_days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n_days)))
+    index = pd.bdate_range("2023-01-02", periods=n_days)
+    return history_from_prices(pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close}, index=index))
+
+class TestRollingStats(unittest.TestCase):
+    def assert_dicts_close(self, actual, expected):
+        self.assertEqual(actual.keys(), expected.keys())
+        for key, value in expected.items():
+            if value is None:
+                self.assertIsNone(actual[key], key)
+            else:
+                self.assertAlmostEqual(actual[key], value, places=7, msg=key)
+
+    def test_incremental_updates_match_full_recompute(self):
+        history = make_history()
+        stats = RollingStats()
+        for i, (ts, row) in enumerate(history.iterrows(), start=1):
+            stats.update(ts, row["Delta_OC"], row["Delta_HL"], row["Close"])
+            if i in (3, 30, 120, 251, 252, 253, 300, len(history)):
+                window = history.iloc[:i]
+                self.assert_dicts_close(stats.stats_52week(), compute_52week_stats(window.tail(STATS_WINDOW)))
+                self.assert_dicts_close(stats.trend_indicators(), compute_trend_indicators(window))
+
+    def test_same_day_bar_is_replaced_not_appended(self):
+        history = make_history(40)
+        stats = RollingStats()
+        stats.update_from_history(history.iloc[:-1])
+
+        partial = history.iloc[-1:].copy()
+        partial["Close"] = partial["Close"] * 0.5
+        self.assertEqual(stats.update_from_history(partial), 1)
+        self.assertEqual(stats.update_from_history(history), 0)  # only today's bar, revised
+        self.assertEqual(len(stats.bars), 40)
+        self.assert_dicts_close(stats.trend_indicators(), compute_trend_indicators(history))
+
+    def test_state_persists_between_runs(self):
+        history = make_history(260)
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch.object(db_utils, "DB_PATH", os.path.join(tmpdir, "agentic.db")), \
+                patch.object(rolling_stats, "_registry", {}):
+            self.addCleanup(db_utils.close_connections)
+            rolling_stats.update_rolling_context("AAPL", history.iloc[:-1])
+            rolling_stats._registry.clear()  # simulate a restart
+
+            stats = rolling_stats.load_rolling_stats("AAPL")
+            self.assertEqual(stats.last_timestamp, history.index[-2])
+            stats_52w, trend = rolling_stats.update_rolling_context("AAPL", history)
+            self.assert_dicts_close(stats_52w, compute_52week_stats(history.tail(STATS_WINDOW)))
+            self.assert_dicts_close(trend, compute_trend_indicators(history))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
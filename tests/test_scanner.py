@@ -0,0 +1,109 @@
+"""
+Unit tests for the scan runner, using local frames instead of network fetches.
+"""
+
+import contextlib
+import io
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+import pandas as pd
+from agents.price_agent import evaluate_prices_batch
+from orchestrator.scanner import Scan
+from utils.bar_store import BarStore
+from utils.cache import TTLCache
+from helpers import SharedStateYfinance, make_frames
+
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.frames = make_frames(n_tickers=12, n_days=40, seed=3)
+
+    def fetch(self, chunk):
+        return {t: self.frames.get(t) for t in chunk}
+
+    def run_scan(self, **kwargs):
+        streamed = []
+        scan = Scan(list(self.frames) + ["ZZZZ"], chunk_size=4, fetch=self.fetch,
+                    on_result=streamed.append, **kwargs)
+        with contextlib.redirect_stdout(io.StringIO()):
+            scan.run()
+        return scan, {r["ticker"]: r for r in streamed}
+
+    def test_results_match_batch_evaluation(self):
+        scan, streamed = self.run_scan(compute_workers=0)
+        expected = {r["ticker"]: r for r in evaluate_prices_batch(self.fetch(list(self.frames) + ["ZZZZ"]))}
+
+        self.assertEqual(scan.status, "done")
+        self.assertEqual(scan.progress()["completed"], 13)
+        self.assertEqual(set(streamed), set(expected))
+        for ticker, result in expected.items():
+            self.assertEqual(streamed[ticker]["alert"], result["alert"])
+            self.assertEqual(streamed[ticker]["metrics"], result["metrics"])
+        self.assertIsNone(streamed["ZZZZ"]["stats_52w"])
+        self.assertIsNotNone(streamed["T0"]["stats_52w"]["mean_delta_oc"])
+        self.assertEqual(len(scan.alerts), sum(r["alert"] for r in expected.values()))
+
+    def test_process_pool_gives_same_results(self):
+        _, inline = self.run_scan(compute_workers=0)
+        _, pooled = self.run_scan(compute_workers=2)
+        for results in (inline, pooled):
+            for result in results.values():
+                del result["timestamp"]
+        self.assertEqual(pooled, inline)
+
+    def test_compute_errors_count_the_chunk_as_failed(self):
+        broken = pd.DataFrame({"Price": [1.0, 2.0]}, index=pd.date_range("2024-01-02", periods=2))
+
+        def fetch(chunk):
+            return {t: broken if chunk[0] == "T4" else self.frames.get(t) for t in chunk}
+
+        for workers in (0, 2):
+            with self.subTest(compute_workers=workers), self.assertLogs("orchestrator.scanner", level="ERROR"):
+                scan = Scan(list(self.frames), chunk_size=4, compute_workers=workers, fetch=fetch).run()
+                progress = scan.progress()
+                self.assertEqual((progress["completed"], progress["failed"]), (8, 4))
+
+    def test_parallel_chunks_keep_their_own_yfinance_results(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        frames = make_frames(n_tickers=24, n_days=40, seed=3)
+        yf = SharedStateYfinance(frames)
+        with patch("agents.price_agent.yf", yf), \
+                patch("agents.price_agent.get_limiter", return_value=Mock()), \
+                patch("agents.price_agent.market_cache", TTLCache(ttl=60)), \
+                patch("agents.price_agent.bar_store", BarStore(tmpdir.name)), \
+                patch("agents.price_agent._fetch_fallback", return_value=None) as fallback:
+            streamed = []
+            scan = Scan(list(frames), chunk_size=2, fetch_workers=8, compute_workers=0,
+                        on_result=streamed.append).run()
+
+        fallback.assert_not_called()
+        self.assertEqual(scan.progress()["completed"], 24)
+        expected = {r["ticker"]: r["metrics"] for r in evaluate_prices_batch(frames)}
+        self.assertEqual({r["ticker"]: r["metrics"] for r in streamed}, expected)
+
+    def test_cancel_stops_pending_chunks(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking_fetch(chunk):
+            if chunk[0] != "T0":
+                started.set()
+                release.wait(5)
+            return self.fetch(chunk)
+
+        scan = Scan(list(self.frames), chunk_size=2, fetch_workers=1, compute_workers=0, fetch=blocking_fetch)
+        with contextlib.redirect_stdout(io.StringIO()):
+            scan.start()
+            self.assertTrue(started.wait(5))
+            scan.cancel()
+            release.set()
+            self.assertTrue(scan.wait(5))
+
+        progress = scan.progress()
+        self.assertEqual(progress["status"], "cancelled")
+        self.assertLess(progress["fetched"], progress["total"])
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,76 @@
+"""
+Unit tests for the logging, stage timer and metrics layer.
+"""
+
+import io
+import json
+import logging
+import unittest
+from unittest.mock import patch
+from utils import telemetry
+from utils.telemetry import Metrics, JsonFormatter
+
+class TestMetrics(unittest.TestCase):
+    def test_render_prometheus_text(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.inc("market_cache_hits_total", source="yfinance")
+        metrics.inc("market_cache_hits_total", 2, source="yfinance")
+        metrics.observe("stage_duration_seconds", 0.5, stage="fetch")
+
+        text = metrics.render()
+        self.assertIn("# TYPE agentic_market_cache_hits_total counter", text)
+        self.assertIn('agentic_market_cache_hits_total{source="yfinance"} 3', text)
+        self.assertIn('agentic_stage_duration_seconds_bucket{stage="fetch",le="0.1"} 0', text)
+        self.assertIn('agentic_stage_duration_seconds_bucket{stage="fetch",le="1.0"} 1', text)
+        self.assertIn('agentic_stage_duration_seconds_bucket{stage="fetch",le="+Inf"} 1', text)
+        self.assertIn('agentic_stage_duration_seconds_count{stage="fetch"} 1', text)
+
+class TestStages(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(telemetry, "metrics", Metrics())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(telemetry.set_enabled, telemetry.METRICS_ENABLED)
+
+    def test_stage_records_histogram_and_request_timings(self):
+        telemetry.set_enabled(True)
+        token, timings = telemetry.begin_request()
+        with telemetry.stage("fetch"):
+            pass
+        telemetry.timed("compute")(lambda: None)()
+        telemetry.end_request(token)
+
+        self.assertEqual(list(timings), ["fetch", "compute"])
+        self.assertEqual(telemetry.metrics.histogram("stage_duration_seconds", stage="fetch")["count"], 1)
+        header = telemetry.server_timing(timings, total=0.0123)
+        self.assertRegex(header, r"^fetch;dur=\d+\.\d, compute;dur=\d+\.\d, total;dur=12\.3$")
+
+    def test_disabled_layer_records_nothing(self):
+        telemetry.set_enabled(False)
+        token, timings = telemetry.begin_request()
+        with telemetry.stage("fetch"):
+            pass
+        telemetry.count("fallbacks_total", source="finnhub")
+        self.assertEqual(telemetry.timed("compute")(lambda: 42)(), 42)
+        telemetry.end_request(token)
+
+        self.assertEqual(timings, {})
+        self.assertEqual(telemetry.metrics.render(), "\n")
+
+class TestJsonFormatter(unittest.TestCase):
+    def test_extra_fields_are_included(self):
+        logger = logging.getLogger("test.telemetry")
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        logger.warning("Rate limited for %s", "finnhub", extra={"provider": "finnhub"})
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry["message"], "Rate limited for finnhub")
+        self.assertEqual(entry["level"], "WARNING")
+        self.assertEqual(entry["provider"], "finnhub")
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
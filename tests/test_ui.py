@@ -0,0 +1,122 @@
+"""
+Tests for the Streamlit app: chart data helpers, and a headless run checking
+that threshold changes reuse the cached prices and the dashboard reads stored bars.
+"""
+
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import requests
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from agents.price_agent import check_alert_enriched
+from ui.charts import prepare_alerts, alert_reasons, downsample, dashboard_rows, normalized_closes
+from utils import bar_store as bar_store_module
+from utils.bar_store import BarStore
+
+
+def make_bars(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.5, n),
+        "High": close + 2 + rng.random(n),
+        "Low": close - 2 - rng.random(n),
+        "Close": close,
+        "Volume": np.full(n, 1000.0),
+    }, index=pd.date_range("2023-01-02", periods=n))
+
+
+class TestCharts(unittest.TestCase):
+    def test_alert_reasons_match_check_alert_enriched_on_every_bar(self):
+        data = make_bars(200)
+        prepared = prepare_alerts(data)
+        for params in [(2, 4.5, 3, 2), (5, 7, 5, 1)]:
+            reasons = alert_reasons(prepared, *params)
+            self.assertEqual(len(reasons), len(data))
+            for end in range(2, len(data) + 1, 13):
+                self.assertEqual(reasons[end - 1] != "", check_alert_enriched(data.iloc[:end], *params), end)
+        self.assertEqual(len(alert_reasons(prepare_alerts(data.iloc[:0]))), 0)
+
+    def test_downsample_keeps_extremes_and_endpoints(self):
+        data = make_bars(10000)
+        data.iloc[4321, data.columns.get_loc("Close")] = 1000.0  # one-bar spike
+        small = downsample(data, max_points=500)
+        self.assertLessEqual(len(small), 500)
+        self.assertEqual(small.index[0], data.index[0])
+        self.assertEqual(small.index[-1], data.index[-1])
+        self.assertEqual(small["Close"].max(), 1000.0)
+        self.assertEqual(small["Close"].min(), data["Close"].min())
+        self.assertTrue(small.index.is_monotonic_increasing)
+        self.assertEqual(len(downsample(data.iloc[:100], max_points=500)), 100)
+
+    def test_dashboard_rows_and_rebased_closes(self):
+        frames = {"AAPL": make_bars(300, seed=1), "MSFT": make_bars(50, seed=2), "EMPTY": make_bars(0)}
+        rows = dashboard_rows(frames, static_oc=5, static_hl=4.5, dynamic_window=3, std_multiplier=2)
+        self.assertEqual(list(rows.index), ["AAPL", "MSFT"])
+        self.assertEqual(rows.loc["MSFT", "bars"], 50)
+        self.assertEqual(bool(rows.loc["AAPL", "alert"]),
+                         check_alert_enriched(frames["AAPL"], static_oc=5, static_hl=4.5, dynamic_window=3))
+        series = normalized_closes(frames, max_points=100)
+        self.assertEqual(set(series), {"AAPL", "MSFT"})
+        self.assertEqual(series["AAPL"].iloc[0], 100.0)
+        self.assertLessEqual(len(series["AAPL"]), 100)
+
+
+class TestApp(unittest.TestCase):
+    def setUp(self):
+        st.cache_data.clear()
+        self.addCleanup(st.cache_data.clear)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.store = BarStore(tmpdir.name)
+        self.bars = make_bars()
+        self.fetches = []
+        self.intervals = []
+
+        def fetch(ticker, period="1y", interval="1d"):
+            self.fetches.append((ticker, period))
+            self.intervals.append(interval)
+            return self.bars.copy()
+
+        for p in (patch("agents.price_agent.fetch_price_with_fallback", fetch),
+                  patch.object(bar_store_module, "bar_store", self.store),
+                  patch.object(requests, "get", side_effect=requests.ConnectionError("offline"))):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_threshold_changes_do_not_refetch(self):
+        at = AppTest.from_file("../ui/app.py", default_timeout=30).run()
+        self.assertFalse(at.exception)
+        self.assertEqual(self.fetches, [])
+
+        at.button[0].click().run()
+        self.assertEqual(self.fetches, [("AAPL", "1y")])
+        at.sidebar.slider[1].set_value(20).run()
+        at.sidebar.slider[0].set_value(20).run()
+        self.assertFalse(at.exception)
+        self.assertEqual(self.fetches, [("AAPL", "1y")])  # same series, re-evaluated locally
+        self.assertEqual(len(at.success), 1)
+
+    def test_interval_selection_loads_intraday_bars(self):
+        at = AppTest.from_file("../ui/app.py", default_timeout=30).run()
+        at.sidebar.selectbox[1].set_value("5m").run()
+        at.button[0].click().run()
+        self.assertFalse(at.exception)
+        self.assertEqual(self.intervals, ["5m"])
+
+    def test_dashboard_reads_the_bar_store(self):
+        self.store.merge("AAPL", "1d", self.bars)
+        self.store.merge("MSFT", "1d", make_bars(seed=3))
+        at = AppTest.from_file("../ui/app.py", default_timeout=30).run()
+        self.assertFalse(at.exception)
+        self.assertEqual(list(at.dataframe[0].value.index), ["AAPL", "MSFT"])
+        self.assertEqual(self.fetches, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
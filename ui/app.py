@@ -2,46 +2,132 @@ import sys
 import os
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from agents.price_agent import fetch_price_with_fallback, compute_deltas, check_alert_enriched
+from utils.config import getenv
+from utils.lazy import lazy_import
+from utils.cache import MARKET_CACHE_TTL
+from ui.charts import prepare_alerts, alert_reasons, downsample, dashboard_rows, normalized_closes, CHART_MAX_POINTS
+
+# Heavy modules load on first use, so the page (and every rerun) renders before they are needed
+requests = lazy_import("requests")
+go = lazy_import("plotly.graph_objects")
+
+ORCHESTRATOR_URL = getenv("ORCHESTRATOR_URL", "http://localhost:8000")
+DASHBOARD_INTERVAL = "1d"
+DASHBOARD_DEFAULT_TICKERS = 12
+INTERVALS = ["1d", "1h", "15m", "5m", "1m"]
+
+# Cached per (ticker, period, interval): reruns (every slider move) never refetch
+@st.cache_data(ttl=MARKET_CACHE_TTL, show_spinner="Fetching prices...")
+def load_prices(ticker: str, period: str, interval: str = "1d") -> pd.DataFrame:
+    from agents.price_agent import fetch_price_with_fallback, compute_deltas
+    data = fetch_price_with_fallback(ticker, period=period, interval=interval)
+    if data is None or data.empty:
+        return None
+    # Ensure index is datetime
+    if not pd.api.types.is_datetime64_any_dtype(data.index):
+        data = data.copy()
+        if len(data) == 1:
+            data.index = [datetime.now()]
+        else:
+            data.index = pd.to_datetime(data.index, errors='coerce').fillna(datetime.now())
+    return compute_deltas(data)
+
+@st.cache_data(ttl=MARKET_CACHE_TTL, show_spinner=False)
+def load_alert_arrays(ticker: str, period: str, interval: str = "1d") -> dict:
+    return prepare_alerts(load_prices(ticker, period, interval))
+
+@st.cache_data(ttl=MARKET_CACHE_TTL, show_spinner=False)
+def price_figure(ticker: str, period: str, interval: str = "1d", max_points: int = CHART_MAX_POINTS):
+    """
+    Close price chart of the (downsampled) series; alert markers are added per rerun.
+    """
+    data = downsample(load_prices(ticker, period, interval), max_points)
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=data.index,
+        y=data['Close'],
+        mode='lines+markers' if len(data) <= 250 else 'lines',
+        name='Close Price'
+    ))
+    fig.update_layout(
+        title=f"{ticker} Closing Prices ({interval} bars)",
+        xaxis_title="Date",
+        yaxis_title="Price (USD)",
+        xaxis=dict(
+            tickformat="%Y-%m-%d %H:%M",
+            tickangle=-45
+        ),
+        template="simple_white",
+        margin=dict(l=40, r=40, t=40, b=80)
+    )
+    return fig
+
+# Dashboard data: bars the orchestrator already stored, never a provider call
+@st.cache_data(ttl=60, show_spinner=False)
+def stored_tickers(interval: str) -> list:
+    from utils.bar_store import bar_store
+    return bar_store.tickers(interval)
+
+@st.cache_data(ttl=60, show_spinner="Reading stored bars...")
+def stored_bars(tickers: tuple, interval: str, period: str) -> dict:
+    from utils.bar_store import bar_store
+    return {t: bar_store.read_period(t, interval, period) for t in tickers}
+
+@st.cache_data(ttl=30, show_spinner=False)
+def logged_alerts(limit: int = 20):
+    try:
+        response = requests.get(f"{ORCHESTRATOR_URL}/price_logs", params={"alert": 1, "limit": limit}, timeout=2)
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError):
+        return None
 
 # App title
 st.title("Agentic Finance — Price Monitoring")
 
 # Sidebar inputs
 st.sidebar.header("Settings")
-ticker = st.sidebar.text_input("Stock Ticker", value="AAPL")
+ticker = st.sidebar.text_input("Stock Ticker", value="AAPL").strip().upper()
+# Bars are read from the local bar store; changing the range does not re-download history
+period = st.sidebar.selectbox("History", ["1mo", "3mo", "6mo", "1y", "2y", "5y"], index=3)
+# Intraday history is capped to what the provider serves (7 days of 1m, 60 days of 5m/15m)
+interval = st.sidebar.selectbox("Bar interval", INTERVALS, index=0)
 static_oc = st.sidebar.slider("Static Open-Close threshold (%)", min_value=1, max_value=20, value=5)
 static_hl = st.sidebar.slider("Static High-Low threshold (%)", min_value=1, max_value=20, value=7)
 dynamic_window = st.sidebar.slider("Dynamic window (periods)", min_value=2, max_value=10, value=3)
 std_multiplier = st.sidebar.slider("Std deviation multiplier", min_value=1, max_value=5, value=2)
+thresholds = dict(static_oc=static_oc, static_hl=static_hl, dynamic_window=dynamic_window, std_multiplier=std_multiplier)
 
-# Fetch + check button
-if st.button("Fetch Data & Check Alert"):
-    data = fetch_price_with_fallback(ticker)
+single, dashboard = st.tabs(["Ticker", "Dashboard"])
 
-    if data is None or data.empty:
+with single:
+    # Fetch + check button; the loaded series stays on screen while the thresholds move
+    fetch, refresh = st.columns([3, 1])
+    if fetch.button("Fetch Data & Check Alert"):
+        st.session_state["loaded"] = (ticker, period, interval)
+    if refresh.button("Refresh data"):
+        load_prices.clear()
+        load_alert_arrays.clear()
+        price_figure.clear()
+        st.session_state["loaded"] = (ticker, period, interval)
+
+    loaded = st.session_state.get("loaded")
+    data = load_prices(*loaded) if loaded else None
+
+    if loaded and (data is None or data.empty):
         st.error("No data fetched for this ticker.")
-    else:
-        # Ensure index is datetime
-        if not pd.api.types.is_datetime64_any_dtype(data.index):
-            if len(data) == 1:
-                data = data.copy()
-                data.index = [datetime.now()]
-            else:
-                data.index = pd.to_datetime(data.index, errors='coerce').fillna(datetime.now())
-
-        data = compute_deltas(data)
-        alert = check_alert_enriched(
-            data,
-            static_oc=static_oc,
-            static_hl=static_hl,
-            dynamic_window=dynamic_window,
-            std_multiplier=std_multiplier
-        )
+    elif loaded:
+        loaded_ticker, loaded_period, loaded_interval = loaded
+        if loaded != (ticker, period, interval):
+            st.caption(f"Showing {loaded_ticker} ({loaded_period}, {loaded_interval}). "
+                       f"Press the button to load {ticker} ({period}, {interval}).")
+
+        # Thresholds only re-run the vectorized check on the cached deltas
+        reasons = alert_reasons(load_alert_arrays(*loaded), **thresholds)
+        alert = bool(len(reasons)) and reasons[-1] != ""
 
         # Latest deltas display
         if 'Delta_OC' in data.columns and 'Delta_HL' in data.columns:
@@ -67,21 +153,24 @@ if st.button("Fetch Data & Check Alert"):
             st.warning("Delta data unavailable. Check if price data was valid.")
 
         if alert:
-            st.error("🚨 ALERT: Movement exceeded thresholds!")
+            st.error(f"🚨 ALERT: Movement exceeded thresholds! ({reasons[-1]})")
         else:
             st.success("✅ No alert triggered.")
 
-        # Plot
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=data.index,
-            y=data['Close'],
-            mode='lines+markers',
-            name='Close Price'
-        ))
-
+        # Plot: cached price trace plus this rerun's alert markers
+        fig = go.Figure(price_figure(*loaded))
+        flagged = data[reasons != ""]
+        if len(flagged):
+            fig.add_trace(go.Scattergl(
+                x=flagged.index,
+                y=flagged['Close'],
+                mode='markers',
+                marker=dict(size=8, color='orange'),
+                text=reasons[reasons != ""],
+                name='Alerts (history)'
+            ))
         if alert:
-            fig.add_trace(go.Scatter(
+            fig.add_trace(go.Scattergl(
                 x=[data.index[-1]],
                 y=[data['Close'].iloc[-1]],
                 mode='markers',
@@ -89,16 +178,50 @@ if st.button("Fetch Data & Check Alert"):
                 name='Alert Triggered'
             ))
 
-        fig.update_layout(
-            title=f"{ticker} Closing Prices",
-            xaxis_title="Date",
-            yaxis_title="Price (USD)",
-            xaxis=dict(
-                tickformat="%Y-%m-%d %H:%M",
-                tickangle=-45
-            ),
-            template="simple_white",
-            margin=dict(l=40, r=40, t=40, b=80)
-        )
-
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig, width="stretch")
+        st.caption(f"{len(flagged)} of {len(data)} bars would have alerted with these thresholds.")
+
+with dashboard:
+    st.subheader("Stored tickers")
+    available = stored_tickers(DASHBOARD_INTERVAL)
+    if not available:
+        st.caption("No stored bars yet. Price requests to the orchestrator fill the bar store.")
+    else:
+        selected = st.multiselect("Tickers", available, default=available[:DASHBOARD_DEFAULT_TICKERS])
+        frames = stored_bars(tuple(selected), DASHBOARD_INTERVAL, period)
+        rows = dashboard_rows(frames, **thresholds)
+        st.dataframe(rows, width="stretch")
+
+        series = normalized_closes(frames, max_points=CHART_MAX_POINTS // 2)
+        if series:
+            fig = go.Figure()
+            for name, closes in series.items():
+                fig.add_trace(go.Scattergl(x=closes.index, y=closes, mode='lines', name=name))
+            fig.update_layout(title=f"Close, rebased to 100 ({period})", template="simple_white",
+                              margin=dict(l=40, r=40, t=40, b=40))
+            st.plotly_chart(fig, width="stretch")
+
+    st.subheader("Logged alerts")
+    alerts = logged_alerts()
+    if alerts is None:
+        st.caption("Orchestrator not reachable.")
+    elif not alerts:
+        st.caption("No logged alerts yet.")
+    else:
+        st.dataframe(pd.DataFrame(alerts), width="stretch")
+
+# Live alerts from the orchestrator's price monitor (refreshed without rerunning the page)
+@st.fragment(run_every=5)
+def live_alerts():
+    st.subheader("Live monitor alerts")
+    try:
+        alerts = requests.get(f"{ORCHESTRATOR_URL}/alerts/recent", timeout=2).json()
+    except (requests.RequestException, ValueError):
+        st.caption("Orchestrator not reachable. Start it with MONITOR_WATCHLIST set to stream alerts.")
+        return
+    if not alerts:
+        st.caption("No monitor alerts yet.")
+        return
+    st.dataframe(pd.DataFrame(alerts), width="stretch")
+
+live_alerts()
@@ -0,0 +1,104 @@
+"""
+charts.py
+
+Data preparation for the Streamlit app, free of Streamlit calls so it can be
+cached and tested on its own.
+
+Deltas are computed once per loaded series (prepare_alerts); moving a
+threshold slider only re-runs the vectorized alert check on those arrays
+(alert_reasons). Long histories are downsampled before plotting, keeping each
+bucket's low and high so spikes survive. The dashboard reads the bars the
+orchestrator keeps in the local bar store and never calls a provider.
+"""
+
+import numpy as np
+import pandas as pd
+
+from agents.alert_engine import (build_panel, compact_panel, compact_deltas, latest_alerts, reason_index,
+                                 REASON_NONE, REASON_STATIC_OC, REASON_STATIC_HL, REASON_DYNAMIC_OC, REASON_DYNAMIC_HL)
+
+CHART_MAX_POINTS = 1500  # points per trace sent to the browser
+
+_REASONS = np.array([REASON_NONE, REASON_STATIC_OC, REASON_STATIC_HL, REASON_DYNAMIC_OC, REASON_DYNAMIC_HL],
+                    dtype=object)
+
+
+def prepare_alerts(data: pd.DataFrame) -> dict:
+    """
+    Threshold-independent arrays of one ticker's bars for alert_reasons.
+    """
+    panel = build_panel({"_": data})
+    if panel.empty:
+        return {"order": np.empty((0, 1), dtype=np.intp), "delta_oc": np.empty((0, 1)),
+                "delta_hl": np.empty((0, 1)), "position": np.empty((0, 1), dtype=np.intp)}
+    order, _, compact, position = compact_panel(panel)
+    delta_oc, delta_hl = compact_deltas(compact)
+    return {"order": order, "delta_oc": delta_oc, "delta_hl": delta_hl, "position": position}
+
+
+def alert_reasons(prepared: dict, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0) -> np.ndarray:
+    """
+    Reason code per bar ("" when no alert), with check_alert_enriched semantics on every bar.
+    """
+    if len(prepared["order"]) == 0:
+        return np.empty(0, dtype=object)
+    reasons = reason_index(prepared["delta_oc"], prepared["delta_hl"], prepared["position"],
+                           static_oc, static_hl, dynamic_window, std_multiplier)
+    restored = np.empty_like(reasons)
+    np.put_along_axis(restored, prepared["order"], reasons, axis=0)
+    return _REASONS[restored[:, 0]]
+
+
+def downsample(data: pd.DataFrame, max_points: int = CHART_MAX_POINTS, column: str = "Close") -> pd.DataFrame:
+    """
+    At most about max_points rows of data for plotting: the first and last rows
+    plus the lowest and highest value of column in each of max_points / 2 buckets.
+    """
+    n = len(data)
+    if n <= max_points:
+        return data
+    values = data[column].to_numpy(dtype=np.float64)
+    buckets = max(1, (max_points - 2) // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.intp)
+    bucket_of = np.repeat(np.arange(buckets), np.diff(edges))
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    # Rows sorted by bucket, then value: each bucket's first row is its low, its last row its high
+    keep[np.lexsort((np.where(np.isnan(values), np.inf, values), bucket_of))[edges[:-1]]] = True
+    keep[np.lexsort((np.where(np.isnan(values), -np.inf, values), bucket_of))[edges[1:] - 1]] = True
+    return data[keep]
+
+
+def dashboard_rows(frames: dict, static_oc=5.0, static_hl=7.0, dynamic_window=3, std_multiplier=2.0) -> pd.DataFrame:
+    """
+    One row per ticker with stored bars: last bar, close, change over the loaded
+    period and the alert status of the last bar under the given thresholds.
+    """
+    frames = {t: f for t, f in frames.items() if f is not None and not f.empty}
+    columns = ["last_bar", "close", "change_pct", "delta_oc", "delta_hl", "alert", "reason", "bars"]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    latest = latest_alerts(build_panel(frames), static_oc, static_hl, dynamic_window, std_multiplier)
+    summary = pd.DataFrame({
+        "last_bar": {t: f.index[-1] for t, f in frames.items()},
+        "close": {t: float(f["Close"].iloc[-1]) for t, f in frames.items()},
+        "change_pct": {t: (float(f["Close"].iloc[-1]) / float(f["Close"].iloc[0]) - 1) * 100
+                       for t, f in frames.items()},
+        "bars": {t: len(f) for t, f in frames.items()},
+    })
+    return summary.join(latest)[columns].round({"close": 2, "change_pct": 2, "delta_oc": 2, "delta_hl": 2})
+
+
+def normalized_closes(frames: dict, max_points: int = CHART_MAX_POINTS) -> dict:
+    """
+    Downsampled close series rebased to 100 at the first bar, per ticker, for comparing tickers.
+    """
+    series = {}
+    for ticker, frame in frames.items():
+        if frame is None or frame.empty:
+            continue
+        close = frame["Close"]
+        rebased = (close / close.iloc[0] * 100).to_frame("Close")
+        series[ticker] = downsample(rebased, max_points)["Close"]
+    return series
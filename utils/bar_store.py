@@ -0,0 +1,247 @@
+"""
+bar_store.py
+
+Local columnar store of OHLCV bars, one append-only binary file per
+(interval, ticker) holding a NumPy structured array sorted by timestamp.
+Range reads memory-map the file and binary-search the timestamp column, so
+reading a window never parses or loads the rest of the history.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+
+import numpy as np
+
+from utils.config import getenv
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+BAR_STORE_PATH = getenv("BAR_STORE_PATH", os.path.join("db", "bars"))
+
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"),  # bar start, UTC nanoseconds
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+COLUMNS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+INTRADAY_INTERVALS = {"1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h"}
+
+_PERIOD_UNITS = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+
+
+def period_start(period: str, end) -> pd.Timestamp:
+    """
+    First timestamp covered by a yfinance-style period ("5d", "1mo", "1y", "ytd")
+    ending at end. Returns None for "max".
+    """
+    end = pd.Timestamp(end)
+    if period == "max":
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=end.year, month=1, day=1)
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if match is None:
+        raise ValueError(f"Unsupported period: {period!r}")
+    return end - pd.DateOffset(**{_PERIOD_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def _to_utc_naive(index) -> pd.DatetimeIndex:
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return index.as_unit("ns")
+
+
+def frame_to_bars(frame: pd.DataFrame) -> np.ndarray:
+    """
+    Convert an OHLC(V) frame with a datetime index into sorted, de-duplicated bar records.
+    Rows without a complete OHLC are dropped; a missing Volume column is stored as NaN.
+    """
+    if frame is None or frame.empty:
+        return np.empty(0, dtype=BAR_DTYPE)
+    frame = frame.dropna(subset=["Open", "High", "Low", "Close"])
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    bars["ts"] = _to_utc_naive(frame.index).asi8
+    for field, column in COLUMNS.items():
+        bars[field] = frame[column].to_numpy(dtype="f8") if column in frame.columns else np.nan
+    bars = bars[np.argsort(bars["ts"], kind="stable")]
+    # Keep the last occurrence of a duplicated timestamp (latest revision)
+    keep = np.append(bars["ts"][1:] != bars["ts"][:-1], True) if len(bars) else np.ones(0, dtype=bool)
+    return bars[keep]
+
+
+def bars_to_frame(bars: np.ndarray, interval: str = "1d") -> pd.DataFrame:
+    """
+    Bar records as the OHLC(V) frame the fetchers return. Fields no source ever
+    provided (all NaN, e.g. volume from quote candles) are left out.
+    """
+    index = pd.DatetimeIndex(bars["ts"].astype("datetime64[ns]"),
+                             name="Datetime" if interval in INTRADAY_INTERVALS else "Date")
+    frame = pd.DataFrame({column: np.array(bars[field]) for field, column in COLUMNS.items()}, index=index)
+    return frame.dropna(axis=1, how="all")
+
+
+class BarStore:
+    """
+    Append-only per-ticker bar files under root/<interval>/<TICKER>.bin.
+
+    append() only writes bars newer than the last stored one (a bar with the
+    same timestamp replaces it, e.g. today's still-open session). merge()
+    rewrites the file and is used for backfills that extend history backwards.
+    A backfill marker (<TICKER>.from) records how far back a full download
+    reached, so a ticker listed after that point is not backfilled again.
+    """
+
+    def __init__(self, root: str = BAR_STORE_PATH):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, ticker: str, interval: str) -> str:
+        return os.path.join(self.root, interval, f"{ticker.upper()}.bin")
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _map(self, path: str) -> np.ndarray:
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        count = size // BAR_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.memmap(path, dtype=BAR_DTYPE, mode="r", shape=(count,))
+
+    def _record(self, path: str, position: int) -> np.ndarray:
+        with open(path, "rb") as f:
+            f.seek(position * BAR_DTYPE.itemsize, os.SEEK_SET if position >= 0 else os.SEEK_END)
+            return np.frombuffer(f.read(BAR_DTYPE.itemsize), dtype=BAR_DTYPE)
+
+    def count(self, ticker: str, interval: str = "1d") -> int:
+        path = self._path(ticker, interval)
+        return os.path.getsize(path) // BAR_DTYPE.itemsize if os.path.exists(path) else 0
+
+    def bounds(self, ticker: str, interval: str = "1d"):
+        """
+        (first, last) stored bar timestamps, or (None, None) when nothing is stored.
+        Reads two records, not the file.
+        """
+        path = self._path(ticker, interval)
+        if self.count(ticker, interval) == 0:
+            return None, None
+        first, last = self._record(path, 0), self._record(path, -1)
+        return pd.Timestamp(int(first["ts"][0])), pd.Timestamp(int(last["ts"][0]))
+
+    def append(self, ticker: str, interval: str, frame: pd.DataFrame) -> int:
+        """
+        Append the bars of frame newer than the last stored bar. Returns the number appended.
+        """
+        bars = frame_to_bars(frame)
+        if len(bars) == 0:
+            return 0
+        path = self._path(ticker, interval)
+        with self._lock(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.count(ticker, interval):
+                last_ts = int(self._record(path, -1)["ts"][0])
+                bars = bars[bars["ts"] >= last_ts]
+                if len(bars) and bars["ts"][0] == last_ts:
+                    with open(path, "r+b") as f:
+                        f.seek(-BAR_DTYPE.itemsize, os.SEEK_END)
+                        f.write(bars[:1].tobytes())
+                    bars = bars[1:]
+            with open(path, "ab") as f:
+                f.write(bars.tobytes())
+        return len(bars)
+
+    def merge(self, ticker: str, interval: str, frame: pd.DataFrame) -> int:
+        """
+        Merge bars from any point in time (backfill). Incoming bars win on equal
+        timestamps. Rewrites the file atomically; returns the new bar count.
+        """
+        incoming = frame_to_bars(frame)
+        path = self._path(ticker, interval)
+        with self._lock(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            stored = np.array(self._map(path))
+            stored = stored[~np.isin(stored["ts"], incoming["ts"])]
+            bars = np.concatenate([stored, incoming])
+            bars = bars[np.argsort(bars["ts"], kind="stable")]
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(bars.tobytes())
+            os.replace(tmp, path)
+        return len(bars)
+
+    def mark_backfilled(self, ticker: str, interval: str, start):
+        """
+        Record that every bar since start was downloaded, even if the first stored bar is later.
+        """
+        start = int(_to_utc_naive([start]).asi8[0])
+        path = self._path(ticker, interval)[:-len(".bin")] + ".from"
+        with self._lock(path):
+            current = self.backfilled_from(ticker, interval)
+            if current is not None and current.value <= start:
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(str(start))
+
+    def backfilled_from(self, ticker: str, interval: str = "1d"):
+        """
+        Earliest start passed to mark_backfilled, or None.
+        """
+        path = self._path(ticker, interval)[:-len(".bin")] + ".from"
+        try:
+            with open(path) as f:
+                return pd.Timestamp(int(f.read()))
+        except (OSError, ValueError):
+            return None
+
+    def read_records(self, ticker: str, interval: str = "1d", start=None, end=None) -> np.ndarray:
+        """
+        Bar records with start <= timestamp <= end (both optional), copied out of the memory map.
+        """
+        bars = self._map(self._path(ticker, interval))
+        ts = bars["ts"]
+        lo = 0 if start is None else int(np.searchsorted(ts, _to_utc_naive([start]).asi8[0], side="left"))
+        hi = len(bars) if end is None else int(np.searchsorted(ts, _to_utc_naive([end]).asi8[0], side="right"))
+        return np.array(bars[lo:hi])
+
+    def read(self, ticker: str, interval: str = "1d", start=None, end=None) -> pd.DataFrame:
+        """
+        Bars with start <= timestamp <= end (both optional) as an OHLC(V) frame.
+        """
+        return bars_to_frame(self.read_records(ticker, interval, start, end), interval)
+
+    def read_period(self, ticker: str, interval: str = "1d", period: str = "1y") -> pd.DataFrame:
+        """
+        The last period of stored bars, counted back from the latest stored bar.
+        """
+        _, last = self.bounds(ticker, interval)
+        if last is None:
+            return bars_to_frame(np.empty(0, dtype=BAR_DTYPE), interval)
+        return self.read(ticker, interval, start=period_start(period, last))
+
+    def intervals(self, ticker: str) -> list:
+        """
+        Intervals with stored bars for ticker.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(i for i in os.listdir(self.root) if self.count(ticker, i))
+
+    def tickers(self, interval: str = "1d") -> list:
+        directory = os.path.join(self.root, interval)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-4] for name in os.listdir(directory) if name.endswith(".bin"))
+
+
+bar_store = BarStore()
@@ -0,0 +1,200 @@
+"""
+bars.py
+
+Compact in-memory OHLCV bars for intraday work.
+
+A Bars object holds one ticker's series as flat arrays: int64 bar starts
+(UTC nanoseconds) and float32 open/high/low/close/volume, 28 bytes a bar
+instead of the ~48 of a float64 frame and its index. Weeks of minute bars
+for hundreds of symbols fit in memory this way. Higher timeframes are not
+downloaded or stored separately: they are resampled from the finer bars on
+demand (first open, highest high, lowest low, last close, summed volume).
+
+float32 keeps about 7 significant digits: exact for cents below ~100k and
+for volumes below ~16.7M a bar. Frames handed to the alert logic are
+converted back to float64.
+"""
+
+from __future__ import annotations
+
+import re
+
+import numpy as np
+
+from utils.bar_store import BAR_DTYPE, COLUMNS, INTRADAY_INTERVALS, frame_to_bars, period_start, _to_utc_naive
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+MINUTE_NS = 60 * 10**9
+DAY_NS = 24 * 60 * MINUTE_NS
+WEEK_NS = 7 * DAY_NS
+_MONDAY_OFFSET_NS = 4 * DAY_NS  # 1970-01-05, the first Monday after the epoch
+
+_INTERVAL_UNITS = {"m": MINUTE_NS, "h": 60 * MINUTE_NS, "d": DAY_NS, "wk": WEEK_NS}
+FIELDS = tuple(COLUMNS)
+
+
+def interval_ns(interval: str) -> int:
+    """
+    Length of a yfinance-style bar interval ("1m", "15m", "1h", "1d", "1wk") in nanoseconds.
+    """
+    match = re.fullmatch(r"(\d+)(m|h|d|wk)", interval)
+    if match is None or int(match.group(1)) == 0:
+        raise ValueError(f"Unsupported interval: {interval!r}")
+    return int(match.group(1)) * _INTERVAL_UNITS[match.group(2)]
+
+
+def is_intraday(interval: str) -> bool:
+    return interval in INTRADAY_INTERVALS or interval_ns(interval) < DAY_NS
+
+
+def bucket_starts(ts: np.ndarray, step: int) -> np.ndarray:
+    """
+    Start of the step-long bucket of every timestamp (sorted, UTC nanoseconds).
+
+    Daily and longer buckets follow the calendar (UTC days, weeks from Monday).
+    Shorter buckets are counted from each day's first bar, so hourly bars of a
+    session opening at 13:30 UTC start at 13:30, 14:30, ... like the providers'.
+    """
+    if step >= DAY_NS:
+        offset = _MONDAY_OFFSET_NS if step % WEEK_NS == 0 else 0
+        return (ts - offset) // step * step + offset
+    if len(ts) == 0:
+        return ts.copy()
+    day = ts // DAY_NS
+    first = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    session_open = np.repeat(ts[first], np.diff(np.r_[first, len(ts)]))
+    return session_open + (ts - session_open) // step * step
+
+
+class Bars:
+    """
+    One ticker's OHLCV bars of a given interval, sorted by bar start.
+    """
+
+    __slots__ = ("ts", "open", "high", "low", "close", "volume", "interval")
+
+    def __init__(self, ts, open, high, low, close, volume=None, interval: str = "1d"):
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.open = np.asarray(open, dtype=np.float32)
+        self.high = np.asarray(high, dtype=np.float32)
+        self.low = np.asarray(low, dtype=np.float32)
+        self.close = np.asarray(close, dtype=np.float32)
+        self.volume = (np.full(len(self.ts), np.nan, dtype=np.float32) if volume is None
+                       else np.asarray(volume, dtype=np.float32))
+        self.interval = interval
+
+    @classmethod
+    def empty(cls, interval: str = "1d") -> "Bars":
+        return cls.from_records(np.empty(0, dtype=BAR_DTYPE), interval)
+
+    @classmethod
+    def from_records(cls, records: np.ndarray, interval: str = "1d") -> "Bars":
+        """
+        Bars from bar store records (BAR_DTYPE), e.g. a memory-mapped slice.
+        """
+        return cls(records["ts"], *(records[field] for field in FIELDS), interval=interval)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, interval: str = "1d") -> "Bars":
+        """
+        Bars from an OHLC(V) frame with a datetime index (same cleaning as the bar store).
+        """
+        return cls.from_records(frame_to_bars(frame), interval)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __repr__(self) -> str:
+        return f"Bars(interval={self.interval!r}, bars={len(self)}, nbytes={self.nbytes})"
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in ("ts",) + FIELDS)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.ts.astype("datetime64[ns]"),
+                                name="Datetime" if is_intraday(self.interval) else "Date")
+
+    def __getitem__(self, key) -> "Bars":
+        return Bars(self.ts[key], *(getattr(self, field)[key] for field in FIELDS), interval=self.interval)
+
+    def between(self, start=None, end=None) -> "Bars":
+        """
+        Bars with start <= bar start <= end (both optional).
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.ts, _to_utc_naive([start]).asi8[0], side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.ts, _to_utc_naive([end]).asi8[0], side="right"))
+        return self[lo:hi]
+
+    def last(self, period: str) -> "Bars":
+        """
+        The last period ("5d", "1mo", ...) of bars, counted back from the latest bar.
+        """
+        if len(self) == 0:
+            return self
+        return self.between(start=period_start(period, pd.Timestamp(int(self.ts[-1]))))
+
+    def to_frame(self, dtype=np.float64) -> pd.DataFrame:
+        """
+        The OHLC(V) frame the fetchers return; volume is left out when no bar has one.
+        """
+        frame = pd.DataFrame({column: getattr(self, field).astype(dtype) for field, column in COLUMNS.items()},
+                             index=self.index)
+        return frame.dropna(axis=1, how="all")
+
+    def resample(self, interval: str) -> "Bars":
+        """
+        Bars of a coarser interval built from these ones. Buckets with no bar are skipped,
+        the last bucket may still be forming.
+        """
+        step, source = interval_ns(interval), interval_ns(self.interval)
+        if step < source:
+            raise ValueError(f"Cannot resample {self.interval} bars to the finer {interval}")
+        if step == source or len(self) == 0:
+            return Bars(self.ts, self.open, self.high, self.low, self.close, self.volume, interval=interval)
+        buckets = bucket_starts(self.ts, step)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(self)] - 1
+        return Bars(
+            buckets[starts],
+            self.open[starts],
+            np.maximum.reduceat(self.high, starts),
+            np.minimum.reduceat(self.low, starts),
+            self.close[ends],
+            np.add.reduceat(self.volume, starts),
+            interval=interval,
+        )
+
+    def deltas(self):
+        """
+        (Delta_OC, Delta_HL) in % per bar, computed in float64 like compute_deltas.
+        """
+        open_ = self.open.astype(np.float64)
+        return ((self.close - open_) / open_ * 100, (self.high.astype(np.float64) - self.low) / open_ * 100)
+
+
+def load_bars(store, ticker: str, interval: str = "1d", start=None, end=None) -> Bars:
+    """
+    Bars of interval for ticker from a BarStore, between start and end (both optional).
+    An interval the store does not hold is resampled from the coarsest stored
+    interval that is finer and divides it evenly (e.g. 15m from 5m bars).
+    """
+    if store.count(ticker, interval):
+        return Bars.from_records(store.read_records(ticker, interval, start, end), interval)
+    step = interval_ns(interval)
+    sources = [i for i in store.intervals(ticker) if _divides(i, step)]
+    if not sources:
+        return Bars.empty(interval)
+    source = max(sources, key=interval_ns)
+    return Bars.from_records(store.read_records(ticker, source, start, end), source).resample(interval)
+
+
+def _divides(interval: str, step: int) -> bool:
+    try:
+        source = interval_ns(interval)
+    except ValueError:
+        return False
+    return source < step and step % source == 0
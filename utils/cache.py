@@ -0,0 +1,228 @@
+"""
+cache.py
+
+TTL + LRU cache with an optional SQLite persistence tier.
+Used to keep market data (and other slow remote results) local between
+requests and across orchestrator / Streamlit restarts.
+"""
+
+import functools
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.telemetry import get_logger, count
+from utils.config import getenv
+
+MARKET_CACHE_TTL = float(getenv("MARKET_CACHE_TTL", 900))  # seconds
+MARKET_CACHE_MAX_ENTRIES = int(getenv("MARKET_CACHE_MAX_ENTRIES", 512))
+MARKET_CACHE_PATH = getenv("MARKET_CACHE_PATH", os.path.join("db", "market_cache.db"))
+
+_MISSING = object()
+
+logger = get_logger(__name__)
+
+
+class TTLCache:
+    """
+    In-memory LRU cache with per-entry expiry, backed by an optional SQLite file.
+
+    Memory hits never touch disk. Memory misses fall through to SQLite (when a
+    path is given) and are promoted back into memory. Values are pickled on disk.
+    """
+
+    def __init__(self, ttl: float = 900, max_entries: int = 512, path: str = None,
+                 table: str = "cache", clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.table = table
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened lazily so importing a module that owns a cache never touches disk
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    value BLOB NOT NULL
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, expires_at: float, value):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        """
+        Return the cached value for key, or default if missing or expired.
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+            if self.path is None:
+                return default
+
+            row = self._db().execute(
+                f"SELECT expires_at, value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            if row[0] <= now:
+                self._db().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._db().commit()
+                return default
+
+            value = pickle.loads(row[1])
+            self._remember(key, row[0], value)
+            return value
+
+    def set(self, key: str, value, ttl: float = None):
+        """
+        Store value under key for ttl seconds (defaults to the cache TTL).
+        """
+        expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self.path is not None:
+                self._db().execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, expires_at, value) VALUES (?, ?, ?)",
+                    (key, expires_at, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+                )
+                self._db().commit()
+
+    def clear(self):
+        """
+        Drop every entry from memory and disk.
+        """
+        with self._lock:
+            self._entries.clear()
+            if self.path is not None:
+                self._db().execute(f"DELETE FROM {self.table}")
+                self._db().commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the
+    function, the others wait for and share its result (or its exception).
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+market_cache = TTLCache(
+    ttl=MARKET_CACHE_TTL,
+    max_entries=MARKET_CACHE_MAX_ENTRIES,
+    path=MARKET_CACHE_PATH or None,
+    table="market_data",
+)
+
+
+def market_data_key(ticker: str, period: str, interval: str, source: str) -> str:
+    return f"{source}|{ticker.upper()}|{period}|{interval}"
+
+
+def _copy(data, interval=None):
+    return data.copy()
+
+
+def cached_market_data(source: str, period: str = None, interval: str = None, ttl: float = None,
+                       cache: TTLCache = None, pack=_copy, unpack=_copy):
+    """
+    Decorator caching a fetcher's DataFrame by (ticker, period, interval, source).
+
+    period / interval are read from the wrapped function's arguments when it
+    takes them, otherwise the fixed values given here are used in the key.
+    None or empty results are never cached so failures are retried.
+    pack(data, interval) gives the value kept in the cache (a copy by default,
+    or a more compact form) and unpack(value) the frame returned on a hit.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            target = cache if cache is not None else market_cache
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key_interval = bound.arguments.get("interval", interval)
+            key = market_data_key(
+                bound.arguments["ticker"],
+                bound.arguments.get("period", period),
+                key_interval,
+                source,
+            )
+
+            data = target.get(key, _MISSING)
+            if data is not _MISSING:
+                logger.debug("Market data cache hit: %s", key)
+                count("market_cache_hits_total", source=source)
+                return unpack(data)
+            count("market_cache_misses_total", source=source)
+
+            data = func(*args, **kwargs)
+            if data is not None and not data.empty:
+                target.set(key, pack(data, key_interval), ttl=ttl)
+            return data
+
+        return wrapper
+
+    return decorator
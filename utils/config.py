@@ -0,0 +1,39 @@
+"""
+config.py
+
+One-time configuration loading. The .env file is read once per process, when
+the first setting is looked up (whichever module asks first), instead of at
+the import of every module that needs a key. Variables already set in the
+environment take precedence over the file.
+"""
+
+import os
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_config(path: str = None) -> bool:
+    """
+    Read the .env file into os.environ, once. Returns True on the call that loaded it.
+    """
+    global _loaded
+    if _loaded:
+        return False
+    with _lock:
+        if _loaded:
+            return False
+        from dotenv import load_dotenv, find_dotenv
+        load_dotenv(path or find_dotenv(usecwd=True) or find_dotenv())
+        _loaded = True
+        return True
+
+
+def getenv(name: str, default=None):
+    """
+    os.getenv after the one-time .env load.
+    """
+    if not _loaded:
+        load_config()
+    return os.environ.get(name, default)
@@ -0,0 +1,68 @@
+"""
+lazy.py
+
+Deferred imports for heavy optional modules (yfinance, openai, requests, ...).
+
+lazy_import returns a module stand-in that imports the real module on first
+attribute access, so `import`-time cost is only paid by the code paths that
+use it. Attribute writes and deletes go to the real module, which keeps
+`patch("pkg.module.yf.download")` style patching working.
+"""
+
+import importlib
+import sys
+import threading
+import types
+
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module stand-in loading the named module on first use.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str):
+    """
+    The module if it is already imported, otherwise a LazyModule for it.
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+
+def is_loaded(module) -> bool:
+    """
+    False for a LazyModule whose module has not been imported yet.
+    """
+    return not isinstance(module, LazyModule) or module.__dict__["_lazy_module"] is not None
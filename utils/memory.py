@@ -0,0 +1,309 @@
+"""
+memory.py
+
+Local vector memory for the agentic RAG prompts: past decisions, news and KPIs
+embedded and retrieved by similarity, filtered by ticker, kind and date.
+
+Vectors (float32) and fixed-size metadata records are appended to flat files
+and memory-mapped for search. Once the store is large enough an IVF index
+(spherical k-means centroids) is trained, and a query only scores the lists
+closest to it; small filtered sets (e.g. one ticker) are scored exactly.
+Texts are embedded locally with feature hashing, so nothing leaves the machine.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from utils.config import getenv
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+MEMORY_PATH = getenv("MEMORY_PATH", os.path.join("db", "memory"))
+MEMORY_DIM = 256
+IVF_TRAIN_MIN = 2048      # records before an IVF index is trained
+IVF_RETRAIN_GROWTH = 4    # retrain when the store has grown this much since the last training
+IVF_NPROBE = 8            # lists scored per query
+EXACT_SEARCH_LIMIT = 4096  # filtered sets up to this size are scored exactly
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 20000
+
+META_DTYPE = np.dtype([
+    ("ts", "<i8"),         # UTC nanoseconds
+    ("ticker", "S16"),
+    ("kind", "S16"),       # decision, news, kpi, ...
+    ("list", "<i4"),       # IVF list, -1 before the index is trained
+    ("hash", "<u8"),       # content hash, for de-duplication
+    ("offset", "<i8"),     # payload position in payload.jsonl
+    ("length", "<i4"),
+])
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9.%$-]*")
+
+
+def hash_embed(text: str, dim: int = MEMORY_DIM) -> np.ndarray:
+    """
+    L2-normalized feature-hashing embedding of words and word pairs (signed, log-scaled counts).
+    """
+    tokens = _TOKEN.findall(text.lower())
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vector = np.zeros(dim, dtype=np.float32)
+    if not features:
+        return vector
+    hashes = np.array([zlib.crc32(f.encode()) for f in features], dtype=np.uint64)
+    signs = np.where(hashes & 1, 1.0, -1.0).astype(np.float32)
+    np.add.at(vector, ((hashes >> 1) % dim).astype(np.intp), signs)
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _content_hash(ticker: str, kind: str, text: str) -> int:
+    digest = hashlib.blake2b(f"{ticker}|{kind}|{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _to_ns(value) -> int:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.as_unit("ns").value
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means: unit-norm centroids maximizing the dot product with their members.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]  # re-seed empty lists
+        norms[empty] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class VectorStore:
+    """
+    Append-only vector memory under root: vectors.f32, meta.bin, payload.jsonl
+    and, once trained, the IVF centroids (ivf.npy, ivf.json).
+
+    add() embeds and appends one record (identical ticker/kind/text is stored
+    once); search() returns the top-k records by cosine similarity among those
+    matching the filters.
+    """
+
+    def __init__(self, root: str = MEMORY_PATH, dim: int = MEMORY_DIM, embed=None):
+        self.root = root
+        self.dim = dim
+        self.embed = embed or (lambda text: hash_embed(text, dim))
+        self._lock = threading.Lock()
+        self._hashes = None     # content hashes already stored
+        self._maps = None       # (count, meta, vectors) memory maps of the last read
+        self._centroids = None  # (mtime, centroids)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def __len__(self) -> int:
+        path = self._path("meta.bin")
+        return os.path.getsize(path) // META_DTYPE.itemsize if os.path.exists(path) else 0
+
+    def _read(self):
+        """
+        (meta, vectors) memory maps covering the committed records.
+        """
+        count = len(self)
+        if self._maps is None or self._maps[0] != count:
+            if count == 0:
+                meta, vectors = np.empty(0, META_DTYPE), np.empty((0, self.dim), np.float32)
+            else:
+                meta = np.memmap(self._path("meta.bin"), dtype=META_DTYPE, mode="r", shape=(count,))
+                vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(count, self.dim))
+            self._maps = (count, meta, vectors)
+        return self._maps[1], self._maps[2]
+
+    def _index(self):
+        """
+        IVF centroids, or None while the store is too small to have been trained.
+        """
+        path = self._path("ivf.npy")
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        if self._centroids is None or self._centroids[0] != mtime:
+            self._centroids = (mtime, np.load(path))
+        return self._centroids[1]
+
+    def _known_hashes(self) -> set:
+        if self._hashes is None:
+            meta, _ = self._read()
+            self._hashes = set(meta["hash"].tolist())
+        return self._hashes
+
+    def add(self, text: str, ticker: str, kind: str, date=None, metadata: dict = None) -> bool:
+        """
+        Store one record. Returns False when the same ticker/kind/text is already stored.
+        """
+        return self.add_many([{"text": text, "ticker": ticker, "kind": kind, "date": date,
+                               "metadata": metadata}]) == 1
+
+    def add_many(self, records: list) -> int:
+        """
+        Store several records ({"text", "ticker", "kind", "date", "metadata"}) in one append.
+        Returns the number of new records.
+        """
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            known = self._known_hashes()
+            fresh = []
+            for record in records:
+                ticker, kind = record["ticker"].upper(), record["kind"]
+                digest = _content_hash(ticker, kind, record["text"])
+                if digest in known:
+                    continue
+                known.add(digest)
+                fresh.append((record, ticker, kind, digest))
+            if not fresh:
+                return 0
+
+            vectors = np.stack([self.embed(r["text"]) for r, *_ in fresh]).astype(np.float32)
+            centroids = self._index()
+            lists = np.argmax(vectors @ centroids.T, axis=1) if centroids is not None else np.full(len(fresh), -1)
+
+            meta = np.empty(len(fresh), dtype=META_DTYPE)
+            with open(self._path("payload.jsonl"), "ab") as f:
+                for i, (record, ticker, kind, digest) in enumerate(fresh):
+                    payload = json.dumps({"text": record["text"], "metadata": record.get("metadata") or {}}).encode()
+                    meta[i] = (_to_ns(record.get("date") or pd.Timestamp.now(tz="UTC")), ticker.encode()[:16],
+                               kind.encode()[:16], lists[i], digest, f.tell(), len(payload))
+                    f.write(payload + b"\n")
+            # Vectors before metadata: a record only exists once its metadata is written
+            with open(self._path("vectors.f32"), "ab") as f:
+                f.seek(len(self) * self.dim * 4)
+                f.truncate()
+                f.write(vectors.tobytes())
+            with open(self._path("meta.bin"), "ab") as f:
+                f.write(meta.tobytes())
+
+            count = len(self)
+            if count >= IVF_TRAIN_MIN and (centroids is None or count >= IVF_RETRAIN_GROWTH * self._trained_count()):
+                self._train(count)
+            return len(fresh)
+
+    def _trained_count(self) -> int:
+        path = self._path("ivf.json")
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return json.load(f)["count"]
+
+    def _train(self, count: int):
+        """
+        Train the IVF centroids on a sample and reassign every record (rewrites meta.bin).
+        """
+        meta, vectors = self._read()
+        rng = np.random.default_rng(count)
+        sample = rng.choice(count, min(count, KMEANS_SAMPLE), replace=False)
+        n_lists = int(np.clip(np.sqrt(count), 8, 1024))
+        centroids = _kmeans(np.asarray(vectors[np.sort(sample)]), n_lists)
+
+        meta = np.array(meta)
+        for start in range(0, count, 65536):
+            block = np.asarray(vectors[start:start + 65536])
+            meta["list"][start:start + 65536] = np.argmax(block @ centroids.T, axis=1)
+        tmp = self._path("meta.bin.tmp")
+        with open(tmp, "wb") as f:
+            f.write(meta.tobytes())
+        os.replace(tmp, self._path("meta.bin"))
+        np.save(self._path("ivf.tmp.npy"), centroids)
+        os.replace(self._path("ivf.tmp.npy"), self._path("ivf.npy"))
+        with open(self._path("ivf.json"), "w") as f:
+            json.dump({"count": count, "lists": n_lists}, f)
+        self._maps = None
+
+    def _payload(self, record) -> dict:
+        with open(self._path("payload.jsonl"), "rb") as f:
+            f.seek(int(record["offset"]))
+            return json.loads(f.read(int(record["length"])))
+
+    def search(self, query: str, k: int = 5, ticker: str = None, kind=None, since=None, until=None,
+               nprobe: int = IVF_NPROBE, min_score: float = None) -> list:
+        """
+        Top-k records most similar to query among those matching the filters
+        (ticker, kind or list of kinds, since <= date < until), best first.
+        Each hit is {"score", "ticker", "kind", "date", "text", "metadata"}.
+        """
+        meta, vectors = self._read()
+        if len(meta) == 0 or k <= 0:
+            return []
+        mask = np.ones(len(meta), dtype=bool)
+        if ticker is not None:
+            mask &= meta["ticker"] == ticker.upper().encode()
+        if kind is not None:
+            kinds = [kind] if isinstance(kind, str) else list(kind)
+            mask &= np.isin(meta["kind"], [k_.encode() for k_ in kinds])
+        if since is not None:
+            mask &= meta["ts"] >= _to_ns(since)
+        if until is not None:
+            mask &= meta["ts"] < _to_ns(until)
+        candidates = np.flatnonzero(mask)
+
+        q = self.embed(query).astype(np.float32)
+        centroids = self._index()
+        if centroids is not None and len(candidates) > EXACT_SEARCH_LIMIT:
+            probes = np.argsort(centroids @ q)[::-1][:nprobe]
+            probed = candidates[np.isin(meta["list"][candidates], probes)]
+            if len(probed) >= k:
+                candidates = probed
+        if len(candidates) == 0:
+            return []
+
+        scores = np.asarray(vectors[candidates]) @ q
+        top = np.argsort(scores)[::-1][:k] if len(scores) <= k else np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(scores[top])[::-1]]
+
+        hits = []
+        for i in top:
+            if min_score is not None and scores[i] < min_score:
+                break
+            record = meta[candidates[i]]
+            payload = self._payload(record)
+            hits.append({
+                "score": float(scores[i]),
+                "ticker": record["ticker"].decode(),
+                "kind": record["kind"].decode(),
+                "date": pd.Timestamp(int(record["ts"])).isoformat(),
+                "text": payload["text"],
+                "metadata": payload["metadata"],
+            })
+        return hits
+
+
+def format_memories(hits: list, max_chars: int = 200) -> str:
+    """
+    Prompt lines for retrieved records, one per hit.
+    """
+    lines = []
+    for hit in hits:
+        text = re.sub(r"\s+", " ", hit["text"]).strip()
+        if len(text) > max_chars:
+            text = text[:max_chars - 3].rstrip() + "..."
+        lines.append(f"- {hit['date'][:10]} [{hit['kind']}] {text}")
+    return "\n".join(lines)
+
+
+memory_store = VectorStore()
@@ -0,0 +1,135 @@
+"""
+rate_limiter.py
+
+Token-bucket rate limiting per data provider.
+Callers only wait when the provider budget is used up, and 429 responses
+shrink the budget adaptively until the provider recovers.
+"""
+
+import asyncio
+import threading
+import time
+
+from utils.telemetry import get_logger, count
+from utils.config import getenv
+
+logger = get_logger(__name__)
+
+# Provider quotas as (calls per minute, burst size).
+# Finnhub free tier: 60 calls/min. yfinance has no published quota; Yahoo starts
+# throttling well above one call per second, so stay conservative.
+PROVIDER_QUOTAS = {
+    "yfinance": (
+        float(getenv("YFINANCE_CALLS_PER_MIN", 60)),
+        float(getenv("YFINANCE_BURST", 5)),
+    ),
+    "finnhub": (
+        float(getenv("FINNHUB_CALLS_PER_MIN", 60)),
+        float(getenv("FINNHUB_BURST", 10)),
+    ),
+    "news": (
+        float(getenv("NEWS_CALLS_PER_MIN", 120)),
+        float(getenv("NEWS_BURST", 10)),
+    ),
+}
+
+MAX_BACKOFF = 60.0  # seconds
+
+
+class TokenBucket:
+    """
+    Thread- and asyncio-safe token bucket.
+
+    Each call reserves a token under a short lock and then sleeps outside it,
+    so concurrent waiters queue fairly without holding the lock.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic, sleep=time.sleep, name: str = ""):
+        self.name = name
+        self.base_rate = rate          # tokens per second from the provider quota
+        self.rate = rate               # current rate, lowered after 429s
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.backoff = 0.0             # current 429 backoff, doubles on repeats
+        self._blocked_until = 0.0
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """
+        Take one token and return how long the caller must wait for it.
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self):
+        """
+        Block the current thread until a call is allowed.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            self.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        Wait without blocking the event loop until a call is allowed.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_rate_limited(self, retry_after: float = None):
+        """
+        Adapt to a 429: halve the rate and pause every caller for a backoff period.
+        """
+        with self._lock:
+            self.backoff = min(MAX_BACKOFF, self.backoff * 2 if self.backoff else 1.0)
+            self.rate = max(self.base_rate / 16, self.rate / 2)
+            pause = retry_after if retry_after is not None else self.backoff
+            self._blocked_until = max(self._blocked_until, self.clock() + pause)
+            self.tokens = min(self.tokens, 0.0)
+        logger.warning("Rate limited, backing off %.1fs (rate now %.1f/min)", pause, self.rate * 60,
+                       extra={"provider": self.name})
+        count("rate_limited_total", provider=self.name)
+
+    def record_success(self):
+        """
+        Recover gradually towards the configured quota after a successful call.
+        """
+        with self._lock:
+            if self.rate < self.base_rate:
+                self.rate = min(self.base_rate, self.rate * 1.25)
+            self.backoff = 0.0
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> TokenBucket:
+    """
+    Return the shared limiter for a provider, creating it from PROVIDER_QUOTAS.
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            per_minute, burst = PROVIDER_QUOTAS.get(provider, (60.0, 1.0))
+            _limiters[provider] = TokenBucket(rate=per_minute / 60.0, capacity=burst, name=provider)
+        return _limiters[provider]
+
+
+def parse_retry_after(headers) -> float:
+    """
+    Read a Retry-After header in seconds, if present.
+    """
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,256 @@
+"""
+telemetry.py
+
+Structured logging, per-stage timers and counters.
+
+Modules log through get_logger(__name__) (plain text by default, one JSON
+object per line with LOG_FORMAT=json). Stage timers and counters feed an
+in-process registry rendered in the Prometheus text format by /metrics; stage
+timings of the current request are also collected for its Server-Timing header.
+With METRICS_ENABLED=0 timers and counters return immediately.
+"""
+
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from utils.config import getenv
+
+METRICS_ENABLED = getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+LOG_LEVEL = getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = getenv("LOG_FORMAT", "text")  # "text" or "json"
+METRICS_PREFIX = "agentic_"
+
+# Histogram buckets (seconds) for stage and request durations
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Standard LogRecord attributes; anything else on a record came from extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message and any extra= fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    # Resolve sys.stdout on every record so redirected output (tests, notebooks) is honoured
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level: str = None, fmt: str = None):
+    """
+    Attach the repo's handler to the root logger, unless the host application
+    (e.g. uvicorn with a log config) already configured one.
+    """
+    global _configured
+    with _configure_lock:
+        _configured = True
+        root = logging.getLogger()
+        if root.handlers:
+            return
+        handler = _StdoutHandler()
+        if (fmt or LOG_FORMAT) == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter("[%(levelname)s] %(name)s: %(message)s"))
+        root.addHandler(handler)
+        root.setLevel(level or LOG_LEVEL)
+
+
+def get_logger(name: str) -> logging.Logger:
+    if not _configured:
+        configure_logging()
+    return logging.getLogger(name)
+
+
+class Metrics:
+    """
+    Thread-safe registry of labelled counters and histograms.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, name: str, **labels) -> dict:
+        """
+        {"count", "sum"} of a histogram (zeros when never observed).
+        """
+        with self._lock:
+            entry = self._histograms.get((name, tuple(sorted(labels.items()))))
+            return {"count": entry[-1], "sum": entry[-2]} if entry else {"count": 0, "sum": 0.0}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format.
+        """
+        def labels_text(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            full = METRICS_PREFIX + name
+            if full not in declared:
+                lines.append(f"# TYPE {full} counter")
+                declared.add(full)
+            lines.append(f"{full}{labels_text(labels)} {value}")
+        for (name, labels), entry in histograms:
+            full = METRICS_PREFIX + name
+            if full not in declared:
+                lines.append(f"# TYPE {full} histogram")
+                declared.add(full)
+            for bound, count in zip(self.buckets, entry):
+                lines.append(f"{full}_bucket{labels_text(labels, [('le', bound)])} {count}")
+            lines.append(f"{full}_bucket{labels_text(labels, [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{full}_sum{labels_text(labels)} {entry[-2]}")
+            lines.append(f"{full}_count{labels_text(labels)} {entry[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+# Stage durations of the request being served (None outside a request)
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+_NOOP = nullcontext()
+
+
+def set_enabled(enabled: bool):
+    global METRICS_ENABLED
+    METRICS_ENABLED = enabled
+
+
+def count(name: str, value: float = 1, **labels):
+    """
+    Increment a counter (e.g. count("market_cache_hits_total", source="yfinance")).
+    """
+    if METRICS_ENABLED:
+        metrics.inc(name, value, **labels)
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        metrics.observe("stage_duration_seconds", elapsed, stage=self.name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[self.name] = timings.get(self.name, 0.0) + elapsed
+        return False
+
+
+def stage(name: str):
+    """
+    Context manager timing one pipeline stage (fetch, compute, db_write, llm_comment, ...).
+    """
+    return _Stage(name) if METRICS_ENABLED else _NOOP
+
+
+def timed(name: str):
+    """
+    Decorator form of stage().
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return func(*args, **kwargs)
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin_request():
+    """
+    Start collecting stage timings for the current request. Returns (token, timings).
+    Threads started with asyncio.to_thread inherit the context, so their stages are included.
+    """
+    timings = {}
+    return _request_timings.set(timings), timings
+
+
+def end_request(token):
+    _request_timings.reset(token)
+
+
+def server_timing(timings: dict, total: float = None) -> str:
+    """
+    Server-Timing header value, durations in milliseconds.
+    """
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)